@@ -1,9 +1,26 @@
-from fastapi import FastAPI
+from dotenv import load_dotenv
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import uvicorn
 
-from app.routers import sessions, messages, files
-from app.utils.database import init_db
+# Load environment variables before any module reads its settings
+load_dotenv()
+
+# Configure logging before the other modules log while being imported
+from app.utils.logging_config import configure_logging
+configure_logging()
+
+from app.routers import sessions, messages, files, jobs, search
+from app.utils.database import init_db, check_database, engine, async_engine
+from app.utils.storage import UploadSizeLimitMiddleware
+from app.services.metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine
+from app.services.openai_service import close_client
+from app.services.extraction_pipeline import requeue_unfinished_extractions
+from app.services import extraction_pool
+from app.services.job_queue import worker_pool
+from app.services import warm_up
 
 app = FastAPI(
     title="Report Agent API",
@@ -20,19 +37,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads while they are received, not after the body was spooled
+app.add_middleware(UploadSizeLimitMiddleware, path="/api/files/upload")
+
+# Request latency, pipeline stage, model and database metrics, exported at /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+
 # Include routers
 app.include_router(sessions.router, prefix="/api/sessions", tags=["Sessions"])
 app.include_router(messages.router, prefix="/api/messages", tags=["Messages"])
 app.include_router(files.router, prefix="/api/files", tags=["Files"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Report Agent API"}
 
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The process is up and its event loop is responding"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """Whether to send traffic here: database reachable, job workers running and warm-up done"""
+    checks = {
+        "database": await check_database(),
+        "job_workers": worker_pool.is_running(),
+        "warm_up": warm_up.is_warm()
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metrics of this process in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Initialize the database on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    requeue_unfinished_extractions()
+    # Reclaims jobs left running by a previous process before starting the workers
+    worker_pool.start()
+    # Load the OpenAI client, tokenizer and extraction workers once requests are being accepted
+    warm_up.start_warm_up()
+
+# Release pooled OpenAI and database connections and extraction workers on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await warm_up.stop_warm_up()
+    # Running jobs are handed back to the queue for the next start
+    await worker_pool.stop()
+    await close_client()
+    await async_engine.dispose()
+    extraction_pool.shutdown_executor()
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Table
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Table, Text, Index, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,18 +10,33 @@ Base = declarative_base()
 message_attachment = Table(
     'message_attachment',
     Base.metadata,
-    Column('message_id', String, ForeignKey('messages.id')),
-    Column('attachment_id', String, ForeignKey('file_attachments.id'))
+    Column('message_id', String, ForeignKey('messages.id'), index=True),
+    Column('attachment_id', String, ForeignKey('file_attachments.id'), index=True)
 )
 
+# Length of the last message preview kept on a session
+MESSAGE_PREVIEW_LENGTH = 120
+
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Keyset pagination of the session list, newest first
+        Index("ix_sessions_activity", "lastActivity", "id"),
+        Index("ix_sessions_favorite_activity", "isFavorite", "lastActivity", "id"),
+        Index("ix_sessions_created", "timestamp", "id"),
+    )
     
     id = Column(String, primary_key=True, index=True)
     title = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.now)
     fileCount = Column(Integer, default=0)
     isFavorite = Column(Boolean, default=False)
+    # Summary of the messages, maintained on every message write (see record_session_activity)
+    messageCount = Column(Integer, default=0, nullable=False)
+    lastActivity = Column(DateTime, default=datetime.now, nullable=False)
+    lastMessagePreview = Column(String, nullable=True)
+    # Last change version given to one of the session's messages (see next_message_version)
+    messageVersion = Column(Integer, default=0, nullable=False)
     
     # Relationship with messages
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
@@ -29,16 +44,25 @@ class Session(Base):
     @classmethod
     def create_new(cls, title):
         """Helper method to create a new session with a UUID"""
+        now = datetime.now()
         return cls(
             id=str(uuid.uuid4()),
             title=title,
-            timestamp=datetime.now(),
+            timestamp=now,
             fileCount=0,
-            isFavorite=False
+            isFavorite=False,
+            messageCount=0,
+            lastActivity=now,
+            messageVersion=0
         )
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # History is read per session by timestamp, the change feed by version
+        Index("ix_messages_session_timestamp", "session_id", "timestamp"),
+        Index("ix_messages_session_version", "session_id", "version"),
+    )
     
     id = Column(String, primary_key=True, index=True)
     role = Column(String, nullable=False)
@@ -47,6 +71,8 @@ class Message(Base):
     status = Column(String, default="sent")
     isStreaming = Column(Boolean, nullable=True)
     analysis_type = Column(String, nullable=True)
+    # Per-session change counter, bumped on every insert or update of the message
+    version = Column(Integer, default=0, nullable=False)
     
     # Foreign key to session
     session_id = Column(String, ForeignKey("sessions.id"))
@@ -60,8 +86,8 @@ class Message(Base):
     )
     
     @classmethod
-    def create_new(cls, role, content, session_id, analysis_type=None):
-        """Helper method to create a new message with a UUID"""
+    def create_new(cls, role, content, session_id, analysis_type=None, version=0):
+        """Helper method to create a new message with a UUID; take the version from next_message_version"""
         return cls(
             id=str(uuid.uuid4()),
             role=role,
@@ -69,9 +95,121 @@ class Message(Base):
             timestamp=datetime.now(),
             session_id=session_id,
             status="sent",
-            analysis_type=analysis_type
+            analysis_type=analysis_type,
+            version=version
         )
 
+def next_message_version(db, session_id) -> int:
+    """
+    Take the next change version of a session's messages
+    
+    Increments the session's messageVersion counter with UPDATE ... RETURNING
+    in the caller's transaction. The session row stays locked until that
+    transaction ends, so concurrent writers get distinct versions and commit
+    them in order, on PostgreSQL under READ COMMITTED as well as on SQLite.
+    
+    Args:
+        db: Database session the message is written in
+        session_id: Session the message belongs to
+        
+    Returns:
+        The version, or 0 when the session does not exist
+    """
+    version = db.execute(
+        update(Session)
+        .where(Session.id == session_id)
+        .values(messageVersion=Session.messageVersion + 1)
+        .returning(Session.messageVersion)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    return version or 0
+
+def message_preview(content: str) -> str:
+    """Single-line start of a message for session listings"""
+    text = " ".join(content.split())
+    if len(text) <= MESSAGE_PREVIEW_LENGTH:
+        return text
+    return text[:MESSAGE_PREVIEW_LENGTH - 3] + "..."
+
+def record_session_activity(db, session_id, content, added_messages=0):
+    """
+    Update a session's summary columns for a message written to it
+    
+    Runs as a single UPDATE in the caller's transaction, so the summary
+    commits together with the message.
+    
+    Args:
+        db: Database session
+        session_id: Session the message belongs to
+        content: Current content of the message
+        added_messages: 1 when the message is new, 0 when it was updated
+    """
+    db.query(Session).filter(Session.id == session_id).update(
+        {
+            Session.messageCount: Session.messageCount + added_messages,
+            Session.lastActivity: datetime.now(),
+            Session.lastMessagePreview: message_preview(content)
+        },
+        synchronize_session=False
+    )
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    
+    # SHA-256 of the content; identical uploads share one blob on disk
+    hash = Column(String, primary_key=True)
+    size = Column(Integer, nullable=False)
+    refCount = Column(Integer, default=0, nullable=False)
+    timestamp = Column(DateTime, default=datetime.now)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    status = Column(String, default="queued", nullable=False, index=True)
+    # Higher priority jobs run first; equal priorities run in creation order
+    priority = Column(Integer, default=0, nullable=False)
+    # JSON arguments for the job handler
+    payload = Column(Text, nullable=False)
+    session_id = Column(String, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=True, index=True)
+    # ID of what the job produced so far, e.g. the assistant message being written
+    resultId = Column(String, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=datetime.now)
+    startedAt = Column(DateTime, nullable=True)
+    finishedAt = Column(DateTime, nullable=True)
+    # Refreshed while the job runs; a stale heartbeat means its worker died
+    heartbeatAt = Column(DateTime, nullable=True)
+    
+    @classmethod
+    def create_new(cls, type, payload, priority=0, session_id=None):
+        """Helper method to create a new queued job with a UUID"""
+        return cls(
+            id=str(uuid.uuid4()),
+            type=type,
+            status="queued",
+            priority=priority,
+            payload=payload,
+            session_id=session_id,
+            attempts=0,
+            timestamp=datetime.now()
+        )
+
+class ResponseCacheEntry(Base):
+    __tablename__ = "llm_responses"
+    
+    # SHA-256 of the model, sampling settings, normalized messages and template version
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    timestamp = Column(DateTime, default=datetime.now)
+    lastAccess = Column(DateTime, default=datetime.now, index=True)
+    expiresAt = Column(DateTime, nullable=False, index=True)
+
 class FileAttachment(Base):
     __tablename__ = "file_attachments"
     
@@ -81,6 +219,8 @@ class FileAttachment(Base):
     type = Column(String, nullable=False)
     uploadProgress = Column(Integer, default=100)
     status = Column(String, default="uploaded")
+    # Blob holding the content; None for files stored before deduplication
+    content_hash = Column(String, ForeignKey("file_blobs.hash"), nullable=True)
     
     # Relationship with messages
     messages = relationship(
@@ -10,6 +10,40 @@ class FileAttachment(BaseModel):
     uploadProgress: int = 100
     status: str = "uploaded"
 
+class ExtractionCacheStats(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+class Job(BaseModel):
+    id: str
+    type: str
+    status: str
+    priority: int = 0
+    session_id: Optional[str] = None
+    resultId: Optional[str] = None  # ID of the message the job writes
+    attempts: int = 0
+    error: Optional[str] = None
+    timestamp: datetime
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class JobQueueStats(BaseModel):
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    workers: int
+    max_queued: int
+
 class MessageBase(BaseModel):
     content: str
 
@@ -17,6 +51,7 @@ class MessageCreate(MessageBase):
     role: str = "user"
     attachments: Optional[List[FileAttachment]] = None
     analysis_type: Optional[str] = "summarize"  # New field for analysis type
+    bypass_cache: bool = False  # Skip the response cache and generate a fresh answer
 
 class Message(MessageBase):
     id: str
@@ -27,28 +62,61 @@ class Message(MessageBase):
     status: str = "sent"
     isStreaming: Optional[bool] = None
     analysis_type: Optional[str] = None  # Store the analysis type used
+    version: int = 0  # Change version used as the cursor for incremental fetches
 
     class Config:
         from_attributes = True
 
+class MessagesSince(BaseModel):
+    messages: List[Message]
+    cursor: int  # Pass back as `cursor` to receive only later changes
+
 class SessionBase(BaseModel):
     title: str
 
 class SessionCreate(SessionBase):
     pass
 
-class Session(SessionBase):
+class SessionSummary(SessionBase):
     id: str
     title: str
     timestamp: datetime = Field(default_factory=datetime.now)
     fileCount: int = 0
     isFavorite: Optional[bool] = False
+    messageCount: int = 0
+    lastActivity: Optional[datetime] = None
+    lastMessagePreview: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class Session(SessionSummary):
     messages: Optional[List[Message]] = None
 
     class Config:
         from_attributes = True
 
+class SessionPage(BaseModel):
+    sessions: List[SessionSummary]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page; None on the last page
+
 class AnalysisRequest(BaseModel):
     file_ids: List[str]
     analysis_type: str = "summarize"
     user_message: Optional[str] = None
+
+class SearchResult(BaseModel):
+    type: str  # "message" or "file"
+    id: str
+    snippet: str  # Matching text with the matched terms wrapped in **
+    rank: float  # bm25 score; lower is a better match
+    session_id: Optional[str] = None
+    session_title: Optional[str] = None
+    role: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    file_name: Optional[str] = None
+    file_sessions: Optional[List[str]] = None  # Sessions the file was attached in
+
+class SearchResults(BaseModel):
+    results: List[SearchResult]
+    next_offset: Optional[int] = None  # Pass back as `offset` for the next page; None on the last page
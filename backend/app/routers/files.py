@@ -2,18 +2,25 @@ from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, De
 from typing import List
 import uuid
 import os
-import shutil
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session as SQLAlchemySession
+from starlette.concurrency import run_in_threadpool
 
-from app.models.schemas import FileAttachment as FileAttachmentSchema
+from app.models.schemas import FileAttachment as FileAttachmentSchema, ExtractionCacheStats
 from app.models.database import FileAttachment as FileAttachmentModel
-from app.utils.database import get_db
+from app.utils.database import get_db, get_async_db
+from app.utils.storage import (
+    UPLOAD_DIR, UploadTooLargeError, get_upload_path, get_file_path,
+    save_upload, store_blob, release_blob
+)
+from app.services.extraction_cache import extraction_cache
+from app.services.extraction_pipeline import EAGER_EXTRACTION, STATUS_QUEUED, schedule_extraction
 
 router = APIRouter()
 
 # Create uploads directory if it doesn't exist
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/upload", response_model=FileAttachmentSchema)
@@ -21,32 +28,60 @@ async def upload_file(file: UploadFile = File(...), db: SQLAlchemySession = Depe
     """Upload a file and return its metadata"""
     file_id = str(uuid.uuid4())
     
-    # Save the file
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Stream the file to disk while hashing it
+    try:
+        tmp_path, content_hash, size = await save_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    
+    # Database writes and the move into blob storage run in the threadpool
+    try:
+        file_attachment = await run_in_threadpool(save_file_metadata, db, file_id, file, tmp_path, content_hash, size)
+    except BaseException:
+        # The temporary file is left over if the write failed before store_blob moved or removed it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    # Start parsing right away so the content is ready when the user asks about it
+    schedule_extraction(file_id, get_file_path(file_attachment), file_attachment.name, content_hash)
+    
+    return file_attachment
+
+def save_file_metadata(db: SQLAlchemySession, file_id: str, file: UploadFile, tmp_path: str, content_hash: str, size: int) -> FileAttachmentModel:
+    """Store an uploaded file's content and metadata"""
+    # Identical content is stored once and shared between uploads
+    store_blob(db, tmp_path, content_hash, size)
     
     # Create file metadata
     file_attachment = FileAttachmentModel(
         id=file_id,
         name=file.filename,
-        size=os.path.getsize(file_path),
+        size=size,
         type=file.content_type or "application/octet-stream",
-        uploadProgress=100,
-        status="uploaded"
+        uploadProgress=0 if EAGER_EXTRACTION else 100,
+        status=STATUS_QUEUED if EAGER_EXTRACTION else "uploaded",
+        content_hash=content_hash
     )
     
     # Store in database
     db.add(file_attachment)
     db.commit()
     db.refresh(file_attachment)
-    
     return file_attachment
 
+@router.get("/cache/stats", response_model=ExtractionCacheStats)
+def get_extraction_cache_stats():
+    """Get hit/miss counters and size of the extraction cache"""
+    return extraction_cache.stats()
+
 @router.get("/{file_id}", response_model=FileAttachmentSchema)
-async def get_file(file_id: str, db: SQLAlchemySession = Depends(get_db)):
+async def get_file(file_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get file metadata by ID"""
-    file_attachment = db.query(FileAttachmentModel).filter(FileAttachmentModel.id == file_id).first()
+    file_attachment = await db.get(FileAttachmentModel, file_id)
     if not file_attachment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -56,7 +91,7 @@ async def get_file(file_id: str, db: SQLAlchemySession = Depends(get_db)):
     return file_attachment
 
 @router.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_file(file_id: str, db: SQLAlchemySession = Depends(get_db)):
+def delete_file(file_id: str, db: SQLAlchemySession = Depends(get_db)):
     """Delete a file"""
     file_attachment = db.query(FileAttachmentModel).filter(FileAttachmentModel.id == file_id).first()
     if not file_attachment:
@@ -65,16 +100,18 @@ async def delete_file(file_id: str, db: SQLAlchemySession = Depends(get_db)):
             detail=f"File with ID {file_id} not found"
         )
     
-    # Find the file on disk
-    file_name = file_attachment.name
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file_name}")
-    
-    # Delete from disk if it exists
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    
-    # Delete from database
-    db.delete(file_attachment)
-    db.commit()
+    if file_attachment.content_hash:
+        # Drop this upload's reference; the blob is removed once nothing uses it, its file after the commit
+        with release_blob(db, file_attachment.content_hash):
+            db.delete(file_attachment)
+            db.commit()
+    else:
+        db.delete(file_attachment)
+        db.commit()
+        
+        # Files stored before deduplication have their own copy on disk
+        file_path = get_upload_path(file_id, file_attachment.name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
     
     return None
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from typing import List, Optional
+from sqlalchemy.orm import Session as SQLAlchemySession
+
+from app.models.schemas import Job as JobSchema, JobQueueStats
+from app.models.database import Job as JobModel
+from app.utils.database import get_db
+from app.services.job_queue import queue_stats
+
+router = APIRouter()
+
+@router.get("/", response_model=List[JobSchema])
+def get_jobs(
+    status: Optional[str] = None,
+    session_id: Optional[str] = None,
+    limit: int = 50,
+    db: SQLAlchemySession = Depends(get_db)
+):
+    """Get the most recent jobs, optionally filtered by status or session"""
+    query = db.query(JobModel)
+    if status:
+        query = query.filter(JobModel.status == status)
+    if session_id:
+        query = query.filter(JobModel.session_id == session_id)
+    return query.order_by(JobModel.timestamp.desc()).limit(min(max(limit, 1), 500)).all()
+
+@router.get("/stats", response_model=JobQueueStats)
+def get_job_stats():
+    """Get job counts by status and the worker settings"""
+    return queue_stats()
+
+@router.get("/{job_id}", response_model=JobSchema)
+def get_job(job_id: str, db: SQLAlchemySession = Depends(get_db)):
+    """Get a specific job by ID"""
+    job = db.query(JobModel).filter(JobModel.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    return job
@@ -1,36 +1,279 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from typing import List, Dict, Any, Literal, Tuple
 import uuid
 import os
+import logging
+import json
+import time
 from datetime import datetime
 import asyncio
-from sqlalchemy.orm import Session as SQLAlchemySession
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as SQLAlchemySession, selectinload
+from starlette.concurrency import run_in_threadpool
 
-from app.models.schemas import Message as MessageSchema, MessageCreate, FileAttachment as FileAttachmentSchema
-from app.models.database import Message as MessageModel, Session as SessionModel, FileAttachment as FileAttachmentModel
-from app.utils.database import get_db, SessionLocal
+from app.models.schemas import Message as MessageSchema, MessageCreate, MessagesSince, FileAttachment as FileAttachmentSchema
+from app.models.database import Message as MessageModel, Session as SessionModel, FileAttachment as FileAttachmentModel, Job as JobModel, next_message_version, record_session_activity
+from app.utils.database import get_db, get_async_db, SessionLocal
+from app.utils.storage import get_file_path
 from app.services.openai_service import analyze_files, generate_conversation_response
+from app.services.message_events import broker
+from app.services.metrics import StageTimer
+from app.services.tracing import span, start_trace
+from app.services.profiling import PROFILE_HEADER, Profile, artifact_path, load_artifact, save_artifact, should_profile
+from app.services.extraction_pipeline import EXTRACTION_WAIT_TIMEOUT, wait_for_extractions
+from app.services.job_queue import QueueFullError, enqueue_job, job_payload, register_job_handler, update_job, worker_pool
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Streaming settings for assistant responses
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.5"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "200"))
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# Upper bound for how long a "messages since" request may wait for changes
+LONG_POLL_MAX_WAIT = float(os.getenv("LONG_POLL_MAX_WAIT", "30"))
+
+# Assistant responses run as background jobs; plain chat replies go ahead of file analyses
+JOB_ASSISTANT_RESPONSE = "assistant_response"
+PRIORITY_CONVERSATION = 1
+PRIORITY_ANALYSIS = 0
+
+class StreamingMessageWriter:
+    """
+    Collects streamed response deltas for an assistant message
+    
+    Every delta is published to stream subscribers immediately, while the
+    partial content is written to the database in batches so that clients
+    reconnecting from another worker can resume from the stored text.
+    """
+    
+    def __init__(self, db: SQLAlchemySession, session_id: str, message_id: str):
+        self.db = db
+        self.session_id = session_id
+        self.message_id = message_id
+        self.parts: List[str] = []
+        self.length = 0
+        self.unflushed_chars = 0
+        self.last_flush = time.monotonic()
+    
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+    
+    async def on_delta(self, delta: str):
+        broker.publish(self.session_id, {
+            "type": "delta",
+            "message_id": self.message_id,
+            "offset": self.length,
+            "delta": delta
+        })
+        self.parts.append(delta)
+        self.length += len(delta)
+        self.unflushed_chars += len(delta)
+        
+        if (self.unflushed_chars >= STREAM_FLUSH_CHARS
+                or time.monotonic() - self.last_flush >= STREAM_FLUSH_INTERVAL):
+            await run_in_threadpool(self.flush)
+            broker.notify_change(self.session_id)
+    
+    def flush(self):
+        """Write the partial content to the database"""
+        self.db.query(MessageModel).filter(MessageModel.id == self.message_id).update(
+            {
+                MessageModel.content: self.content,
+                MessageModel.version: next_message_version(self.db, self.session_id)
+            },
+            synchronize_session=False
+        )
+        self.db.commit()
+        self.unflushed_chars = 0
+        self.last_flush = time.monotonic()
+
+# Writers for responses currently streaming in this process, by message ID
+active_streams: Dict[str, StreamingMessageWriter] = {}
+
+def message_event(message: MessageModel) -> Dict[str, Any]:
+    """Build a stream event carrying the full state of a message"""
+    data = MessageSchema.model_validate(message, from_attributes=True).model_dump(mode="json")
+    writer = active_streams.get(message.id)
+    if writer is not None and writer.parts:
+        data["content"] = writer.content
+    return {"type": "message", "message": data}
+
+def message_saved(session_id: str, message: MessageModel):
+    """Notify stream subscribers and long-polling readers about a committed message"""
+    broker.publish(session_id, message_event(message))
+    broker.notify_change(session_id)
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def session_exists(db: AsyncSession, session_id: str) -> bool:
+    return (await db.scalar(select(SessionModel.id).where(SessionModel.id == session_id))) is not None
+
 @router.get("/{session_id}", response_model=List[MessageSchema])
-async def get_messages(session_id: str, db: SQLAlchemySession = Depends(get_db)):
+async def get_messages(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get all messages for a specific session"""
     # Check if session exists
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    if not session:
+    if not await session_exists(db, session_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session with ID {session_id} not found"
         )
     
-    # Get all messages for the session
-    messages = db.query(MessageModel).filter(MessageModel.session_id == session_id).all()
+    # Get all messages for the session, loading all their attachments in one query
+    messages = (await db.scalars(
+        select(MessageModel).options(
+            selectinload(MessageModel.attachments)
+        ).where(MessageModel.session_id == session_id)
+    )).all()
     return messages
 
+@router.get("/{session_id}/since", response_model=MessagesSince)
+async def get_messages_since(session_id: str, cursor: int = 0, wait: float = 0, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get messages created or updated after a cursor
+    
+    When nothing changed and `wait` is greater than zero, the request is held
+    open until a message in the session changes or the wait time runs out.
+    """
+    # Check if session exists
+    if not await session_exists(db, session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session with ID {session_id} not found"
+        )
+    
+    deadline = time.monotonic() + min(max(wait, 0), LONG_POLL_MAX_WAIT)
+    while True:
+        # Take the change event before querying so a concurrent write still wakes us
+        changed = broker.change_event(session_id)
+        messages = (await db.scalars(
+            select(MessageModel).options(
+                selectinload(MessageModel.attachments)
+            ).where(
+                MessageModel.session_id == session_id,
+                MessageModel.version > cursor
+            ).order_by(MessageModel.version)
+        )).all()
+        
+        remaining = deadline - time.monotonic()
+        if messages or remaining <= 0:
+            break
+        
+        # End the read transaction before waiting: gives the connection back to
+        # the pool, and the next query starts a new one that sees the new commit
+        await db.rollback()
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            break
+    
+    next_cursor = max((msg.version for msg in messages), default=cursor)
+    return {"messages": messages, "cursor": next_cursor}
+
+@router.get("/{session_id}/stream")
+async def stream_messages(session_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Stream new messages and assistant response deltas for a session as Server-Sent Events"""
+    # Check if session exists
+    if not await session_exists(db, session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session with ID {session_id} not found"
+        )
+    
+    # Subscribe before taking the snapshot so no delta is missed in between
+    queue = broker.subscribe(session_id)
+    
+    # Send the current state of responses still being generated so reconnecting clients can resume
+    streaming_messages = (await db.scalars(
+        select(MessageModel).options(
+            selectinload(MessageModel.attachments)
+        ).where(
+            MessageModel.session_id == session_id,
+            MessageModel.isStreaming == True
+        )
+    )).all()
+    snapshot = [message_event(msg) for msg in streaming_messages]
+    # Give the connection back to the pool instead of holding it for the whole stream
+    await db.close()
+    
+    async def event_stream():
+        try:
+            for event in snapshot:
+                yield format_sse(event)
+            
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(session_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{session_id}/{message_id}/profile")
+async def get_message_profile(session_id: str, message_id: str, format: Literal["prof", "text", "json"] = "prof"):
+    """
+    Get the profile of the response to a message sent with the profile header
+    
+    "prof" downloads the cProfile data (for pstats or snakeviz), "text" gives
+    the trace spans and the most expensive functions, "json" the trace as data.
+    """
+    artifact = await run_in_threadpool(load_artifact, message_id)
+    if artifact is None or artifact.get("session_id") != session_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No profile for message {message_id} (yet)"
+        )
+    
+    if format == "json":
+        return artifact
+    if format == "text":
+        return PlainTextResponse(f"Trace:\n{artifact.get('trace_text') or ''}\n\n{artifact['report']}")
+    return FileResponse(
+        artifact_path(message_id, "prof"),
+        media_type="application/octet-stream",
+        filename=f"profile-{message_id}.prof"
+    )
+
 @router.post("/{session_id}", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
-async def create_message(session_id: str, message: MessageCreate, db: SQLAlchemySession = Depends(get_db)):
-    """Create a new message in a session"""
+async def create_message(session_id: str, message: MessageCreate, request: Request, response: Response, db: SQLAlchemySession = Depends(get_db)):
+    """Create a new message in a session and queue the assistant response"""
+    profile = should_profile(request.headers.get(PROFILE_HEADER))
+    # The writes run in the threadpool so waiting for the database lock does not stall the event loop
+    new_message, job_id = await run_in_threadpool(save_user_message, db, session_id, message, profile)
+    message_saved(session_id, new_message)
+    worker_pool.notify()
+    
+    response.headers["X-Job-ID"] = job_id
+    if profile:
+        # The profile of the response is saved under the ID of this message
+        response.headers["X-Profile-ID"] = new_message.id
+    return new_message
+
+def save_user_message(db: SQLAlchemySession, session_id: str, message: MessageCreate, profile: bool = False):
+    """
+    Store a user message and queue its assistant response in one transaction
+    
+    When profile is set, the response job is run under the profiler.
+    
+    Returns:
+        The saved message (with attachments loaded) and the ID of the queued job
+    """
     # Check if session exists
     session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     if not session:
@@ -44,102 +287,288 @@ async def create_message(session_id: str, message: MessageCreate, db: SQLAlchemy
         role=message.role,
         content=message.content,
         session_id=session_id,
-        analysis_type=message.analysis_type
+        analysis_type=message.analysis_type,
+        version=next_message_version(db, session_id)
     )
     
-    # Add attachments if present
+    # Add attachments if present, looking them all up in one query
     if message.attachments:
-        for attachment_data in message.attachments:
-            # Find the attachment in the database
-            attachment = db.query(FileAttachmentModel).filter(FileAttachmentModel.id == attachment_data.id).first()
-            if attachment:
-                new_message.attachments.append(attachment)
+        attachment_ids = [attachment_data.id for attachment_data in message.attachments]
+        attachments = db.query(FileAttachmentModel).filter(FileAttachmentModel.id.in_(attachment_ids)).all()
+        attachments_by_id = {attachment.id: attachment for attachment in attachments}
+        for attachment_id in dict.fromkeys(attachment_ids):
+            if attachment_id in attachments_by_id:
+                new_message.attachments.append(attachments_by_id[attachment_id])
         
         # Update file count
         session.fileCount += len(message.attachments)
     
+    # Queue the assistant response in the same transaction as the message, so neither exists without the other
+    try:
+        job = enqueue_job(
+            db,
+            JOB_ASSISTANT_RESPONSE,
+            {
+                "session_id": session_id,
+                "user_message_id": new_message.id,
+                "user_message": message.content,
+                "analysis_type": message.analysis_type,
+                "attachment_ids": [attachment.id for attachment in message.attachments or []],
+                "bypass_cache": message.bypass_cache,
+                "profile": profile
+            },
+            priority=PRIORITY_ANALYSIS if message.attachments else PRIORITY_CONVERSATION,
+            session_id=session_id
+        )
+    except QueueFullError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    
     # Save the message
     db.add(new_message)
+    record_session_activity(db, session_id, new_message.content, added_messages=1)
     db.commit()
     db.refresh(new_message)
-    
-    # Generate assistant response using OpenAI
-    asyncio.create_task(create_assistant_response(
-        session_id, 
-        message.content, 
-        message.analysis_type, 
-        message.attachments,
-        db
-    ))
-    
-    return new_message
+    # Load the attachments here; serializing the message reads them on the event loop
+    new_message.attachments
+    return new_message, job.id
 
-async def create_assistant_response(session_id: str, user_message: str, analysis_type: str = None, attachments = None, db: SQLAlchemySession = None):
-    """Create an assistant response after analyzing the request"""
-    # Create a new database session if not provided
-    db_factory = None
-    if db is None:
-        db_factory = SessionLocal()
-        try:
-            db = db_factory
-        except Exception as e:
-            print(f"Error creating database session: {e}")
-            return
+async def run_assistant_response_job(job: JobModel):
+    """Job handler generating the assistant response to a user message"""
+    payload = job_payload(job)
+    user_message_id = payload.get("user_message_id")
+    # Requested with the profile header; saved under the user message ID once the trace is complete
+    profile = Profile() if payload.get("profile") and user_message_id else None
+    trace = None
+    try:
+        with start_trace("assistant_response", job_id=job.id, session_id=payload["session_id"], message_id=user_message_id) as trace:
+            response = create_assistant_response(
+                payload["session_id"],
+                payload["user_message"],
+                payload.get("analysis_type"),
+                payload.get("attachment_ids") or [],
+                bypass_cache=payload.get("bypass_cache", False),
+                job_id=job.id,
+                message_id=job.resultId
+            )
+            await (profile.run(response) if profile is not None else response)
+    finally:
+        if profile is not None:
+            await run_in_threadpool(
+                save_artifact,
+                user_message_id,
+                profile,
+                trace,
+                session_id=payload["session_id"],
+                job_id=job.id,
+                analysis_type=payload.get("analysis_type"),
+                attachments=len(payload.get("attachment_ids") or [])
+            )
+
+def abandon_assistant_response_job(job: JobModel):
+    """Finish the message of a response job that will not be retried, so it is not left streaming"""
+    if not job.resultId:
+        return
     
+    db = SessionLocal()
     try:
+        message = db.query(MessageModel).filter(MessageModel.id == job.resultId).first()
+        if message and message.isStreaming:
+            message.content = "Sorry, generating this response was interrupted. Please send your message again."
+            message.isStreaming = False
+            message.version = next_message_version(db, message.session_id)
+            record_session_activity(db, message.session_id, message.content)
+            db.commit()
+            message_saved(message.session_id, message)
+    finally:
+        db.close()
+
+register_job_handler(JOB_ASSISTANT_RESPONSE, run_assistant_response_job, abandon_assistant_response_job)
+
+def start_response_message(db: SQLAlchemySession, session_id: str, analysis_type: str = None, message_id: str = None):
+    """
+    Create the "thinking" message a response is streamed into
+    
+    Args:
+        db: Database session
+        session_id: Session the response belongs to
+        analysis_type: Analysis type stored with a new message
+        message_id: Message of an earlier, interrupted attempt, started over if it exists
+        
+    Returns:
+        The message, or None when the session no longer exists
+    """
+    # Session may have been deleted while the job was queued
+    if db.query(SessionModel.id).filter(SessionModel.id == session_id).first() is None:
+        return None
+    
+    thinking_message = None
+    if message_id:
+        thinking_message = db.query(MessageModel).filter(MessageModel.id == message_id).first()
+    
+    if thinking_message is not None:
+        # Retrying after an interrupted attempt: start the same message over
+        thinking_message.content = "I'm analyzing your request..."
+        thinking_message.isStreaming = True
+        thinking_message.version = next_message_version(db, session_id)
+        record_session_activity(db, session_id, thinking_message.content)
+    else:
         # First create a "thinking" message
         thinking_message = MessageModel.create_new(
             role="assistant",
             content="I'm analyzing your request...",
             session_id=session_id,
-            analysis_type=analysis_type
+            analysis_type=analysis_type,
+            version=next_message_version(db, session_id)
         )
         thinking_message.isStreaming = True
-        
         db.add(thinking_message)
-        db.commit()
-        db.refresh(thinking_message)
+        record_session_activity(db, session_id, thinking_message.content, added_messages=1)
+    
+    db.commit()
+    db.refresh(thinking_message)
+    # Load attachments here so building the message event does not query on the event loop
+    thinking_message.attachments
+    return thinking_message
+
+def load_attachment_files(db: SQLAlchemySession, attachment_ids: List[str]) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Find the stored files of attachments
+    
+    Args:
+        db: Database session
+        attachment_ids: IDs of the attachments
+        
+    Returns:
+        Paths, names and content hashes of the attachments whose file exists on disk
+    """
+    file_paths = []
+    file_names = []
+    content_hashes = []
+    file_attachments = db.query(FileAttachmentModel).filter(FileAttachmentModel.id.in_(attachment_ids)).all()
+    attachments_by_id = {file_attachment.id: file_attachment for file_attachment in file_attachments}
+    for file_id in attachment_ids:
+        # Check if the file exists in the database
+        file_attachment = attachments_by_id.get(file_id)
+        if file_attachment:
+            file_path = get_file_path(file_attachment)
+            
+            # Check if the file exists on disk
+            if os.path.exists(file_path):
+                file_paths.append(file_path)
+                file_names.append(file_attachment.name)
+                content_hashes.append(file_attachment.content_hash)
+                logger.debug("Found attachment on disk", extra={"file_id": file_id, "path": file_path})
+            else:
+                logger.warning("Attachment not found on disk", extra={"file_id": file_id, "file_name": file_attachment.name})
+        else:
+            logger.warning("Attachment not found in database", extra={"file_id": file_id})
+    return file_paths, file_names, content_hashes
+
+def load_conversation_history(db: SQLAlchemySession, session_id: str, exclude_id: str) -> List[Dict[str, str]]:
+    """The last 10 messages of a session in chronological order, as chat messages"""
+    # Limited to the last 10 messages to avoid token limits
+    previous_messages = db.query(MessageModel).filter(
+        MessageModel.session_id == session_id,
+        MessageModel.id != exclude_id
+    ).order_by(MessageModel.timestamp.desc()).limit(10).all()
+    return [{"role": msg.role, "content": msg.content} for msg in reversed(previous_messages)]
+
+def finish_response_message(db: SQLAlchemySession, session_id: str, message_id: str, content: str):
+    """
+    Write the final content of a response message and end its streaming
+    
+    Args:
+        db: Database session
+        session_id: Session the message belongs to
+        message_id: ID of the message
+        content: Final content
+        
+    Returns:
+        The saved message, or None when it no longer exists
+    """
+    message = db.query(MessageModel).filter(MessageModel.id == message_id).first()
+    if message is None:
+        return None
+    message.content = content
+    message.isStreaming = False
+    message.version = next_message_version(db, session_id)
+    record_session_activity(db, session_id, content)
+    db.commit()
+    db.refresh(message)
+    message.attachments
+    return message
+
+def rollback_and_finish_response_message(db: SQLAlchemySession, session_id: str, message_id: str, content: str):
+    """Roll back a failed response and end the streaming of its message, if it was created"""
+    db.rollback()
+    if message_id is None:
+        return None
+    return finish_response_message(db, session_id, message_id, content)
+
+async def create_assistant_response(
+    session_id: str,
+    user_message: str,
+    analysis_type: str = None,
+    attachment_ids: List[str] = None,
+    bypass_cache: bool = False,
+    job_id: str = None,
+    message_id: str = None
+):
+    """
+    Create an assistant response after analyzing the request
+    
+    Runs with its own database session, used from the threadpool so queries
+    do not block the event loop. When message_id refers to the message of an
+    earlier, interrupted attempt, that message is reused. Errors are written
+    into the message and then raised to fail the job.
+    """
+    db = SessionLocal()
+    thinking_id = None
+    stages = StageTimer("assistant_response")
+    try:
+        thinking_message = await run_in_threadpool(start_response_message, db, session_id, analysis_type, message_id)
+        if thinking_message is None:
+            logger.info("Session no longer exists, skipping response", extra={"session_id": session_id})
+            return
         thinking_id = thinking_message.id
+        if job_id:
+            await run_in_threadpool(update_job, job_id, resultId=thinking_id)
+        message_saved(session_id, thinking_message)
+        stages.lap("start")
+        
+        # Stream the response into the message as it is generated
+        on_delta = None
+        if STREAM_RESPONSES:
+            writer = StreamingMessageWriter(db, session_id, thinking_id)
+            active_streams[thinking_id] = writer
+            on_delta = writer.on_delta
         
         # Check if there are files to analyze
         file_paths = []
-        if attachments:
-            print(f"Processing {len(attachments)} attachments")
-            for attachment in attachments:
-                file_id = attachment.id
-                
-                # Check if the file exists in the database
-                file_attachment = db.query(FileAttachmentModel).filter(FileAttachmentModel.id == file_id).first()
-                if file_attachment:
-                    file_name = file_attachment.name
-                    file_path = os.path.join(
-                        os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
-                        "uploads", 
-                        f"{file_id}_{file_name}"
-                    )
-                    
-                    # Check if the file exists on disk
-                    if os.path.exists(file_path):
-                        file_paths.append(file_path)
-                        print(f"Found existing file: {file_path}")
-                    else:
-                        print(f"Warning: File {file_id}_{file_name} not found on disk")
-                else:
-                    print(f"Warning: File with ID {file_id} not found in database")
+        file_names = []
+        content_hashes = []
+        if attachment_ids:
+            logger.info("Processing attachments", extra={"session_id": session_id, "attachments": len(attachment_ids)})
+            with span("attachments_query", attachments=len(attachment_ids)):
+                file_paths, file_names, content_hashes = await run_in_threadpool(load_attachment_files, db, attachment_ids)
+        stages.lap("load_attachments")
         
-        # Prepare conversation history for context
-        conversation_history = []
-        # Get previous messages from this session (limited to last 10 to avoid token limits)
-        previous_messages = db.query(MessageModel).filter(
-            MessageModel.session_id == session_id,
-            MessageModel.id != thinking_id
-        ).order_by(MessageModel.timestamp.desc()).limit(10).all()
+        # Let extractions started at upload time finish so their cached result is reused;
+        # files still being extracted after EXTRACTION_WAIT_TIMEOUT are extracted by analyze_files
+        if attachment_ids:
+            with span("wait_extractions"):
+                await wait_for_extractions(attachment_ids, timeout=EXTRACTION_WAIT_TIMEOUT)
+            stages.lap("wait_extractions")
         
-        for msg in reversed(previous_messages):  # Reverse to get chronological order
-            conversation_history.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Prepare conversation history for context
+        with span("history_query"):
+            conversation_history = await run_in_threadpool(load_conversation_history, db, session_id, thinking_id)
+        stages.lap("history")
         
         # Generate response based on files and analysis type
         if file_paths:
@@ -147,26 +576,47 @@ async def create_assistant_response(session_id: str, user_message: str, analysis
             response_content = await analyze_files(
                 file_paths=file_paths,
                 analysis_type=analysis_type or "summarize",
-                user_message=user_message
+                user_message=user_message,
+                on_delta=on_delta,
+                file_names=file_names,
+                content_hashes=content_hashes,
+                use_cache=not bypass_cache
             )
         else:
             # No files to analyze, use conversation-based response
             response_content = await generate_conversation_response(
                 conversation_history=conversation_history,
-                user_message=user_message
+                user_message=user_message,
+                on_delta=on_delta
             )
+        stages.lap("generate")
         
         # Update the thinking message with the actual response
-        thinking_message = db.query(MessageModel).filter(MessageModel.id == thinking_id).first()
-        if thinking_message:
-            thinking_message.content = response_content
-            thinking_message.isStreaming = False
-            db.commit()
+        with span("save_response"):
+            thinking_message = await run_in_threadpool(finish_response_message, db, session_id, thinking_id, response_content)
+            if thinking_message:
+                active_streams.pop(thinking_id, None)
+                message_saved(session_id, thinking_message)
+        stages.lap("save")
     
     except Exception as e:
-        print(f"Error in create_assistant_response: {e}")
+        logger.error("Error creating assistant response", extra={"session_id": session_id, "job_id": job_id, "error": str(e)})
+        
+        # Do not leave the message streaming forever
+        thinking_message = await run_in_threadpool(
+            rollback_and_finish_response_message,
+            db,
+            session_id,
+            thinking_id,
+            f"Sorry, an error occurred while generating the response: {str(e)}"
+        )
+        if thinking_message:
+            message_saved(session_id, thinking_message)
+        raise
     
     finally:
-        # Close the database session if we created it
-        if db is not None and db_factory is not None:
-            db_factory.close()
+        if thinking_id is not None:
+            active_streams.pop(thinking_id, None)
+        
+        await run_in_threadpool(db.close)
+        stages.finish()
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Literal, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.schemas import SearchResults
+from app.utils.database import get_async_db
+from app.services.search import SearchUnavailableError, search
+
+router = APIRouter()
+
+# Largest page of search results returned at once
+SEARCH_MAX_LIMIT = 100
+
+@router.get("/", response_model=SearchResults)
+async def search_messages_and_files(
+    q: str,
+    type: Optional[Literal["message", "file"]] = None,
+    session_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Search messages and uploaded files, best matches first
+    
+    Every word of `q` must match; end a word with * to match it as a prefix.
+    Files match on their name and extracted text. Pass the returned
+    `next_offset` as `offset` to get the next page.
+    """
+    limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+    offset = max(offset, 0)
+    try:
+        # Fetch one extra row to know whether there is a next page
+        rows = await search(db, q, kind=type, session_id=session_id, limit=limit + 1, offset=offset)
+    except SearchUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=str(e)
+        )
+    
+    results = [
+        {
+            "type": row["kind"],
+            "id": row["ref_id"],
+            "snippet": row["snippet"],
+            "rank": row["rank"],
+            "session_id": row["session_id"],
+            "session_title": row["session_title"],
+            "role": row["role"],
+            "timestamp": row["timestamp"],
+            "file_name": row["file_name"],
+            "file_sessions": row["file_sessions"]
+        }
+        for row in rows[:limit]
+    ]
+    return {"results": results, "next_offset": offset + limit if len(rows) > limit else None}
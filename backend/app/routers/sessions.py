@@ -1,24 +1,99 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Response
-from typing import List
-from sqlalchemy.orm import Session as SQLAlchemySession
-from datetime import datetime
+from typing import List, Literal, Optional, Tuple
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as SQLAlchemySession, selectinload
+from datetime import datetime, timedelta
+import base64
+import json
 
-from app.models.schemas import Session as SessionSchema, SessionCreate
-from app.models.database import Session as SessionModel
-from app.utils.database import get_db
+from app.models.schemas import Session as SessionSchema, SessionCreate, SessionSummary, SessionPage
+from app.models.database import Session as SessionModel, Message as MessageModel
+from app.utils.database import get_db, get_async_db
 
 router = APIRouter()
 
-@router.get("/", response_model=List[SessionSchema])
-async def get_sessions(db: SQLAlchemySession = Depends(get_db)):
-    """Get all sessions"""
-    sessions = db.query(SessionModel).all()
+# Largest page of session summaries returned at once
+SESSION_PAGE_MAX_LIMIT = 200
+
+# Columns the session list can be sorted by (newest first)
+SESSION_SORT_COLUMNS = {
+    "activity": SessionModel.lastActivity,
+    "created": SessionModel.timestamp
+}
+
+def session_with_messages(session_id: str):
+    """Select a session with its messages and attachments eagerly loaded, one query per level"""
+    return select(SessionModel).options(
+        selectinload(SessionModel.messages).selectinload(MessageModel.attachments)
+    ).where(SessionModel.id == session_id)
+
+def encode_cursor(value: datetime, session_id: str) -> str:
+    """Opaque cursor for the position after a session in a sorted list"""
+    data = json.dumps([value.isoformat(), session_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        value, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(value), session_id
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/", response_model=List[SessionSummary])
+async def get_sessions(db: AsyncSession = Depends(get_async_db)):
+    """Get summaries of all sessions, without their messages"""
+    sessions = (await db.scalars(select(SessionModel))).all()
     return sessions
 
+@router.get("/page", response_model=SessionPage)
+async def get_session_page(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    sort: Literal["activity", "created"] = "activity",
+    favorites: bool = False,
+    active_within_days: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get one page of session summaries, newest first
+    
+    Sessions are sorted by last activity or by creation time. `favorites`
+    keeps only favorite sessions and `active_within_days` only sessions with
+    a message in that many recent days. Pass the returned `next_cursor` as
+    `cursor` to get the next page.
+    """
+    sort_column = SESSION_SORT_COLUMNS[sort]
+    limit = min(max(limit, 1), SESSION_PAGE_MAX_LIMIT)
+    
+    query = select(SessionModel)
+    if favorites:
+        query = query.where(SessionModel.isFavorite == True)
+    if active_within_days is not None:
+        query = query.where(SessionModel.lastActivity >= datetime.now() - timedelta(days=active_within_days))
+    if cursor:
+        # Keyset pagination: continue after the last session of the previous page
+        value, session_id = decode_cursor(cursor)
+        query = query.where(tuple_(sort_column, SessionModel.id) < tuple_(value, session_id))
+    
+    # Fetch one extra row to know whether there is a next page
+    sessions = (await db.scalars(
+        query.order_by(sort_column.desc(), SessionModel.id.desc()).limit(limit + 1)
+    )).all()
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
 @router.get("/{session_id}", response_model=SessionSchema)
-async def get_session(session_id: str, db: SQLAlchemySession = Depends(get_db)):
+async def get_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get a specific session by ID"""
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    session = (await db.scalars(session_with_messages(session_id))).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -27,7 +102,7 @@ async def get_session(session_id: str, db: SQLAlchemySession = Depends(get_db)):
     return session
 
 @router.post("/", response_model=SessionSchema, status_code=status.HTTP_201_CREATED)
-async def create_session(session: SessionCreate, db: SQLAlchemySession = Depends(get_db)):
+def create_session(session: SessionCreate, db: SQLAlchemySession = Depends(get_db)):
     """Create a new session"""
     new_session = SessionModel.create_new(title=session.title)
     db.add(new_session)
@@ -36,7 +111,7 @@ async def create_session(session: SessionCreate, db: SQLAlchemySession = Depends
     return new_session
 
 @router.put("/{session_id}", response_model=SessionSchema)
-async def update_session(session_id: str, session: SessionCreate, db: SQLAlchemySession = Depends(get_db)):
+def update_session(session_id: str, session: SessionCreate, db: SQLAlchemySession = Depends(get_db)):
     """Update a session"""
     db_session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     if not db_session:
@@ -48,11 +123,12 @@ async def update_session(session_id: str, session: SessionCreate, db: SQLAlchemy
     # Update session title
     db_session.title = session.title
     db.commit()
-    db.refresh(db_session)
-    return db_session
+    
+    # Reload with relationships; the commit expired the ones loaded before
+    return db.scalars(session_with_messages(session_id)).first()
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_session(session_id: str, db: SQLAlchemySession = Depends(get_db)):
+def delete_session(session_id: str, db: SQLAlchemySession = Depends(get_db)):
     """Delete a session"""
     db_session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     if not db_session:
@@ -67,7 +143,7 @@ async def delete_session(session_id: str, db: SQLAlchemySession = Depends(get_db
     return None
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_all_sessions(db: SQLAlchemySession = Depends(get_db)):
+def delete_all_sessions(db: SQLAlchemySession = Depends(get_db)):
     """Delete all sessions"""
     # Delete all sessions (cascade will delete related messages)
     db.query(SessionModel).delete()
@@ -75,7 +151,7 @@ async def delete_all_sessions(db: SQLAlchemySession = Depends(get_db)):
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.put("/{session_id}/favorite", response_model=SessionSchema)
-async def toggle_favorite(session_id: str, db: SQLAlchemySession = Depends(get_db)):
+def toggle_favorite(session_id: str, db: SQLAlchemySession = Depends(get_db)):
     """Toggle the favorite status of a session"""
     db_session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     if not db_session:
@@ -87,5 +163,6 @@ async def toggle_favorite(session_id: str, db: SQLAlchemySession = Depends(get_d
     # Toggle favorite status
     db_session.isFavorite = not db_session.isFavorite
     db.commit()
-    db.refresh(db_session)
-    return db_session
+    
+    # Reload with relationships; the commit expired the ones loaded before
+    return db.scalars(session_with_messages(session_id)).first()
@@ -0,0 +1,163 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Context planning settings
+CONTEXT_WINDOW_TOKENS = int(os.getenv("CONTEXT_WINDOW_TOKENS", "0"))
+CONTEXT_SAFETY_MARGIN = float(os.getenv("CONTEXT_SAFETY_MARGIN", "0.05"))
+
+# Context window sizes in tokens, matched by model name prefix (longest prefix wins)
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Characters per token when no tokenizer is available; errs towards overcounting
+APPROX_CHARS_PER_TOKEN = 3.5
+
+_encodings: Dict[str, Any] = {}
+
+def get_encoding(model: Optional[str] = None):
+    """
+    Get the tiktoken encoding for a model, or None if tiktoken cannot be used
+
+    tiktoken downloads its encoding files on first use, so a missing package or
+    no network access falls back to a character-based estimate. The outcome is
+    remembered per model so the download is only attempted once.
+    """
+    key = model or ""
+    if key not in _encodings:
+        try:
+            import tiktoken
+            try:
+                _encodings[key] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+            except KeyError:
+                _encodings[key] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("Token counting falls back to an estimate", extra={"error": str(e)})
+            _encodings[key] = None
+    return _encodings[key]
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens of a text for a model"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return int(len(text) / APPROX_CHARS_PER_TOKEN) + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    """Count the prompt tokens of chat messages, including the per-message overhead"""
+    return sum(count_tokens(message["content"], model) + 4 for message in messages) + 3
+
+def context_window(model: str) -> int:
+    """Context window of a model in tokens; CONTEXT_WINDOW_TOKENS overrides the table"""
+    if CONTEXT_WINDOW_TOKENS > 0:
+        return CONTEXT_WINDOW_TOKENS
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+def prompt_budget(model: str, max_output_tokens: int, reserved_tokens: int = 0) -> int:
+    """
+    Tokens available for content in a prompt
+
+    Args:
+        model: Model the prompt is sent to
+        max_output_tokens: Tokens reserved for the response
+        reserved_tokens: Tokens already used by the rest of the prompt
+
+    Returns:
+        The number of content tokens that still fit in the context window
+    """
+    window = context_window(model)
+    return int(window * (1 - CONTEXT_SAFETY_MARGIN)) - max_output_tokens - reserved_tokens
+
+def split_text(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Split text into pieces of at most max_tokens tokens
+
+    Pieces break at line boundaries where possible; a single line longer than
+    the limit is cut at token (or estimated character) boundaries.
+    """
+    pieces = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line, model)
+        if line_tokens > max_tokens:
+            if current:
+                pieces.append("".join(current))
+                current, current_tokens = [], 0
+            pieces.extend(split_long_line(line, max_tokens, model))
+            continue
+        if current_tokens + line_tokens > max_tokens:
+            pieces.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+def split_long_line(line: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    encoding = get_encoding(model)
+    if encoding is None:
+        size = max(1, int(max_tokens * APPROX_CHARS_PER_TOKEN))
+        return [line[start:start + size] for start in range(0, len(line), size)]
+    tokens = encoding.encode(line, disallowed_special=())
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+
+def pack_sections(sections: List[Dict[str, str]], max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Pack titled sections into as few chunks of at most max_tokens tokens as possible
+
+    Sections are kept whole and in order where they fit. A section larger than
+    a chunk is split into parts, each labelled with the section title.
+
+    Args:
+        sections: Dicts with a "title" (e.g. "File: report.pdf") and its "content"
+        max_tokens: Maximum tokens per chunk
+        model: Model used for token counting
+
+    Returns:
+        The chunk texts
+    """
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+
+    for section in sections:
+        text = f"{section['title']}\n\n{section['content']}\n\n"
+        tokens = count_tokens(text, model)
+        if tokens <= max_tokens:
+            if current_tokens + tokens > max_tokens:
+                flush()
+            current.append(text)
+            current_tokens += tokens
+            continue
+
+        # Leave room for the part label in every piece
+        label_tokens = count_tokens(f"{section['title']} (part 0000 of 0000)\n\n", model)
+        pieces = split_text(section["content"], max(1, max_tokens - label_tokens), model)
+        flush()
+        for index, piece in enumerate(pieces, start=1):
+            chunks.append(f"{section['title']} (part {index} of {len(pieces)})\n\n{piece}\n\n")
+    flush()
+    return chunks
@@ -0,0 +1,171 @@
+import os
+import hashlib
+import sqlite3
+import time
+import uuid
+from typing import Optional, Dict, Any
+
+# Extraction cache settings
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "cache", "extractions")
+)
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "512"))
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 hash of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Content-addressed disk cache for extracted file content
+
+    Entries are stored as files under the cache directory, while a small SQLite
+    index tracks their size, last access time and the hit/miss counters. Both
+    live on local disk, so every worker process on the machine shares the same
+    cache. Once the total size passes the cap, least recently used entries are
+    evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.index_path = os.path.join(directory, "index.sqlite")
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    @staticmethod
+    def make_key(content_hash: str, *parts: str) -> str:
+        """Build a cache key from a file content hash and extra parts such as the extractor version"""
+        digest = hashlib.sha256(content_hash.encode('utf-8'))
+        for part in parts:
+            digest.update(b'\x00')
+            digest.update(str(part).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached content for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        conn = self._connect()
+        try:
+            content = None
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                try:
+                    with open(self._entry_path(key), 'r', encoding='utf-8') as file:
+                        content = file.read()
+                except OSError:
+                    # The entry file disappeared, drop the stale index row
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+            with conn:
+                if content is not None:
+                    conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                    conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'hits'")
+                else:
+                    conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'misses'")
+            return content
+        finally:
+            conn.close()
+
+    def put(self, key: str, content: str):
+        """Store content for a key and evict old entries if the cache is over its size cap"""
+        if not self.enabled:
+            return
+
+        data = content.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+                    (key, len(data), time.time())
+                )
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the cache"""
+        conn = self._connect()
+        try:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        finally:
+            conn.close()
+
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "enabled": self.enabled,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+# Shared extraction cache
+extraction_cache = ExtractionCache(
+    EXTRACTION_CACHE_DIR,
+    int(EXTRACTION_CACHE_MAX_MB * 1024 * 1024),
+    enabled=EXTRACTION_CACHE_ENABLED
+)
@@ -0,0 +1,151 @@
+import os
+import logging
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.models.database import FileAttachment as FileAttachmentModel
+from app.utils.database import SessionLocal
+from app.utils.storage import get_file_path
+from app.services.openai_service import (
+    EXTRACTION_TIMEOUT,
+    EXTRACTION_TIMEOUT_GRACE,
+    extract_file_content,
+    extract_on_pool,
+    extractor_name
+)
+from app.services.metrics import BACKGROUND_TASKS_IN_FLIGHT, observe_extraction
+from app.services.extraction_pool import WorkerTimeoutError
+from app.services.search import index_file_text
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Eager extraction settings
+EAGER_EXTRACTION = os.getenv("EAGER_EXTRACTION", "true").lower() == "true"
+# Seconds a response waits for a file's eager extraction before extracting the file itself (0 means no limit)
+EXTRACTION_WAIT_TIMEOUT = float(os.getenv("EXTRACTION_WAIT_TIMEOUT", "60"))
+
+# Extraction status values stored on FileAttachment.status
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_PROCESSED = "processed"
+STATUS_ERROR = "error"
+
+# Extractions scheduled by this process that have not finished yet, by file ID
+pending_extractions: Dict[str, asyncio.Task] = {}
+
+async def extract_in_pool(file_path: str, file_name: Optional[str] = None, content_hash: Optional[str] = None) -> str:
+    """
+    Run extract_file_content on the process pool without blocking the event loop
+
+    Limited to EXTRACTION_TIMEOUT seconds like the extractions of a request:
+    the worker stops the extraction, and the wait gives up
+    EXTRACTION_TIMEOUT_GRACE seconds later if the worker cannot be interrupted.
+    """
+    extractor = extractor_name(file_name or os.path.basename(file_path))
+    input_bytes = os.path.getsize(file_path)
+    with span("extract", file_name=file_name, extractor=extractor, input_bytes=input_bytes):
+        started = time.perf_counter()
+        content = await asyncio.wait_for(
+            extract_on_pool(
+                extract_file_content,
+                file_path,
+                file_name=file_name,
+                content_hash=content_hash,
+                time_limit=EXTRACTION_TIMEOUT
+            ),
+            timeout=EXTRACTION_TIMEOUT + EXTRACTION_TIMEOUT_GRACE if EXTRACTION_TIMEOUT > 0 else None
+        )
+        observe_extraction(extractor, time.perf_counter() - started, input_bytes, len(content))
+    return content
+
+def set_extraction_status(file_id: str, status: str, progress: int):
+    """Record the extraction status and progress of a file"""
+    db = SessionLocal()
+    try:
+        db.query(FileAttachmentModel).filter(FileAttachmentModel.id == file_id).update(
+            {FileAttachmentModel.status: status, FileAttachmentModel.uploadProgress: progress},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+async def run_extraction(file_id: str, file_path: str, file_name: Optional[str] = None, content_hash: Optional[str] = None):
+    """
+    Extract a file's content on the process pool
+
+    The worker stores the result in the extraction cache, so analyses of the
+    file later read it from there instead of parsing the file again. The text
+    is also added to the search index.
+    """
+    with BACKGROUND_TASKS_IN_FLIGHT.labels("extraction").track_inprogress():
+        await run_in_threadpool(set_extraction_status, file_id, STATUS_PROCESSING, 50)
+        try:
+            content = await extract_in_pool(file_path, file_name, content_hash)
+            await run_in_threadpool(index_file_text, file_id, content)
+            await run_in_threadpool(set_extraction_status, file_id, STATUS_PROCESSED, 100)
+        except (asyncio.TimeoutError, WorkerTimeoutError):
+            logger.warning("Extraction timed out", extra={"file_id": file_id, "timeout": EXTRACTION_TIMEOUT})
+            await run_in_threadpool(set_extraction_status, file_id, STATUS_ERROR, 100)
+        except Exception as e:
+            logger.error("Error extracting file content", extra={"file_id": file_id, "error": str(e)})
+            await run_in_threadpool(set_extraction_status, file_id, STATUS_ERROR, 100)
+
+def schedule_extraction(
+    file_id: str,
+    file_path: str,
+    file_name: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> Optional[asyncio.Task]:
+    """Queue extraction of an uploaded file in the background"""
+    if not EAGER_EXTRACTION:
+        return None
+
+    task = asyncio.create_task(run_extraction(file_id, file_path, file_name, content_hash))
+    pending_extractions[file_id] = task
+    task.add_done_callback(lambda _: pending_extractions.pop(file_id, None))
+    return task
+
+async def wait_for_extractions(file_ids: List[str], timeout: Optional[float] = EXTRACTION_WAIT_TIMEOUT) -> List[str]:
+    """
+    Wait until any pending extractions of the given files have finished
+
+    Gives up after `timeout` seconds (None or 0 means no limit). The caller
+    then extracts the files that are still pending itself, as it does when
+    eager extraction is off.
+
+    Returns:
+        IDs of the files whose extraction had not finished
+    """
+    tasks = {file_id: pending_extractions[file_id] for file_id in file_ids if file_id in pending_extractions}
+    if not tasks:
+        return []
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout or None)
+    unfinished = [file_id for file_id, task in tasks.items() if task in pending]
+    if unfinished:
+        logger.warning("Stopped waiting for extractions", extra={"files": len(unfinished), "timeout": timeout})
+    return unfinished
+
+def requeue_unfinished_extractions():
+    """Schedule extraction again for files whose extraction was interrupted by a restart"""
+    if not EAGER_EXTRACTION:
+        return
+
+    db = SessionLocal()
+    try:
+        unfinished = db.query(FileAttachmentModel).filter(
+            FileAttachmentModel.status.in_([STATUS_QUEUED, STATUS_PROCESSING])
+        ).all()
+        files = [(file.id, get_file_path(file), file.name, file.content_hash) for file in unfinished]
+    finally:
+        db.close()
+
+    for file_id, file_path, file_name, content_hash in files:
+        if os.path.exists(file_path):
+            schedule_extraction(file_id, file_path, file_name, content_hash)
+        else:
+            set_extraction_status(file_id, STATUS_ERROR, 100)
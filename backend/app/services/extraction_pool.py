@@ -0,0 +1,82 @@
+import os
+import signal
+import asyncio
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.utils.logging_config import configure_logging
+from app.services.profiling import active_profile, call_profiled
+
+# Number of worker processes used for file extraction
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def init_worker():
+    """Set up an extraction worker process"""
+    configure_logging()
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the shared process pool used for file extraction, creating it on first use"""
+    global _executor
+    if _executor is None:
+        # Spawn fresh interpreters: forking a process that runs an event loop and threads is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker
+        )
+    return _executor
+
+class WorkerTimeoutError(Exception):
+    """Raised inside a worker process when a task runs past its time limit"""
+
+def _raise_timeout(signum, frame):
+    raise WorkerTimeoutError("Task ran past its time limit")
+
+def call_with_time_limit(seconds: float, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run func in a worker process, interrupting it after `seconds`
+    
+    A SIGALRM timer raises WorkerTimeoutError in the worker, so a task the
+    caller gave up on does not keep holding its worker. The timer fires
+    between Python bytecodes, so a long call into C code is only stopped once
+    it returns. Without setitimer (Windows) the task runs to completion.
+    """
+    if seconds <= 0 or not hasattr(signal, "setitimer"):
+        return func(*args, **kwargs)
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def shutdown_executor():
+    """Stop the extraction process pool"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def run_in_pool(func: Callable[..., Any], *args, time_limit: float = 0, **kwargs) -> Any:
+    """
+    Run a picklable module-level function on the extraction pool without blocking the event loop
+    
+    With a time_limit (seconds), the worker stops the function once it runs
+    that long and WorkerTimeoutError is raised. When the caller is being
+    profiled, the function is profiled in the worker and its statistics are
+    added to the caller's profile.
+    """
+    loop = asyncio.get_running_loop()
+    call = partial(call_with_time_limit, time_limit, func, *args, **kwargs)
+    profile = active_profile.get()
+    if profile is None:
+        return await loop.run_in_executor(get_executor(), call)
+    
+    result, stats = await loop.run_in_executor(get_executor(), partial(call_profiled, call))
+    profile.add_worker_stats(stats)
+    return result
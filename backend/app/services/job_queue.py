@@ -0,0 +1,280 @@
+import os
+import logging
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from app.models.database import Job as JobModel
+from app.utils.database import SessionLocal
+from app.services.metrics import BACKGROUND_TASKS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Job worker settings
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# Job status values
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while JOB_MAX_QUEUED jobs are already waiting"""
+    pass
+
+class JobHandler:
+    """A registered job type: the coroutine that runs it and an optional hook for jobs given up on"""
+
+    def __init__(self, run: Callable[[JobModel], Awaitable[None]], on_abandoned: Optional[Callable[[JobModel], None]] = None):
+        self.run = run
+        self.on_abandoned = on_abandoned
+
+job_handlers: Dict[str, JobHandler] = {}
+
+def register_job_handler(
+    job_type: str,
+    run: Callable[[JobModel], Awaitable[None]],
+    on_abandoned: Optional[Callable[[JobModel], None]] = None
+):
+    """
+    Register the handler for a job type
+
+    Args:
+        job_type: Type name stored on the job
+        run: Coroutine called with the (detached) job; raising marks the job failed
+        on_abandoned: Called with the job when its worker died and it will not be retried
+    """
+    job_handlers[job_type] = JobHandler(run, on_abandoned)
+
+def job_payload(job: JobModel) -> Dict[str, Any]:
+    return json.loads(job.payload)
+
+def enqueue_job(db, job_type: str, payload: Dict[str, Any], priority: int = 0, session_id: Optional[str] = None) -> JobModel:
+    """
+    Add a job to the queue in the caller's transaction
+
+    The job becomes visible to workers when the caller commits; call
+    worker_pool.notify() afterwards to start it without waiting for the next poll.
+
+    Raises:
+        QueueFullError: If JOB_MAX_QUEUED jobs are already waiting
+    """
+    queued = db.query(func.count(JobModel.id)).filter(JobModel.status == STATUS_QUEUED).scalar()
+    if JOB_MAX_QUEUED > 0 and queued >= JOB_MAX_QUEUED:
+        raise QueueFullError(f"Too many queued jobs ({queued}), please try again shortly")
+
+    job = JobModel.create_new(job_type, json.dumps(payload), priority=priority, session_id=session_id)
+    db.add(job)
+    return job
+
+def update_job(job_id: str, **values):
+    """Update columns of a job in its own transaction"""
+    db = SessionLocal()
+    try:
+        db.query(JobModel).filter(JobModel.id == job_id).update(
+            {getattr(JobModel, name): value for name, value in values.items()},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def claim_next_job() -> Optional[JobModel]:
+    """
+    Atomically move the next queued job to running and return it
+
+    The claim is a conditional UPDATE, so when several workers or processes
+    race for the same job only one of them gets it.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            candidate = db.query(JobModel.id).filter(
+                JobModel.status == STATUS_QUEUED
+            ).order_by(JobModel.priority.desc(), JobModel.timestamp).first()
+            if candidate is None:
+                return None
+
+            now = datetime.now()
+            claimed = db.query(JobModel).filter(
+                JobModel.id == candidate.id,
+                JobModel.status == STATUS_QUEUED
+            ).update(
+                {
+                    JobModel.status: STATUS_RUNNING,
+                    JobModel.attempts: JobModel.attempts + 1,
+                    JobModel.startedAt: now,
+                    JobModel.heartbeatAt: now
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            if claimed:
+                job = db.get(JobModel, candidate.id)
+                db.expunge(job)
+                return job
+    finally:
+        db.close()
+
+def reclaim_jobs():
+    """
+    Requeue running jobs whose worker stopped sending heartbeats
+
+    Jobs that already used JOB_MAX_ATTEMPTS attempts are marked failed and
+    their handler's on_abandoned hook is called. Finished jobs older than
+    JOB_RETENTION_HOURS are deleted.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        expired = db.query(JobModel).filter(
+            JobModel.status == STATUS_RUNNING,
+            JobModel.heartbeatAt < now - timedelta(seconds=JOB_LEASE_SECONDS)
+        ).all()
+
+        abandoned = []
+        for job in expired:
+            if job.attempts < JOB_MAX_ATTEMPTS:
+                logger.warning("Requeuing job after its worker stopped", extra={"job_id": job.id, "job_type": job.type})
+                job.status = STATUS_QUEUED
+            else:
+                logger.error("Giving up on job", extra={"job_id": job.id, "job_type": job.type, "attempts": job.attempts})
+                job.status = STATUS_FAILED
+                job.error = "The worker running this job stopped"
+                job.finishedAt = now
+                abandoned.append(job)
+
+        db.query(JobModel).filter(
+            JobModel.status.in_([STATUS_COMPLETED, STATUS_FAILED]),
+            JobModel.finishedAt < now - timedelta(hours=JOB_RETENTION_HOURS)
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        for job in abandoned:
+            handler = job_handlers.get(job.type)
+            if handler and handler.on_abandoned:
+                try:
+                    handler.on_abandoned(job)
+                except Exception as e:
+                    logger.exception("Error cleaning up job", extra={"job_id": job.id})
+    finally:
+        db.close()
+
+def queue_stats() -> Dict[str, Any]:
+    """Job counts by status and the worker settings of this process"""
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(JobModel.status, func.count(JobModel.id)).group_by(JobModel.status).all())
+    finally:
+        db.close()
+    return {
+        "queued": counts.get(STATUS_QUEUED, 0),
+        "running": counts.get(STATUS_RUNNING, 0),
+        "completed": counts.get(STATUS_COMPLETED, 0),
+        "failed": counts.get(STATUS_FAILED, 0),
+        "workers": JOB_WORKERS,
+        "max_queued": JOB_MAX_QUEUED
+    }
+
+class JobWorkerPool:
+    """
+    Fixed number of asyncio workers running jobs from the jobs table
+
+    Workers wake up when a job is submitted in this process and otherwise
+    poll every JOB_POLL_INTERVAL seconds, so jobs submitted by other processes
+    are picked up too. While a job runs its heartbeat is refreshed; a
+    background loop requeues jobs whose heartbeat expired. Queue updates run
+    in the threadpool so a busy database does not stall the event loop.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.tasks: List[asyncio.Task] = []
+        self.wakeup = asyncio.Event()
+
+    def start(self):
+        reclaim_jobs()
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.reclaimer()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def notify(self):
+        self.wakeup.set()
+
+    def is_running(self) -> bool:
+        """Whether the workers were started and none of them has died"""
+        return bool(self.tasks) and not any(task.done() for task in self.tasks)
+
+    async def worker(self):
+        while True:
+            # Clear before looking for work so a job submitted meanwhile still wakes us
+            self.wakeup.clear()
+            try:
+                job = await run_in_threadpool(claim_next_job)
+            except Exception as e:
+                logger.exception("Error claiming job")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.run_job(job)
+
+    async def run_job(self, job: JobModel):
+        handler = job_handlers.get(job.type)
+        if handler is None:
+            await run_in_threadpool(update_job, job.id, status=STATUS_FAILED, error=f"Unknown job type: {job.type}", finishedAt=datetime.now())
+            return
+
+        heartbeat = asyncio.create_task(self.heartbeat(job.id))
+        try:
+            with BACKGROUND_TASKS_IN_FLIGHT.labels(job.type).track_inprogress():
+                await handler.run(job)
+            await run_in_threadpool(update_job, job.id, status=STATUS_COMPLETED, error=None, finishedAt=datetime.now())
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without using up an attempt
+            update_job(job.id, status=STATUS_QUEUED, attempts=max(job.attempts - 1, 0))
+            raise
+        except Exception as e:
+            logger.exception("Error running job", extra={"job_id": job.id, "job_type": job.type})
+            await run_in_threadpool(update_job, job.id, status=STATUS_FAILED, error=str(e), finishedAt=datetime.now())
+        finally:
+            heartbeat.cancel()
+
+    async def heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await run_in_threadpool(update_job, job_id, heartbeatAt=datetime.now())
+            except Exception as e:
+                logger.warning("Error refreshing job heartbeat", extra={"job_id": job_id, "error": str(e)})
+
+    async def reclaimer(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 2)
+            try:
+                await run_in_threadpool(reclaim_jobs)
+            except Exception as e:
+                logger.exception("Error reclaiming jobs")
+
+# Shared worker pool, started with the application
+worker_pool = JobWorkerPool(JOB_WORKERS)
@@ -0,0 +1,322 @@
+import json
+import random
+from collections import Counter
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+
+class JsonValueTooLargeError(ValueError):
+    """A single JSON value is larger than the reader's max_value_size"""
+
+class JsonStreamReader:
+    """
+    Incremental reader for the values of a JSON document
+
+    Text is read in chunks and decoded with JSONDecoder.raw_decode, so only the
+    value currently being parsed has to fit in memory. With max_value_size
+    set, a value (or malformed input that never decodes) larger than that many
+    characters raises JsonValueTooLargeError instead of being read to the end
+    of the file.
+    """
+
+    def __init__(self, file: TextIO, chunk_size: int = 1024 * 1024, max_value_size: int = 0):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.max_value_size = max_value_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, min_size: int = 0):
+        data = self.file.read(max(self.chunk_size, min_size))
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at the end of the input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def _fill_value(self):
+        """Read more of the value being decoded, unless it is already over max_value_size"""
+        if self.max_value_size and len(self.buffer) - self.pos > self.max_value_size:
+            raise JsonValueTooLargeError(
+                f"A JSON value is larger than {self.max_value_size} characters, or the JSON is malformed"
+            )
+        # Grow the read size with the buffer so huge values parse in linear time
+        self._fill(len(self.buffer))
+
+    def value(self) -> Any:
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill_value()
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._fill_value()
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+    def iter_keys(self) -> Iterator[str]:
+        """
+        Yield the keys of the object starting at the current position
+
+        The caller reads each key's value (with value, iter_array or
+        iter_keys) before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def iter_object(self) -> Iterator[Tuple[str, Any]]:
+        """Yield the (key, value) members of the object starting at the current position"""
+        for key in self.iter_keys():
+            yield key, self.value()
+
+def json_type_name(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+class PathStats:
+    """Types and distinct scalar values seen at one key path"""
+
+    def __init__(self):
+        self.occurrences = 0
+        self.types: Counter = Counter()
+        self.distinct: set = set()
+        self.distinct_capped = False
+
+class JsonProfiler:
+    """
+    Single-pass profile of a stream of JSON records
+
+    Infers a schema as key paths with their types and (capped) distinct value
+    counts, and keeps a reservoir sample of whole records. Memory is bounded by
+    the number of paths, the distinct cap and the sample size, not the input.
+    """
+
+    def __init__(self, sample_size: int = 10, max_distinct: int = 1000, max_paths: int = 500, seed: int = 0):
+        self.sample_size = sample_size
+        self.max_distinct = max_distinct
+        self.max_paths = max_paths
+        self.rng = random.Random(seed)
+        self.records = 0
+        self.sample: List[Any] = []
+        self.paths: Dict[str, PathStats] = {}
+        self.paths_capped = False
+
+    def add(self, record: Any, path: str = "$"):
+        """Add a record; `path` is where the record sits in the document"""
+        self.records += 1
+
+        # Reservoir sampling (Algorithm R)
+        if len(self.sample) < self.sample_size:
+            self.sample.append(record)
+        else:
+            slot = self.rng.randrange(self.records)
+            if slot < self.sample_size:
+                self.sample[slot] = record
+
+        self._walk(record, path)
+
+    def _walk(self, value: Any, path: str):
+        stats = self.paths.get(path)
+        if stats is None:
+            if len(self.paths) >= self.max_paths:
+                self.paths_capped = True
+                return
+            stats = self.paths[path] = PathStats()
+
+        stats.occurrences += 1
+        stats.types[json_type_name(value)] += 1
+
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self._walk(item, f"{path}.{key}")
+        elif isinstance(value, list):
+            for item in value:
+                self._walk(item, f"{path}[]")
+        elif not stats.distinct_capped:
+            stats.distinct.add(hash((type(value).__name__, value)))
+            if len(stats.distinct) >= self.max_distinct:
+                stats.distinct_capped = True
+
+    def summary(self, record_label: str, max_record_chars: int = 1000) -> str:
+        """Format the profile as text for the prompt"""
+        lines = [f"{record_label}: {self.records}", "", "Schema (key path: types, occurrences, distinct values):"]
+        for path, stats in self.paths.items():
+            types = ", ".join(
+                f"{name} {count / stats.occurrences:.0%}" if len(stats.types) > 1 else name
+                for name, count in stats.types.most_common()
+            )
+            line = f"  {path}: {types}, {stats.occurrences} occurrences"
+            if stats.distinct:
+                distinct = f"{self.max_distinct}+" if stats.distinct_capped else str(len(stats.distinct))
+                line += f", {distinct} distinct"
+            lines.append(line)
+        if self.paths_capped:
+            lines.append(f"  [...more key paths not shown (limit of {self.max_paths})...]")
+
+        lines.append("")
+        lines.append(f"Sample of {len(self.sample)} records (random sample):")
+        for record in self.sample:
+            text = json.dumps(record, indent=2, ensure_ascii=False, default=str)
+            if len(text) > max_record_chars:
+                text = text[:max_record_chars] + "\n[...record truncated...]"
+            lines.append(text)
+        return "\n".join(lines)
+
+# How many levels of nested objects profile_json_document descends into to find arrays
+MAX_STREAM_DEPTH = 16
+
+def profile_object_members(reader: JsonStreamReader, profiler: JsonProfiler, path: str = "$", depth: int = 0) -> int:
+    """
+    Profile the object at the reader's position one member at a time
+
+    Arrays among the members are profiled element by element and nested
+    objects member by member (down to MAX_STREAM_DEPTH levels), so a document
+    like {"data": [...]} is never read as one value. Other members are
+    profiled as single-key records.
+
+    Returns:
+        The number of keys of the object
+    """
+    keys = 0
+    for key in reader.iter_keys():
+        keys += 1
+        first = reader.peek()
+        if first == "[":
+            for item in reader.iter_array():
+                profiler.add(item, f"{path}.{key}[]")
+        elif first == "{" and depth < MAX_STREAM_DEPTH:
+            profile_object_members(reader, profiler, f"{path}.{key}", depth + 1)
+        else:
+            profiler.add({key: reader.value()}, path)
+    return keys
+
+def profile_json_document(file: TextIO, profiler: JsonProfiler, max_value_size: int = 0) -> Tuple[str, int]:
+    """
+    Profile a JSON document without loading it whole
+
+    Elements of a top-level array are profiled one at a time. A top-level
+    object is profiled member by member, with the elements of arrays it
+    contains (at any object depth) profiled one at a time.
+
+    Args:
+        file: The document
+        profiler: Profiler the elements are added to
+        max_value_size: Largest element, in characters, read into memory (0 means no limit)
+
+    Returns:
+        The top-level type name and its length (array length or number of top-level keys)
+
+    Raises:
+        JsonValueTooLargeError: If an element is larger than max_value_size
+        ValueError: If the input is not a single JSON document
+    """
+    reader = JsonStreamReader(file, max_value_size=max_value_size)
+    first = reader.peek()
+    if first == "[":
+        structure = "list"
+        for item in reader.iter_array():
+            profiler.add(item, "$[]")
+    elif first == "{":
+        structure = "dict"
+        length = profile_object_members(reader, profiler)
+    else:
+        value = reader.value()
+        structure = type(value).__name__
+        profiler.add(value)
+
+    if reader.peek() != "":
+        raise ValueError("Extra data after the JSON document")
+    return structure, length if structure == "dict" else profiler.records
+
+def profile_jsonl(file: TextIO, profiler: JsonProfiler, max_value_size: int = 0) -> Tuple[int, int]:
+    """
+    Profile a JSON Lines file one line at a time
+
+    Args:
+        file: The JSON Lines file
+        profiler: Profiler the records are added to
+        max_value_size: Longest line, in characters, read into memory (0 means no limit);
+            longer lines are skipped and counted as errors
+
+    Returns:
+        The number of lines and the number of lines that failed to parse or were too long
+    """
+    lines = 0
+    errors = 0
+    while True:
+        line = file.readline(max_value_size + 1) if max_value_size else file.readline()
+        if not line:
+            break
+        lines += 1
+        if max_value_size and len(line) > max_value_size and not line.endswith("\n"):
+            # Skip the rest of the line a chunk at a time
+            while line and not line.endswith("\n"):
+                line = file.readline(max_value_size + 1)
+            errors += 1
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            profiler.add(json.loads(line))
+        except ValueError:
+            errors += 1
+    return lines, errors
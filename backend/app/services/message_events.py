@@ -0,0 +1,62 @@
+import asyncio
+from typing import Dict, Any, Set
+
+class MessageEventBroker:
+    """
+    In-process publish/subscribe hub for message events
+
+    Each subscriber gets its own bounded queue per session. Publishing never
+    blocks: if a slow subscriber's queue is full the oldest event is dropped,
+    and the subscriber can recover by re-reading the message from the database.
+
+    Separately, change notifications wake long-polling readers whenever a
+    session's messages are written to the database.
+    """
+
+    def __init__(self, max_queue_size: int = 1000):
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._change_events: Dict[str, asyncio.Event] = {}
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """Register a new subscriber for a session and return its queue"""
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        """Remove a subscriber queue from a session"""
+        queues = self._subscribers.get(session_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[session_id]
+
+    def publish(self, session_id: str, event: Dict[str, Any]):
+        """Send an event to every subscriber of a session"""
+        for queue in list(self._subscribers.get(session_id, ())):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+    def change_event(self, session_id: str) -> asyncio.Event:
+        """
+        Get the event that is set on the next change to a session's messages
+
+        Grab the event before reading from the database, then wait on it, so a
+        change committed between the read and the wait is not missed.
+        """
+        return self._change_events.setdefault(session_id, asyncio.Event())
+
+    def notify_change(self, session_id: str):
+        """Wake every reader waiting for changes to a session's messages"""
+        event = self._change_events.pop(session_id, None)
+        if event is not None:
+            event.set()
+
+# Shared broker used by the message router
+broker = MessageEventBroker()
@@ -0,0 +1,197 @@
+import os
+import time
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# Metrics settings
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUERY_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(11))  # 1 KB to 1 GB
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "report_agent_http_request_duration_seconds",
+    "HTTP request latency until the response is complete, by route template",
+    ["method", "route", "status"],
+    buckets=DURATION_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "report_agent_http_requests_in_progress",
+    "HTTP requests being handled, including open long polls and streams",
+    ["method", "route"]
+)
+PIPELINE_STAGE_DURATION = Histogram(
+    "report_agent_pipeline_stage_duration_seconds",
+    "Time spent in each stage of the response pipelines; stage \"total\" is the whole run",
+    ["pipeline", "stage"],
+    buckets=DURATION_BUCKETS
+)
+EXTRACTION_DURATION = Histogram(
+    "report_agent_extraction_duration_seconds",
+    "File extraction time on the process pool, including waiting for a worker and cache hits",
+    ["extractor"],
+    buckets=DURATION_BUCKETS
+)
+EXTRACTION_INPUT_BYTES = Histogram(
+    "report_agent_extraction_input_bytes",
+    "Size of the files extracted",
+    ["extractor"],
+    buckets=SIZE_BUCKETS
+)
+EXTRACTION_OUTPUT_CHARS = Histogram(
+    "report_agent_extraction_output_chars",
+    "Length of the extracted text",
+    ["extractor"],
+    buckets=SIZE_BUCKETS
+)
+LLM_REQUEST_DURATION = Histogram(
+    "report_agent_llm_request_duration_seconds",
+    "Chat completion latency per attempt, until the full response (or stream) is received",
+    ["model", "outcome"],
+    buckets=DURATION_BUCKETS
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "report_agent_llm_time_to_first_token_seconds",
+    "Time until the first text of a streamed completion arrives",
+    ["model"],
+    buckets=DURATION_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "report_agent_llm_tokens",
+    "Tokens per completion as reported by the API",
+    ["model", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+LLM_FALLBACKS = Counter(
+    "report_agent_llm_fallbacks_total",
+    "Completions that moved past a model in the fallback chain, by that model and why",
+    ["model", "reason"]
+)
+LLM_RETRIES = Counter(
+    "report_agent_llm_retries_total",
+    "Completion attempts retried on the same model",
+    ["model"]
+)
+LLM_HEDGES = Counter(
+    "report_agent_llm_hedges_total",
+    "Completions hedged to the next model after running past the p95 latency",
+    ["model"]
+)
+BACKGROUND_TASKS_IN_FLIGHT = Gauge(
+    "report_agent_background_tasks_in_flight",
+    "Background jobs and extractions running in this process",
+    ["kind"]
+)
+DB_QUERY_DURATION = Histogram(
+    "report_agent_db_query_duration_seconds",
+    "Database statement execution time; the _count series counts statements",
+    ["engine", "statement"],
+    buckets=QUERY_DURATION_BUCKETS
+)
+
+# Statement types told apart in the database metrics
+STATEMENT_TYPES = {"select", "insert", "update", "delete"}
+
+class StageTimer:
+    """
+    Times the consecutive stages of one pipeline run
+
+    Each lap() records the time since the previous lap (or since the timer
+    was created) as the duration of the named stage; finish() records the
+    whole run as stage "total".
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.started = self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        PIPELINE_STAGE_DURATION.labels(self.pipeline, stage).observe(now - self.last)
+        self.last = now
+
+    def finish(self):
+        PIPELINE_STAGE_DURATION.labels(self.pipeline, "total").observe(time.perf_counter() - self.started)
+
+def observe_extraction(extractor: str, seconds: float, input_bytes: Optional[int], output_chars: int):
+    """Record one file extraction"""
+    EXTRACTION_DURATION.labels(extractor).observe(seconds)
+    if input_bytes is not None:
+        EXTRACTION_INPUT_BYTES.labels(extractor).observe(input_bytes)
+    EXTRACTION_OUTPUT_CHARS.labels(extractor).observe(output_chars)
+
+def observe_completion(model: str, seconds: float, outcome: str, usage=None):
+    """Record one chat completion attempt and, when the API reported it, its token usage"""
+    LLM_REQUEST_DURATION.labels(model, outcome).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").observe(usage.prompt_tokens)
+        LLM_TOKENS.labels(model, "completion").observe(usage.completion_tokens)
+
+def statement_type(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    keyword = words[0].lower() if words else ""
+    return keyword if keyword in STATEMENT_TYPES else "other"
+
+def instrument_engine(engine: Engine, name: str):
+    """Record the duration of every statement run on an engine (for async engines, pass .sync_engine)"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def observe_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_DURATION.labels(name, statement_type(statement)).observe(time.perf_counter() - context.query_started)
+
+def route_template(scope) -> str:
+    """The path template of the route a request goes to, so metrics are not split by IDs"""
+    method_mismatch = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and method_mismatch is None:
+            method_mismatch = route.path
+    return method_mismatch or "unmatched"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and status of every HTTP request
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so streamed
+    responses pass through unbuffered; their latency lasts until the stream
+    ends.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
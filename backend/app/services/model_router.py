@@ -0,0 +1,329 @@
+import os
+import logging
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set, TypeVar
+
+from app.services.metrics import LLM_FALLBACKS, LLM_HEDGES, LLM_RETRIES
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Result type of the completion function a router call runs
+T = TypeVar("T")
+
+# Circuit breaker settings
+CIRCUIT_ERROR_THRESHOLD = float(os.getenv("CIRCUIT_ERROR_THRESHOLD", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+# Retry settings; retries across all requests are limited to a share of the request rate
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+
+# Hedged requests for non-streaming completions (optional)
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+class ModelUnavailableError(Exception):
+    """Raised when every model in the chain has an open circuit"""
+    pass
+
+def is_transient_error(error: Exception) -> bool:
+    """Errors worth retrying on the same model: timeouts, connection errors, rate limits and 5xx"""
+    # Imported here so importing the router does not load openai; by now the client has done so
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+    if isinstance(error, (APIConnectionError, RateLimitError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+def is_model_failure(error: Exception) -> bool:
+    """Errors that say something about the model's health rather than the request"""
+    from openai import NotFoundError
+    return is_transient_error(error) or isinstance(error, NotFoundError)
+
+class ModelHealth:
+    """
+    Rolling error rate, latency and circuit state of one model
+
+    The circuit opens when the error rate over the last CIRCUIT_WINDOW_SECONDS
+    reaches CIRCUIT_ERROR_THRESHOLD (with at least CIRCUIT_MIN_CALLS calls).
+    After CIRCUIT_COOLDOWN_SECONDS a single probe request is let through; its
+    outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.outcomes = deque()  # (time, succeeded)
+        self.latencies = deque(maxlen=200)  # Seconds, successful non-streaming calls only
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= CIRCUIT_COOLDOWN_SECONDS:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Check whether a request may go to the model, reserving the probe when half-open"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, succeeded: bool, latency: Optional[float] = None):
+        now = time.monotonic()
+        self.outcomes.append((now, succeeded))
+        while self.outcomes and now - self.outcomes[0][0] > CIRCUIT_WINDOW_SECONDS:
+            self.outcomes.popleft()
+        if succeeded and latency is not None:
+            self.latencies.append(latency)
+
+        if self.probing:
+            self.probing = False
+            self.opened_at = None if succeeded else now
+            if succeeded:
+                self.outcomes.clear()
+            return
+
+        calls = len(self.outcomes)
+        if self.opened_at is None and calls >= CIRCUIT_MIN_CALLS and self.error_rate() >= CIRCUIT_ERROR_THRESHOLD:
+            logger.warning("Opening circuit for model", extra={"model": self.model, "error_rate": round(self.error_rate(), 3), "calls": calls})
+            self.opened_at = now
+
+    def release(self):
+        """Give back a probe reservation that ended without an outcome"""
+        self.probing = False
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, succeeded in self.outcomes if not succeeded) / len(self.outcomes)
+
+    def latency_p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "model": self.model,
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "error_rate": self.error_rate(),
+            "latency_p95": self.latency_p95()
+        }
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a share of the request rate
+
+    Every request adds RETRY_BUDGET_RATIO tokens and every retry spends one,
+    so a failing backend cannot multiply the load by the retry count.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class ModelRouter:
+    """
+    Routes completions over a chain of models
+
+    Models with an open circuit are skipped, transient errors are retried
+    with jittered exponential backoff while the retry budget allows, and
+    non-streaming calls can be hedged to the next model once the current one
+    runs past its p95 latency.
+    """
+
+    def __init__(self):
+        self.health: Dict[str, ModelHealth] = {}
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX_TOKENS)
+
+    def model_health(self, model: str) -> ModelHealth:
+        if model not in self.health:
+            self.health[model] = ModelHealth(model)
+        return self.health[model]
+
+    def status(self) -> List[Dict[str, object]]:
+        """Health of every model seen so far"""
+        return [health.status() for health in self.health.values()]
+
+    async def complete(
+        self,
+        models: List[str],
+        run: Callable[[str], Awaitable[T]],
+        hedge: bool = False,
+        committed: Callable[[], bool] = lambda: False,
+        fits: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> T:
+        """
+        Run a completion on the first healthy model of the chain
+
+        Args:
+            models: Models in order of preference
+            run: Coroutine function running the completion on a given model
+            hedge: Non-streaming call; its latency is tracked and it may be hedged to the next model
+            committed: Returns True once output was delivered and the call can no longer move to another model
+            fits: Coroutine function checking whether the request fits a fallback model; only called
+                when a model after the first is about to be used, and models it rejects are skipped
+
+        Returns:
+            The result of run
+        """
+        self.retry_budget.deposit()
+        tried: Set[str] = set()
+        first_error: Optional[Exception] = None
+
+        for index, model in enumerate(models):
+            if model in tried:
+                continue
+            health = self.model_health(model)
+            if not health.allow_request():
+                logger.info("Skipping model with open circuit", extra={"model": model, "circuit": health.state})
+                LLM_FALLBACKS.labels(model, "circuit_open").inc()
+                continue
+            if index > 0 and fits is not None and not await fits(model):
+                # Do not keep the half-open probe for a model that is not called
+                health.release()
+                continue
+
+            hedge_models = [m for m in models[index + 1:] if m not in tried] if hedge and HEDGE_REQUESTS else []
+            try:
+                return await self._run_with_retries(
+                    model, run, hedge_models[0] if hedge_models else None, tried, committed, measure=hedge, fits=fits
+                )
+            except Exception as e:
+                logger.warning("Error with model", extra={"model": model, "error": str(e)})
+                # A stream that already produced output cannot be restarted on another model
+                if committed():
+                    raise
+                LLM_FALLBACKS.labels(model, "error").inc()
+                first_error = first_error or e
+
+        if first_error is None:
+            raise ModelUnavailableError(f"All models are unavailable (circuit open): {', '.join(models)}")
+        # Like a plain fallback chain, report the error of the preferred model
+        raise first_error
+
+    async def _run_with_retries(
+        self,
+        model: str,
+        run: Callable[[str], Awaitable[T]],
+        hedge_model: Optional[str],
+        tried: Set[str],
+        committed: Callable[[], bool],
+        measure: bool,
+        fits: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await self._run_hedged(model, run, hedge_model, tried, measure, fits)
+            except Exception as e:
+                if (committed() or not is_transient_error(e) or attempt >= MODEL_MAX_RETRIES
+                        or not self.model_health(model).allow_request()):
+                    raise
+                if not self.retry_budget.withdraw():
+                    logger.warning("Retry budget exhausted, not retrying", extra={"model": model})
+                    raise
+                attempt += 1
+                LLM_RETRIES.labels(model).inc()
+                # Full jitter keeps retries from many requests from arriving in lockstep
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                logger.info("Retrying model", extra={"model": model, "delay": round(delay, 2), "attempt": attempt, "max_retries": MODEL_MAX_RETRIES, "error": str(e)})
+                await asyncio.sleep(delay)
+
+    async def _run_hedged(
+        self,
+        model: str,
+        run: Callable[[str], Awaitable[T]],
+        hedge_model: Optional[str],
+        tried: Set[str],
+        measure: bool,
+        fits: Optional[Callable[[str], Awaitable[bool]]] = None
+    ) -> T:
+        threshold = self.model_health(model).latency_p95() if hedge_model else None
+        if threshold is None:
+            return await self._run_timed(model, run, tried, measure)
+
+        primary = asyncio.ensure_future(self._run_timed(model, run, tried, measure=True))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        hedge_health = self.model_health(hedge_model)
+        if done or not hedge_health.allow_request():
+            return await primary
+        if fits is not None and not await fits(hedge_model):
+            hedge_health.release()
+            return await primary
+
+        logger.info("Model is past its p95 latency, hedging", extra={"model": model, "p95": round(threshold, 2), "hedge_model": hedge_model})
+        LLM_HEDGES.labels(model).inc()
+        hedged = asyncio.ensure_future(self._run_timed(hedge_model, run, tried, measure=True))
+        pending = {primary, hedged}
+        first_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _run_timed(
+        self,
+        model: str,
+        run: Callable[[str], Awaitable[T]],
+        tried: Set[str],
+        measure: bool = False
+    ) -> T:
+        """Run the completion on one model and record the outcome; latency is kept when measure is set"""
+        health = self.model_health(model)
+        tried.add(model)
+        started = time.monotonic()
+        recorded = False
+        try:
+            with span("model_attempt", model=model):
+                result = await run(model)
+            health.record(True, time.monotonic() - started if measure else None)
+            recorded = True
+            return result
+        except Exception as e:
+            health.record(not is_model_failure(e))
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                # Cancelled, e.g. the losing side of a hedged request
+                health.release()
+
+# Shared router used for all completions in this process
+model_router = ModelRouter()
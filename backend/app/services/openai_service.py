@@ -1,35 +1,322 @@
 import os
+import logging
 import json
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Callable, Awaitable, Tuple, Sequence, Iterator, Iterable, Union
 import base64
 from datetime import datetime
-
-from openai import OpenAI
-from dotenv import load_dotenv
-import pandas as pd
-from pypdf import PdfReader
+import asyncio
+import threading
+import time
 import io
 
-# Load environment variables
-load_dotenv()
+from app.services.context_planner import count_message_tokens, count_tokens, pack_sections, prompt_budget
+from app.services.extraction_cache import extraction_cache, hash_file
+from app.services.extraction_pool import WorkerTimeoutError, run_in_pool
+from app.services.metrics import LLM_TIME_TO_FIRST_TOKEN, StageTimer, observe_completion, observe_extraction
+from app.services.tracing import span
+from app.services.json_profile import JsonProfiler, JsonValueTooLargeError, profile_json_document, profile_jsonl
+from app.services.model_router import model_router
+from app.services.pdf_pages import PdfPagePlan, extract_page_range, page_ranges, should_split
+from app.services.response_cache import get_cached_response, make_response_key, store_response
+
+# pandas, numpy, pypdf, openpyxl and the OpenAI client are imported where they are used, so that
+# importing this module (and starting the app) stays fast; extraction runs in worker processes anyway
+if TYPE_CHECKING:
+    import pandas as pd
+    from openai import AsyncOpenAI
+    from app.services.tabular_profile import TableProfiler
+
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
+# OpenAI client settings
 api_key = os.getenv("OPENAI_API_KEY")
 model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
 
+# OpenAI-compatible endpoint to send requests to instead of api.openai.com (e.g. benchmarks/fake_openai.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
 # List of fallback models in case the specified model is not available
 FALLBACK_MODELS = ["gpt-4o", "gpt-3.5-turbo", "gpt-4"]
 
-try:
-    client = OpenAI(api_key=api_key)
-    # Test if the client is working
-    if api_key and api_key != "your_openai_api_key_here":
-        print(f"OpenAI client initialized with model: {model_name}")
-    else:
-        print("Warning: OpenAI API key not set or using default value")
-except Exception as e:
-    print(f"Error initializing OpenAI client: {str(e)}")
-    client = None
+# HTTP connection pool, timeout and concurrency settings for OpenAI API calls
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+# Retries are done by the model router within its retry budget, so the client does none by default
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "50"))
+
+# Map-reduce analysis settings for content that does not fit the context window
+MAP_REDUCE_CONCURRENCY = int(os.getenv("MAP_REDUCE_CONCURRENCY", "4"))
+MAP_REDUCE_MAX_CHUNKS = int(os.getenv("MAP_REDUCE_MAX_CHUNKS", "40"))
+MAP_REDUCE_NOTES_TOKENS = int(os.getenv("MAP_REDUCE_NOTES_TOKENS", "1000"))
+
+# Limits how many completions can be in flight at once from this worker
+completion_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# Shared HTTP and OpenAI clients, created by get_client() on first use
+http_client = None
+client: Optional["AsyncOpenAI"] = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+def get_client() -> Optional["AsyncOpenAI"]:
+    """
+    Get the shared OpenAI client, creating it on first use
+    
+    All completions reuse one bounded HTTP connection pool. Importing openai
+    and httpx takes a noticeable part of a second, so it is done here rather
+    than at import time; startup warm-up calls this in the background.
+    
+    Returns:
+        The client, or None if it could not be created
+    """
+    global http_client, client, _client_initialized
+    if _client_initialized:
+        return client
+    
+    with _client_lock:
+        if _client_initialized:
+            return client
+        try:
+            import httpx
+            from openai import AsyncOpenAI
+            
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+            )
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=OPENAI_BASE_URL,
+                http_client=http_client,
+                max_retries=OPENAI_MAX_RETRIES
+            )
+            # Test if the client is working
+            if api_key and api_key != "your_openai_api_key_here":
+                logger.info("OpenAI client initialized", extra={"model": model_name})
+            else:
+                logger.warning("OpenAI API key not set or using default value")
+            if OPENAI_BASE_URL:
+                logger.info("Using a custom OpenAI base URL", extra={"base_url": OPENAI_BASE_URL})
+        except Exception as e:
+            logger.error("Error initializing OpenAI client", extra={"error": str(e)})
+            client = None
+        _client_initialized = True
+    return client
+
+async def create_chat_completion(**kwargs):
+    """
+    Call the chat completions API without blocking the event loop
+    
+    Requests share the pooled HTTP client and wait for a free slot when
+    OPENAI_MAX_CONCURRENCY completions are already in flight.
+    """
+    async with completion_semaphore:
+        started = time.perf_counter()
+        try:
+            response = await get_client().chat.completions.create(**kwargs)
+        except Exception:
+            observe_completion(kwargs["model"], time.perf_counter() - started, "error")
+            raise
+        observe_completion(kwargs["model"], time.perf_counter() - started, "success", response.usage)
+        return response
+
+async def stream_chat_completion(on_delta: Callable[[str], Awaitable[None]], **kwargs) -> str:
+    """
+    Stream a chat completion, passing each text delta to on_delta as it arrives
+    
+    The concurrency slot is held until the stream is fully consumed. Token
+    usage is requested as a final chunk without choices.
+    Returns the complete response text.
+    """
+    model = kwargs["model"]
+    async with completion_semaphore:
+        started = time.perf_counter()
+        usage = None
+        parts = []
+        try:
+            stream = await get_client().chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        LLM_TIME_TO_FIRST_TOKEN.labels(model).observe(time.perf_counter() - started)
+                    parts.append(delta)
+                    await on_delta(delta)
+        except Exception:
+            observe_completion(model, time.perf_counter() - started, "error")
+            raise
+        observe_completion(model, time.perf_counter() - started, "success", usage)
+    return "".join(parts)
+
+async def complete_with_fallback(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    use_cache: bool = False
+) -> str:
+    """
+    Run a chat completion with the configured model, falling back to FALLBACK_MODELS
+    
+    Routing goes through the shared model router, which skips models with an
+    open circuit, retries transient errors and can hedge non-streaming calls.
+    Cached responses are keyed by the configured model, so only its answers
+    are stored; a fallback model's answer is returned but not cached.
+    
+    Args:
+        messages: Chat messages to send
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        on_delta: Optional coroutine called with each text delta; enables streaming
+        use_cache: Serve the response from the response cache and store new responses in it
+        
+    Returns:
+        The response text
+    """
+    if use_cache:
+        cache_key = make_response_key(model_name, temperature, max_tokens, messages, PROMPT_TEMPLATE_VERSION)
+        with span("response_cache_lookup") as lookup:
+            cached = await asyncio.to_thread(get_cached_response, cache_key)
+            if lookup is not None:
+                lookup.attributes["hit"] = cached is not None
+        if cached is not None:
+            logger.info("Serving response from cache", extra={"cache_key": cache_key[:12]})
+            if on_delta is not None:
+                await on_delta(cached)
+            return cached
+        
+        result, answered_by = await route_completion(messages, temperature, max_tokens, on_delta)
+        if answered_by == model_name:
+            await asyncio.to_thread(store_response, cache_key, answered_by, result)
+        else:
+            logger.info("Not caching a response from a fallback model", extra={"model": answered_by, "cache_key": cache_key[:12]})
+        return result
+    
+    result, _ = await route_completion(messages, temperature, max_tokens, on_delta)
+    return result
+
+async def route_completion(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+) -> Tuple[str, str]:
+    """
+    Run a chat completion through the model router, without the response cache
+    
+    Returns:
+        The response text and the model that produced it
+    """
+    streamed = False
+    
+    async def track_delta(delta: str):
+        nonlocal streamed
+        streamed = True
+        await on_delta(delta)
+    
+    async def run(model: str) -> Tuple[str, str]:
+        if on_delta is None:
+            response = await create_chat_completion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return response.choices[0].message.content, model
+        text = await stream_chat_completion(
+            track_delta,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return text, model
+    
+    # The configured model first, then the fallback models
+    models = [model_name] + [model for model in dict.fromkeys(FALLBACK_MODELS) if model != model_name]
+    prompt_tokens = None
+    
+    async def fits(model: str) -> bool:
+        # Counted once, off the event loop, and only when a fallback model is about to be used
+        nonlocal prompt_tokens
+        if prompt_tokens is None:
+            prompt_tokens = await asyncio.to_thread(count_message_tokens, messages, model_name)
+        if prompt_tokens > prompt_budget(model, max_tokens):
+            logger.info("Skipping fallback model: prompt does not fit its context window", extra={"model": model})
+            return False
+        return True
+    
+    logger.info("Sending request to OpenAI API", extra={"model": model_name, "streaming": on_delta is not None})
+    with span("completion", models=",".join(models), streaming=on_delta is not None):
+        return await model_router.complete(
+            models,
+            run,
+            hedge=on_delta is None,
+            committed=lambda: streamed,
+            fits=fits
+        )
+
+async def close_client():
+    """Close the shared HTTP connection pool, if it was created"""
+    if http_client is not None:
+        await http_client.aclose()
+
+# Limits for extracting the files of one analysis request (0 means no timeout)
+EXTRACTION_MAX_PARALLEL = int(os.getenv("EXTRACTION_MAX_PARALLEL", "4"))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "300"))
+EXTRACTION_TIMEOUT_GRACE = 5
+
+# Bump whenever extractor output changes so cached extractions are not reused
+EXTRACTOR_VERSION = "3"
+
+# Maximum number of PDF pages to extract (0 means no limit)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0"))
+
+# CSV files at least this large are profiled in chunks instead of loaded whole
+CSV_STREAMING_THRESHOLD_MB = float(os.getenv("CSV_STREAMING_THRESHOLD_MB", "50"))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000"))
+CSV_QUANTILE_SAMPLE_SIZE = int(os.getenv("CSV_QUANTILE_SAMPLE_SIZE", "10000"))
+
+# .xlsx files at least this large are streamed row by row with per-sheet budgets (0 means no limit)
+EXCEL_STREAMING_THRESHOLD_MB = float(os.getenv("EXCEL_STREAMING_THRESHOLD_MB", "10"))
+EXCEL_MAX_ROWS_PER_SHEET = int(os.getenv("EXCEL_MAX_ROWS_PER_SHEET", "200000"))
+EXCEL_MAX_CELLS_PER_SHEET = int(os.getenv("EXCEL_MAX_CELLS_PER_SHEET", "5000000"))
+EXCEL_BATCH_ROWS = int(os.getenv("EXCEL_BATCH_ROWS", "10000"))
+
+# JSON files at least this large are profiled incrementally instead of included whole
+JSON_INLINE_MAX_KB = float(os.getenv("JSON_INLINE_MAX_KB", "64"))
+JSON_SAMPLE_SIZE = int(os.getenv("JSON_SAMPLE_SIZE", "10"))
+JSON_MAX_DISTINCT = int(os.getenv("JSON_MAX_DISTINCT", "1000"))
+JSON_MAX_VALUE_MB = float(os.getenv("JSON_MAX_VALUE_MB", "64"))  # Largest single element read into memory (0 means no limit)
+
+# Settings that change extractor output; part of the extraction cache key
+EXTRACTOR_SETTINGS = {
+    "pdf_max_pages": PDF_MAX_PAGES,
+    "csv_streaming_threshold_mb": CSV_STREAMING_THRESHOLD_MB,
+    "csv_quantile_sample_size": CSV_QUANTILE_SAMPLE_SIZE,
+    "excel_streaming_threshold_mb": EXCEL_STREAMING_THRESHOLD_MB,
+    "excel_max_rows_per_sheet": EXCEL_MAX_ROWS_PER_SHEET,
+    "excel_max_cells_per_sheet": EXCEL_MAX_CELLS_PER_SHEET,
+    "json_inline_max_kb": JSON_INLINE_MAX_KB,
+    "json_sample_size": JSON_SAMPLE_SIZE,
+    "json_max_distinct": JSON_MAX_DISTINCT,
+    "json_max_value_mb": JSON_MAX_VALUE_MB
+}
+
+# Bump whenever the prompt templates change meaning so cached responses are not reused
+PROMPT_TEMPLATE_VERSION = "1"
 
 # Prompt templates for different analysis types
 PROMPT_TEMPLATES = {
@@ -78,13 +365,39 @@ PROMPT_TEMPLATES = {
     """
 }
 
-def extract_text_from_pdf(file_path: str) -> str:
+# Map step of map-reduce analysis: condense one chunk of the files into notes
+MAP_PROMPT_TEMPLATE = """
+    You are an expert business analyst. The files below are too large to analyze at once, so you are reading part {part} of {parts}.
+    Extract the facts from this part that matter for the requested analysis ({analysis_type}): key figures, metrics, dates, names, trends, anomalies and issues.
+    Keep exact numbers and note which file each fact comes from. Write concise notes, not the final analysis.
+    
+    {file_content}
+    """
+
+# Reduce step: introduces the notes that replace the file content in the final prompt
+REDUCE_CONTENT_HEADER = "The files were too large to include in full. These notes were extracted from them part by part:\n\n"
+
+def extract_text_from_pdf(
+    file_path: str,
+    pages: Optional[Sequence[int]] = None,
+    max_pages: Optional[int] = None,
+    split_pages: bool = False
+) -> Union[str, PdfPagePlan]:
     """
     Extract text content and metadata from a PDF file
     
-    This function extracts text from each page of a PDF file, handles pages with
+    This function extracts text from each page of a PDF file in a single pass, handles pages with
     no extractable text, and attempts to extract metadata when available.
+    
+    Args:
+        file_path: Path to the PDF file
+        pages: 1-based page numbers to extract; all pages when not given
+        max_pages: Maximum number of pages to extract; defaults to PDF_MAX_PAGES (0 means no limit)
+        split_pages: Return a PdfPagePlan instead of extracting the pages when the document is
+            large enough to be extracted in page ranges (see extract_on_pool)
     """
+    from pypdf import PdfReader
+    
     try:
         with open(file_path, 'rb') as file:
             reader = PdfReader(file)
@@ -106,100 +419,286 @@ def extract_text_from_pdf(file_path: str) -> str:
             if reader.is_encrypted:
                 return "This PDF file is encrypted and cannot be processed without a password."
             
-            # Extract text from pages
-            text_content = []
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text_content.append(f"--- Page {i+1} ---\n{page_text}")
-                else:
-                    text_content.append(f"--- Page {i+1} ---\n[Page contains no extractable text or images only]")
-            
-            # Combine metadata and content
-            result = []
-            if metadata:
-                result.append("PDF METADATA:")
-                result.extend(metadata)
-                result.append("\nPDF CONTENT:")
-            
-            result.extend(text_content)
+            # Select the pages to extract and apply the page budget
+            total_pages = len(reader.pages)
+            if pages:
+                page_indexes = sorted({page - 1 for page in pages if 1 <= page <= total_pages})
+            else:
+                page_indexes = list(range(total_pages))
             
-            final_text = "\n".join(result)
+            budget = PDF_MAX_PAGES if max_pages is None else max_pages
+            skipped_pages = 0
+            if budget and len(page_indexes) > budget:
+                skipped_pages = len(page_indexes) - budget
+                page_indexes = page_indexes[:budget]
             
-            if not any(page.extract_text() for page in reader.pages):
-                final_text += "\n\nNote: This PDF file does not contain any extractable text. It may contain only images or be scanned without OCR."
+            # Leave large documents to the caller, which extracts the page ranges as separate tasks
+            if split_pages and should_split(page_indexes):
+                return PdfPagePlan(file_path, page_ranges(page_indexes), metadata, skipped_pages, budget)
             
-            return final_text
+            page_texts = ((i, reader.pages[i].extract_text() or "") for i in page_indexes)
+            return format_pdf_text(metadata, page_texts, skipped_pages, budget)
     except Exception as e:
-        error_msg = str(e)
-        print(f"Error extracting text from PDF {file_path}: {error_msg}")
-        
-        if "password" in error_msg.lower():
-            return "This PDF file is encrypted and requires a password to access."
-        elif "not a PDF" in error_msg.lower():
-            return "The file does not appear to be a valid PDF document."
+        return pdf_error_message(file_path, e)
+
+def format_pdf_text(metadata: List[str], page_texts: Iterable[Tuple[int, str]], skipped_pages: int, budget: int) -> str:
+    """
+    Combine PDF metadata and page texts into the extracted content
+    
+    Args:
+        metadata: Metadata lines ("Title: ...")
+        page_texts: (0-based page index, text) pairs in page order
+        skipped_pages: Number of pages left out by the page budget
+        budget: The page budget that was applied
+    """
+    # Format the pages, noting whether any page had text
+    text_content = []
+    has_text = False
+    for i, page_text in page_texts:
+        if page_text:
+            has_text = True
+            text_content.append(f"--- Page {i+1} ---\n{page_text}")
+        else:
+            text_content.append(f"--- Page {i+1} ---\n[Page contains no extractable text or images only]")
+    
+    if skipped_pages:
+        text_content.append(f"\n[...{skipped_pages} more pages not extracted (page limit of {budget} reached)...]")
+    
+    # Combine metadata and content
+    result = []
+    if metadata:
+        result.append("PDF METADATA:")
+        result.extend(metadata)
+        result.append("\nPDF CONTENT:")
+    
+    result.extend(text_content)
+    
+    final_text = "\n".join(result)
+    
+    if not has_text:
+        final_text += "\n\nNote: This PDF file does not contain any extractable text. It may contain only images or be scanned without OCR."
+    
+    return final_text
+
+def pdf_error_message(file_path: str, error: Exception) -> str:
+    """The content reported for a PDF that could not be read"""
+    error_msg = str(error)
+    logger.error("Error extracting text from PDF", extra={"path": file_path, "error": error_msg})
+    
+    if "password" in error_msg.lower():
+        return "This PDF file is encrypted and requires a password to access."
+    elif "not a PDF" in error_msg.lower():
+        return "The file does not appear to be a valid PDF document."
+    else:
+        return f"Error extracting text from PDF: {error_msg}"
+
+def excel_column_names(header: Sequence[Any]) -> List[str]:
+    """Name header cells the way pandas does: blanks become "Unnamed: i", repeats get a suffix"""
+    header = list(header)
+    while header and header[-1] is None:
+        header.pop()
+    
+    names = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
         else:
-            return f"Error extracting text from PDF: {error_msg}"
+            seen[name] = 0
+        names.append(name)
+    return names
 
-def extract_text_from_excel(file_path: str) -> str:
+def profile_excel_sheet(worksheet, max_rows: int = 0, max_cells: int = 0) -> Tuple["TableProfiler", bool]:
+    """
+    Profile a worksheet by streaming its rows with openpyxl's read-only iterator
+    
+    Rows are profiled in batches of EXCEL_BATCH_ROWS, and reading stops once the
+    row or cell budget is used up (0 means no limit).
+    
+    Returns:
+        The sheet profile, and whether rows were left unread because of the budget
+    """
+    import numpy as np
+    import pandas as pd
+    from app.services.tabular_profile import TableProfiler
+    
+    profiler = TableProfiler(quantile_sample_size=CSV_QUANTILE_SAMPLE_SIZE)
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    columns = excel_column_names(header or ())
+    width = len(columns)
+    
+    row_limit = max_rows or None
+    if max_cells and width:
+        cell_row_limit = max(max_cells // width, 1)
+        row_limit = min(row_limit, cell_row_limit) if row_limit else cell_row_limit
+    
+    batch = []
+    rows_read = 0
+    blank_rows = 0
+    truncated = False
+    
+    def flush():
+        df = pd.DataFrame.from_records(batch, columns=columns)
+        df.index = range(rows_read - len(batch), rows_read)
+        # Empty cells are NaN and empty columns are float in a full read
+        for col in df.columns[df.isnull().all()]:
+            df[col] = df[col].astype(float)
+        profiler.update(df.infer_objects().fillna(np.nan))
+        batch.clear()
+    
+    for row in rows:
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        
+        # Blank rows only count if data follows them; trailing ones are dropped
+        if all(value is None for value in row):
+            blank_rows += 1
+            continue
+        
+        if row_limit and rows_read + blank_rows + 1 > row_limit:
+            truncated = True
+            break
+        
+        batch.extend([(None,) * width] * blank_rows)
+        batch.append(row)
+        rows_read += blank_rows + 1
+        blank_rows = 0
+        
+        if len(batch) >= EXCEL_BATCH_ROWS:
+            flush()
+    
+    if batch or profiler.schema is None:
+        flush()
+    
+    return profiler, truncated
+
+def iter_streamed_sheets(workbook) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (name, figures) for each sheet of a read-only workbook
+    
+    Sheets are loaded lazily and profiled within the per-sheet budget.
+    """
+    for worksheet in workbook.worksheets:
+        profile, truncated = profile_excel_sheet(
+            worksheet,
+            max_rows=EXCEL_MAX_ROWS_PER_SHEET,
+            max_cells=EXCEL_MAX_CELLS_PER_SHEET
+        )
+        yield worksheet.title, {
+            "rows": profile.rows,
+            "columns": profile.columns,
+            "dtypes": profile.dtypes,
+            "preview": profile.preview(),
+            "numeric_stats": profile.describe(),
+            "truncated": truncated,
+            "declared_rows": (worksheet.max_row - 1) if worksheet.max_row else None
+        }
+
+def iter_dataframe_sheets(dfs: Dict[str, "pd.DataFrame"]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (name, figures) for each sheet read whole with pandas"""
+    import pandas as pd
+    
+    for sheet_name, df in dfs.items():
+        numeric_cols = df.select_dtypes(include=['number']).columns
+        yield sheet_name, {
+            "rows": len(df),
+            "columns": df.columns,
+            "dtypes": df.dtypes,
+            "preview": pd.concat([df.head(10), df.tail(10)]) if len(df) > 20 else df,
+            "numeric_stats": df[numeric_cols].describe() if not numeric_cols.empty else pd.DataFrame(),
+            "truncated": False,
+            "declared_rows": None
+        }
+
+def extract_text_from_excel(file_path: str, file_name: Optional[str] = None, streaming: Optional[bool] = None) -> str:
     """
     Extract text content from an Excel file with improved formatting and metadata
     
     This function extracts data from all sheets in an Excel file, preserves formatting
     where possible, and includes sheet statistics and structure information.
+    `file_name` is the name shown in the output; it defaults to the file's base name.
+    
+    .xlsx files of at least EXCEL_STREAMING_THRESHOLD_MB (or any .xlsx file when
+    `streaming` is True) are read row by row, one sheet at a time, stopping at the
+    per-sheet row and cell budget. Statistics are computed incrementally.
     """
+    import pandas as pd
+    from openpyxl import load_workbook
+    
     try:
+        if streaming is None:
+            streaming = os.path.getsize(file_path) >= EXCEL_STREAMING_THRESHOLD_MB * 1024 * 1024
+        # openpyxl cannot read the legacy .xls format
+        streaming = streaming and not (file_name or file_path).lower().endswith('.xls')
+        
         # Try to read as Excel
-        dfs = pd.read_excel(file_path, sheet_name=None)
+        workbook = None
+        if streaming:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            sheet_count = len(workbook.sheetnames)
+            sheets = iter_streamed_sheets(workbook)
+        else:
+            dfs = pd.read_excel(file_path, sheet_name=None)
+            sheet_count = len(dfs)
+            sheets = iter_dataframe_sheets(dfs)
         result = []
         
         # Add file metadata
-        result.append(f"EXCEL FILE: {os.path.basename(file_path)}")
-        result.append(f"Total Sheets: {len(dfs)}")
+        result.append(f"EXCEL FILE: {file_name or os.path.basename(file_path)}")
+        result.append(f"Total Sheets: {sheet_count}")
         result.append("")
         
-        # Process each sheet
-        for sheet_name, df in dfs.items():
-            # Add sheet header with statistics
-            result.append(f"SHEET: {sheet_name}")
-            result.append(f"Dimensions: {df.shape[0]} rows × {df.shape[1]} columns")
-            
-            # Check for empty dataframe
-            if df.empty:
-                result.append("This sheet is empty.")
-                result.append("")
-                continue
-            
-            # Add column types information
-            result.append("Column Types:")
-            for col, dtype in df.dtypes.items():
-                result.append(f"  - {col}: {dtype}")
-            
-            # Add data preview with better formatting
-            result.append("\nData Preview:")
-            
-            # Format the dataframe for better readability
-            # Handle large dataframes by showing head and tail
-            if len(df) > 20:
-                preview = pd.concat([df.head(10), df.tail(10)])
-                result.append(preview.to_string(index=True))
-                result.append(f"\n[...{len(df) - 20} more rows not shown...]")
-            else:
-                result.append(df.to_string(index=True))
-            
-            # Add basic statistics for numeric columns
-            numeric_cols = df.select_dtypes(include=['number']).columns
-            if not numeric_cols.empty:
-                result.append("\nNumeric Column Statistics:")
-                stats = df[numeric_cols].describe().to_string()
-                result.append(stats)
-            
-            result.append("\n" + "-" * 50 + "\n")
+        try:
+            # Process each sheet
+            for sheet_name, sheet in sheets:
+                row_count = sheet["rows"]
+                
+                # Add sheet header with statistics
+                result.append(f"SHEET: {sheet_name}")
+                result.append(f"Dimensions: {row_count} rows × {len(sheet['columns'])} columns")
+                if sheet["truncated"]:
+                    declared = f" of about {sheet['declared_rows']}" if sheet["declared_rows"] else ""
+                    result.append(f"Note: Only the first {row_count} rows{declared} were read (per-sheet row/cell budget reached).")
+                
+                # Check for empty dataframe
+                if row_count == 0 or len(sheet["columns"]) == 0:
+                    result.append("This sheet is empty.")
+                    result.append("")
+                    continue
+                
+                # Add column types information
+                result.append("Column Types:")
+                for col, dtype in sheet["dtypes"].items():
+                    result.append(f"  - {col}: {dtype}")
+                
+                # Add data preview with better formatting
+                result.append("\nData Preview:")
+                
+                # Format the dataframe for better readability
+                # Handle large dataframes by showing head and tail
+                result.append(sheet["preview"].to_string(index=True))
+                if row_count > 20:
+                    result.append(f"\n[...{row_count - 20} more rows not shown...]")
+                
+                # Add basic statistics for numeric columns
+                if not sheet["numeric_stats"].empty:
+                    result.append("\nNumeric Column Statistics:")
+                    if streaming:
+                        result.append("(quantiles are approximate, estimated from a sample of the rows)")
+                    result.append(sheet["numeric_stats"].to_string())
+                
+                result.append("\n" + "-" * 50 + "\n")
+        
+        finally:
+            if workbook is not None:
+                workbook.close()
         
         return "\n".join(result)
     except Exception as e:
         error_msg = str(e)
-        print(f"Error extracting Excel content from {file_path}: {error_msg}")
+        logger.error("Error extracting Excel content", extra={"path": file_path, "error": error_msg})
         
         if "No engine for filetype" in error_msg:
             return "This file is not a valid Excel file or is in an unsupported format."
@@ -208,17 +707,45 @@ def extract_text_from_excel(file_path: str) -> str:
         else:
             return f"Error extracting Excel content: {error_msg}"
 
-def extract_text_from_csv(file_path: str) -> str:
+def profile_csv_in_chunks(file_path: str, encoding: Optional[str] = None, delimiter: Optional[str] = None) -> "TableProfiler":
+    """
+    Profile a CSV file in a single pass over fixed-size chunks
+    
+    Memory stays bounded by CSV_CHUNK_ROWS rows plus a fixed quantile sample per
+    numeric column, regardless of the file size.
+    """
+    import pandas as pd
+    from app.services.tabular_profile import TableProfiler
+    
+    profiler = TableProfiler(quantile_sample_size=CSV_QUANTILE_SAMPLE_SIZE)
+    reader = pd.read_csv(file_path, encoding=encoding, delimiter=delimiter, chunksize=CSV_CHUNK_ROWS)
+    with reader:
+        for chunk in reader:
+            profiler.update(chunk)
+    return profiler
+
+def extract_text_from_csv(file_path: str, file_name: Optional[str] = None, streaming: Optional[bool] = None) -> str:
     """
     Extract text content from a CSV file with improved formatting and analysis
     
     This function attempts to intelligently parse CSV files with different delimiters
     and encodings, and provides formatted output with data statistics.
+    `file_name` is the name shown in the output; it defaults to the file's base name.
+    
+    Files of at least CSV_STREAMING_THRESHOLD_MB (or any file when `streaming` is True)
+    are profiled in chunks instead of being loaded whole. The output has the same
+    layout, with quantiles estimated from a sample.
     """
+    import pandas as pd
+    
     try:
+        if streaming is None:
+            streaming = os.path.getsize(file_path) >= CSV_STREAMING_THRESHOLD_MB * 1024 * 1024
+        
         # Try to detect encoding
         encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
         df = None
+        profile = None
         detected_encoding = None
         
         # Try different encodings
@@ -234,31 +761,54 @@ def extract_text_from_csv(file_path: str) -> str:
                 likely_delimiter = max(delimiter_counts, key=delimiter_counts.get)
                 
                 # Try to read with the detected delimiter
-                df = pd.read_csv(file_path, encoding=encoding, delimiter=likely_delimiter)
+                if streaming:
+                    profile = profile_csv_in_chunks(file_path, encoding=encoding, delimiter=likely_delimiter)
+                else:
+                    df = pd.read_csv(file_path, encoding=encoding, delimiter=likely_delimiter)
                 detected_encoding = encoding
                 break
             except Exception:
                 continue
         
         # If all attempts failed, try pandas default behavior
-        if df is None:
-            df = pd.read_csv(file_path)
+        if df is None and profile is None:
+            if streaming:
+                profile = profile_csv_in_chunks(file_path)
+            else:
+                df = pd.read_csv(file_path)
             detected_encoding = 'unknown (pandas default)'
         
+        # Collect the figures to report from either the full table or the chunked profile
+        if streaming:
+            row_count = profile.rows
+            columns = profile.columns
+            dtypes = profile.dtypes
+            preview = profile.preview()
+            numeric_stats = profile.describe()
+            missing = profile.null_counts
+        else:
+            row_count = len(df)
+            columns = df.columns
+            dtypes = df.dtypes
+            preview = pd.concat([df.head(10), df.tail(10)]) if len(df) > 20 else df
+            numeric_cols = df.select_dtypes(include=['number']).columns
+            numeric_stats = df[numeric_cols].describe() if not numeric_cols.empty else pd.DataFrame()
+            missing = df.isnull().sum()
+        
         # Build the result
         result = []
-        result.append(f"CSV FILE: {os.path.basename(file_path)}")
+        result.append(f"CSV FILE: {file_name or os.path.basename(file_path)}")
         result.append(f"Detected Encoding: {detected_encoding}")
-        result.append(f"Dimensions: {df.shape[0]} rows × {df.shape[1]} columns")
+        result.append(f"Dimensions: {row_count} rows × {len(columns)} columns")
         
         # Add column information
         result.append("\nColumn Names:")
-        for i, col in enumerate(df.columns):
+        for i, col in enumerate(columns):
             result.append(f"  {i+1}. {col}")
         
         # Add data types
         result.append("\nColumn Types:")
-        for col, dtype in df.dtypes.items():
+        for col, dtype in dtypes.items():
             result.append(f"  - {col}: {dtype}")
         
         # Add data preview
@@ -266,46 +816,72 @@ def extract_text_from_csv(file_path: str) -> str:
         
         # Format the dataframe for better readability
         # Handle large dataframes by showing head and tail
-        if len(df) > 20:
-            preview = pd.concat([df.head(10), df.tail(10)])
-            result.append(preview.to_string(index=True))
-            result.append(f"\n[...{len(df) - 20} more rows not shown...]")
-        else:
-            result.append(df.to_string(index=True))
+        result.append(preview.to_string(index=True))
+        if row_count > 20:
+            result.append(f"\n[...{row_count - 20} more rows not shown...]")
         
         # Add basic statistics for numeric columns
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        if not numeric_cols.empty:
+        if not numeric_stats.empty:
             result.append("\nNumeric Column Statistics:")
-            stats = df[numeric_cols].describe().to_string()
-            result.append(stats)
+            if streaming:
+                result.append("(quantiles are approximate, estimated from a sample of the rows)")
+            result.append(numeric_stats.to_string())
         
         # Check for missing values
-        missing = df.isnull().sum()
         if missing.sum() > 0:
             result.append("\nMissing Values:")
             for col, count in missing.items():
                 if count > 0:
-                    result.append(f"  - {col}: {count} missing values ({count/len(df):.1%})")
+                    result.append(f"  - {col}: {count} missing values ({count/row_count:.1%})")
         
         return "\n".join(result)
     except Exception as e:
         error_msg = str(e)
-        print(f"Error extracting CSV content from {file_path}: {error_msg}")
+        logger.error("Error extracting CSV content", extra={"path": file_path, "error": error_msg})
         
         if "No such file" in error_msg:
-            return f"The CSV file {os.path.basename(file_path)} does not exist."
+            return f"The CSV file {file_name or os.path.basename(file_path)} does not exist."
         elif "Expecting" in error_msg and "delimiter" in error_msg:
             return "The CSV file has an unexpected format or delimiter. Please check the file format."
         else:
             return f"Error extracting CSV content: {error_msg}"
 
-def extract_file_content(file_path: str) -> str:
+def import_extraction_libraries():
+    """
+    Import the libraries the extractors use (pandas, numpy, pypdf, openpyxl)
+    
+    They are imported inside the extractors so this module loads quickly;
+    calling this in a worker process ahead of time takes the import cost off
+    the first extraction.
+    """
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import pypdf  # noqa: F401
+    import openpyxl  # noqa: F401
+    from app.services import tabular_profile  # noqa: F401
+
+def extract_file_content(
+    file_path: str,
+    use_cache: bool = True,
+    file_name: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    split_pdf_pages: bool = False
+) -> Union[str, PdfPagePlan]:
     """
     Extract content from a file based on its extension with enhanced detection and handling
     
     This function intelligently detects file types, handles various formats, and provides
     appropriate extraction methods with improved error handling and formatting.
+    Extracted content is cached by file hash and EXTRACTOR_VERSION, so the same file
+    is only parsed once.
+    
+    Args:
+        file_path: Path of the file on disk
+        use_cache: Whether to read and write the extraction cache
+        file_name: Original file name, used for type detection when the stored file has none
+        content_hash: SHA-256 of the file if already known, saves hashing it again
+        split_pdf_pages: Return a PdfPagePlan for a large PDF instead of extracting it,
+            so its page ranges can be extracted in parallel (see extract_on_pool)
     """
     # Check if file exists
     if not os.path.exists(file_path):
@@ -318,13 +894,13 @@ def extract_file_content(file_path: str) -> str:
         
         # Warn about very large files
         if file_size_mb > 50:
-            print(f"Warning: Processing a large file ({file_size_mb:.1f} MB). This may take some time.")
+            logger.warning("Processing a large file, this may take some time", extra={"path": file_path, "size_mb": round(file_size_mb, 1)})
     except Exception as e:
-        print(f"Warning: Could not determine file size: {str(e)}")
+        logger.warning("Could not determine file size", extra={"path": file_path, "error": str(e)})
     
     # Get file extension and try to determine file type
-    file_name = os.path.basename(file_path)
-    file_extension = file_path.split('.')[-1].lower() if '.' in file_path else ''
+    file_name = file_name or os.path.basename(file_path)
+    file_extension = file_name.split('.')[-1].lower() if '.' in file_name else ''
     
     # Add file metadata to output
     result_header = [
@@ -334,41 +910,148 @@ def extract_file_content(file_path: str) -> str:
         f"Type: {file_extension.upper() if file_extension else 'Unknown'}"
     ]
     
+    # Reuse a previous extraction of the same content if there is one.
+    # Extractor settings and the file name are part of the key because they change the output.
+    cache_key = None
+    cached = None
+    if use_cache and extraction_cache.enabled:
+        try:
+            cache_key = extraction_cache.make_key(
+                content_hash or hash_file(file_path),
+                EXTRACTOR_VERSION,
+                json.dumps(EXTRACTOR_SETTINGS, sort_keys=True),
+                file_name
+            )
+            cached = extraction_cache.get(cache_key)
+        except Exception as e:
+            logger.warning("Extraction cache lookup failed", extra={"file_name": file_name, "error": str(e)})
+    
+    if cached is not None:
+        extracted = json.loads(cached)
+        header_lines, content = extracted["header"], extracted["content"]
+    else:
+        header_lines, content = extract_typed_content(file_path, file_extension, file_name, split_pdf_pages)
+        if isinstance(content, PdfPagePlan):
+            # The caller extracts the pages, then finishes and caches the content with finish_pdf_plan
+            content.file_header = result_header
+            content.header_lines = header_lines
+            content.cache_key = cache_key
+            return content
+        if cache_key is not None:
+            try:
+                extraction_cache.put(cache_key, json.dumps({"header": header_lines, "content": content}))
+            except Exception as e:
+                logger.warning("Could not store extraction in cache", extra={"file_name": file_name, "error": str(e)})
+    
+    result_header.extend(header_lines)
+    
+    # Combine header and content
+    return "\n".join(result_header) + "\n\n" + content
+
+def extract_text_from_json(file_path: str, file_extension: str = 'json') -> Tuple[List[str], str]:
+    """
+    Extract a JSON or JSON Lines file
+    
+    Small JSON files are included whole. Larger ones, and all JSON Lines files,
+    are read incrementally and summarized as an inferred schema (key paths,
+    types and distinct value counts) plus a random sample of records, so the
+    output stays small however big the file is.
+    
+    Args:
+        file_path: Path to the JSON or JSONL file
+        file_extension: 'json' or 'jsonl'
+        
+    Returns:
+        Extra header lines describing the file, and the extracted content
+    """
+    header_lines = []
+    try:
+        if file_extension == 'json':
+            if os.path.getsize(file_path) < JSON_INLINE_MAX_KB * 1024:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        data = json.load(file)
+                    header_lines.append(f"JSON Structure: {type(data).__name__}")
+                    if isinstance(data, dict):
+                        header_lines.append(f"Top-level keys: {len(data)}")
+                    elif isinstance(data, list):
+                        header_lines.append(f"Array length: {len(data)}")
+                    return header_lines, json.dumps(data, indent=2)
+                except json.JSONDecodeError:
+                    pass
+            else:
+                profiler = JsonProfiler(sample_size=JSON_SAMPLE_SIZE, max_distinct=JSON_MAX_DISTINCT)
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        structure, length = profile_json_document(file, profiler, int(JSON_MAX_VALUE_MB * 1024 * 1024))
+                    header_lines.append(f"JSON Structure: {structure}")
+                    if structure == 'dict':
+                        header_lines.append(f"Top-level keys: {length}")
+                        record_label = "Records (object members and array elements)"
+                    elif structure == 'list':
+                        header_lines.append(f"Array length: {length}")
+                        record_label = "Array elements"
+                    else:
+                        record_label = "Values"
+                    return header_lines, profiler.summary(record_label)
+                except JsonValueTooLargeError as e:
+                    # Reading it as JSON Lines would load the same oversized text
+                    return header_lines, f"Error parsing JSON file: {str(e)}"
+                except ValueError:
+                    # Not a single document (json.JSONDecodeError is a ValueError)
+                    pass
+        
+        # Try as JSONL (one JSON object per line)
+        profiler = JsonProfiler(sample_size=JSON_SAMPLE_SIZE, max_distinct=JSON_MAX_DISTINCT)
+        with open(file_path, 'r', encoding='utf-8') as file:
+            lines, errors = profile_jsonl(file, profiler, int(JSON_MAX_VALUE_MB * 1024 * 1024))
+        content = f"JSONL file with {lines} lines"
+        if errors:
+            content += f" ({errors} could not be parsed or were too long)"
+        content += "\n\n" + profiler.summary("Parsed records")
+        return header_lines, content
+    except Exception as e:
+        return header_lines, f"Error parsing JSON/JSONL file: {str(e)}"
+
+# Extensions read as plain text
+TEXT_EXTENSIONS = ['txt', 'md', 'py', 'js', 'html', 'css', 'java', 'c', 'cpp', 'h', 'hpp', 'xml', 'yaml', 'yml']
+
+# Extractor used per extension, as named in the extraction metrics
+EXTRACTORS = {'pdf': 'pdf', 'xlsx': 'excel', 'xls': 'excel', 'csv': 'csv', 'json': 'json', 'jsonl': 'json'}
+
+def extractor_name(file_name: str) -> str:
+    """The extractor extract_typed_content uses for a file name"""
+    file_extension = file_name.split('.')[-1].lower() if '.' in file_name else ''
+    if file_extension in EXTRACTORS:
+        return EXTRACTORS[file_extension]
+    return 'text' if file_extension in TEXT_EXTENSIONS else 'other'
+
+def extract_typed_content(
+    file_path: str,
+    file_extension: str,
+    file_name: Optional[str] = None,
+    split_pdf_pages: bool = False
+) -> Tuple[List[str], Union[str, PdfPagePlan]]:
+    """
+    Run the extractor matching a file's extension
+    
+    With split_pdf_pages, a large PDF gives a PdfPagePlan instead of its content.
+    
+    Returns:
+        Extra header lines describing the file, and the extracted content
+    """
+    header_lines = []
+    
     # Process based on file extension
     if file_extension == 'pdf':
-        content = extract_text_from_pdf(file_path)
+        content = extract_text_from_pdf(file_path, split_pages=split_pdf_pages)
     elif file_extension in ['xlsx', 'xls']:
-        content = extract_text_from_excel(file_path)
+        content = extract_text_from_excel(file_path, file_name)
     elif file_extension == 'csv':
-        content = extract_text_from_csv(file_path)
+        content = extract_text_from_csv(file_path, file_name)
     elif file_extension in ['json', 'jsonl']:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                content = json.dumps(data, indent=2)
-                result_header.append(f"JSON Structure: {type(data).__name__}")
-                if isinstance(data, dict):
-                    result_header.append(f"Top-level keys: {len(data)}")
-                elif isinstance(data, list):
-                    result_header.append(f"Array length: {len(data)}")
-        except json.JSONDecodeError:
-            # Try as JSONL (one JSON object per line)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    lines = file.readlines()
-                    sample = []
-                    for i, line in enumerate(lines[:10]):  # Process first 10 lines
-                        try:
-                            obj = json.loads(line.strip())
-                            sample.append(obj)
-                        except:
-                            pass
-                    
-                    content = f"JSONL file with {len(lines)} lines\n\nSample of first {min(10, len(lines))} lines (parsed):\n"
-                    content += json.dumps(sample, indent=2)
-            except Exception as e:
-                content = f"Error parsing JSON/JSONL file: {str(e)}"
-    elif file_extension in ['txt', 'md', 'py', 'js', 'html', 'css', 'java', 'c', 'cpp', 'h', 'hpp', 'xml', 'yaml', 'yml']:
+        header_lines, content = extract_text_from_json(file_path, file_extension)
+    elif file_extension in TEXT_EXTENSIONS:
         # Handle text files with encoding detection
         encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
         content = None
@@ -377,7 +1060,7 @@ def extract_file_content(file_path: str) -> str:
             try:
                 with open(file_path, 'r', encoding=encoding) as file:
                     content = file.read()
-                    result_header.append(f"Encoding: {encoding}")
+                    header_lines.append(f"Encoding: {encoding}")
                     break
             except UnicodeDecodeError:
                 continue
@@ -397,22 +1080,26 @@ def extract_file_content(file_path: str) -> str:
                     try:
                         with open(file_path, 'r', encoding='utf-8') as text_file:
                             content = text_file.read()
-                            result_header.append("Note: File appears to be text despite unknown extension")
+                            header_lines.append("Note: File appears to be text despite unknown extension")
                     except UnicodeDecodeError:
                         content = f"File appears to be binary. Format {file_extension if file_extension else 'unknown'} is not supported for direct text extraction."
         except Exception as e:
             content = f"Error reading file: {str(e)}"
     
-    # Combine header and content
-    return "\n".join(result_header) + "\n\n" + content
+    return header_lines, content
 
-async def generate_conversation_response(conversation_history: List[Dict[str, str]], user_message: str) -> str:
+async def generate_conversation_response(
+    conversation_history: List[Dict[str, str]],
+    user_message: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+) -> str:
     """
     Generate a response to a user message based on conversation history
     
     Args:
         conversation_history: List of previous messages in the conversation
         user_message: The current user message to respond to
+        on_delta: Optional coroutine called with each response delta as it streams in
         
     Returns:
         Assistant's response as a string
@@ -424,63 +1111,35 @@ async def generate_conversation_response(conversation_history: List[Dict[str, st
     
     try:
         # Check if OpenAI client is initialized
-        if not client:
+        if not get_client():
             return "Error: OpenAI client not initialized. Please check your API key."
         
-        # Prepare messages for the API call
-        messages = [
-            {"role": "system", "content": "You are an expert business analyst assistant that provides helpful, detailed, and accurate responses to user questions. You can analyze business data, provide insights, and answer general questions."}
-        ]
-        
-        # Add conversation history (limited to last 10 messages to avoid token limits)
-        for msg in conversation_history[-10:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Add the current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        # Try with the specified model first
-        current_model = model_name
-        print(f"Sending request to OpenAI API with model: {current_model}")
-        
-        try:
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model=current_model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-        except Exception as model_error:
-            # If the specified model fails, try fallback models
-            print(f"Error with model {current_model}: {str(model_error)}")
+        with span("build_prompt", history_messages=len(conversation_history[-10:])):
+            # Prepare messages for the API call
+            messages = [
+                {"role": "system", "content": "You are an expert business analyst assistant that provides helpful, detailed, and accurate responses to user questions. You can analyze business data, provide insights, and answer general questions."}
+            ]
             
-            for fallback_model in FALLBACK_MODELS:
-                if fallback_model != current_model:
-                    try:
-                        print(f"Trying fallback model: {fallback_model}")
-                        response = client.chat.completions.create(
-                            model=fallback_model,
-                            messages=messages,
-                            temperature=0.7,
-                            max_tokens=1000
-                        )
-                        print(f"Successfully used fallback model: {fallback_model}")
-                        break
-                    except Exception as fallback_error:
-                        print(f"Error with fallback model {fallback_model}: {str(fallback_error)}")
-                        continue
-            else:
-                # If all models fail, raise the original error
-                raise model_error
+            # Add conversation history (limited to last 10 messages to avoid token limits)
+            for msg in conversation_history[-10:]:
+                messages.append({"role": msg["role"], "content": msg["content"]})
+            
+            # Add the current user message
+            messages.append({"role": "user", "content": user_message})
+        
+        result = await complete_with_fallback(
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            on_delta=on_delta
+        )
         
         # Return the response
-        result = response.choices[0].message.content
-        print(f"Received response from OpenAI API: {len(result)} characters")
+        logger.info("Received response from OpenAI API", extra={"chars": len(result)})
         return result
     except Exception as e:
         error_message = str(e)
-        print(f"Error calling OpenAI API: {error_message}")
+        logger.error("Error calling OpenAI API", extra={"error": error_message})
         
         # Check for common errors
         if "API key" in error_message:
@@ -492,7 +1151,285 @@ async def generate_conversation_response(conversation_history: List[Dict[str, st
         else:
             return f"Error generating response: {error_message}"
 
-async def analyze_files(file_paths: List[str], analysis_type: str = "summarize", user_message: str = "") -> str:
+def dummy_file_content(file_name: str) -> str:
+    """Sample content standing in for a dummy file, based on its name"""
+    # This is a dummy file, create some sample content based on the filename
+    if file_name.lower().endswith('.pdf'):
+        content = f"""Sample PDF content for {file_name}:
+
+        Title: Business Report 2023
+
+        Executive Summary:
+        The company has shown strong growth in Q3 2023, with revenue increasing by 15% compared to the previous quarter. 
+        Key performance indicators are trending positively, with customer acquisition costs decreasing by 10%.
+
+        Financial Highlights:
+        - Revenue: $10.5M (up 15% QoQ)
+        - Gross Margin: 68% (up 3% QoQ)
+        - Operating Expenses: $4.2M (down 5% QoQ)
+        - Net Profit: $2.8M (up 22% QoQ)
+
+        Market Analysis:
+        The market share has increased to 23%, making us the second largest player in the industry.
+        Competitor analysis shows that our product features are rated higher in 7 out of 10 categories.
+
+        Recommendations:
+        1. Increase marketing spend in the APAC region where we're seeing the highest growth
+        2. Accelerate the development of the mobile application to capture the growing mobile user base
+        3. Consider strategic partnerships with complementary service providers
+        """
+    elif file_name.lower().endswith(('.xlsx', '.xls')):
+        content = f"""Sample Excel content for {file_name}:
+
+        Sheet: Sales Data
+
+          Region  |  Q1 Sales  |  Q2 Sales  |  Q3 Sales  |  Q4 Sales  |  Total
+        ----------|------------|------------|------------|------------|--------
+          North   |  $125,000  |  $142,000  |  $168,000  |  $182,000  | $617,000
+          South   |  $118,000  |  $126,000  |  $140,000  |  $152,000  | $536,000
+          East    |  $95,000   |  $102,000  |  $118,000  |  $125,000  | $440,000
+          West    |  $142,000  |  $156,000  |  $170,000  |  $188,000  | $656,000
+        ----------|------------|------------|------------|------------|--------
+          Total   |  $480,000  |  $526,000  |  $596,000  |  $647,000  | $2,249,000
+
+        Sheet: Product Performance
+
+          Product  |  Units Sold  |  Revenue  |  Profit Margin
+        -----------|--------------|-----------|---------------
+          Product A|    12,500    |  $625,000 |     32%
+          Product B|    8,300     |  $415,000 |     28%
+          Product C|    15,200    |  $760,000 |     35%
+          Product D|    6,800     |  $340,000 |     40%
+        """
+    elif file_name.lower().endswith('.csv'):
+        content = f"""Sample CSV content for {file_name}:
+
+        Date,Customer,Product,Quantity,Price,Total
+        2023-01-15,ABC Corp,Widget X,100,$25.00,$2500.00
+        2023-01-22,XYZ Inc,Widget Y,50,$30.00,$1500.00
+        2023-02-05,123 Industries,Widget Z,75,$22.50,$1687.50
+        2023-02-18,ABC Corp,Widget X,150,$24.00,$3600.00
+        2023-03-03,XYZ Inc,Widget Z,120,$22.00,$2640.00
+        2023-03-17,123 Industries,Widget Y,80,$29.50,$2360.00
+        2023-04-02,ABC Corp,Widget Z,200,$21.50,$4300.00
+        2023-04-15,XYZ Inc,Widget X,100,$24.50,$2450.00
+        """
+    else:
+        content = f"""Sample text content for {file_name}:
+
+        This is a sample business document with some key information:
+
+        - The project timeline has been extended by 2 weeks
+        - Budget allocation has increased by 15%
+        - Team size will grow from 8 to 12 members
+        - New requirements include mobile support and API integration
+        - Customer feedback shows 92% satisfaction rate
+        """
+    return content
+
+def load_file_content(
+    file_path: str,
+    file_name: str,
+    content_hash: Optional[str] = None,
+    split_pdf_pages: bool = False
+) -> Union[str, PdfPagePlan]:
+    """
+    Get the content of a file for analysis; runs in an extraction worker process
+    
+    Dummy files (placeholders whose first line is "This is a dummy file for")
+    get sample content based on their name; real files are extracted.
+    """
+    # Check if this is a dummy file
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            first_line = f.readline()
+        is_dummy = first_line.startswith("This is a dummy file for")
+    except (UnicodeDecodeError, IOError):
+        # If we can't read it as text, it's probably a binary file (like PDF)
+        is_dummy = False
+    
+    if is_dummy:
+        return dummy_file_content(file_name)
+    
+    # This is a real file, extract its content
+    return extract_file_content(file_path, file_name=file_name, content_hash=content_hash, split_pdf_pages=split_pdf_pages)
+
+def finish_pdf_plan(plan: PdfPagePlan, page_texts: List[Tuple[int, str]]) -> str:
+    """Format the extracted pages of a split PDF, store it in the extraction cache and add the file header"""
+    content = format_pdf_text(plan.metadata, page_texts, plan.skipped_pages, plan.budget)
+    if plan.cache_key is not None:
+        try:
+            extraction_cache.put(plan.cache_key, json.dumps({"header": plan.header_lines, "content": content}))
+        except Exception as e:
+            logger.warning("Could not store extraction in cache", extra={"path": plan.file_path, "error": str(e)})
+    return "\n".join(plan.file_header + plan.header_lines) + "\n\n" + content
+
+async def extract_on_pool(func: Callable[..., Any], *args, time_limit: float = 0, **kwargs) -> str:
+    """
+    Run an extraction function on the extraction pool, splitting large PDFs across workers
+    
+    func (extract_file_content or load_file_content) is called with
+    split_pdf_pages, so for a large PDF it returns a PdfPagePlan instead of
+    the content. Each of its page ranges is then submitted to the same pool
+    as a separate task, and the results are merged in page order. Every task
+    gets the time_limit.
+    """
+    result = await run_in_pool(func, *args, split_pdf_pages=True, time_limit=time_limit, **kwargs)
+    if not isinstance(result, PdfPagePlan):
+        return result
+    
+    tasks = [
+        asyncio.ensure_future(run_in_pool(extract_page_range, result.file_path, indexes, time_limit=time_limit))
+        for indexes in result.page_ranges
+    ]
+    try:
+        ranges = await asyncio.gather(*tasks)
+    except WorkerTimeoutError:
+        raise
+    except Exception as e:
+        return "\n".join(result.file_header + result.header_lines) + "\n\n" + pdf_error_message(result.file_path, e)
+    finally:
+        # Drop the ranges not started yet once one fails or the caller gives up
+        for task in tasks:
+            task.cancel()
+    
+    page_texts = [page for pages in ranges for page in pages]
+    return await asyncio.to_thread(finish_pdf_plan, result, page_texts)
+
+async def extract_files(
+    file_paths: List[str],
+    file_names: List[str],
+    content_hashes: List[Optional[str]]
+) -> List[str]:
+    """
+    Extract several files concurrently on the extraction process pool
+    
+    At most EXTRACTION_MAX_PARALLEL files of one request are extracted at
+    once. A file that takes longer than EXTRACTION_TIMEOUT seconds, or fails,
+    is replaced by an error note instead of failing the whole analysis. The
+    worker stops a timed-out extraction itself, so it does not keep holding
+    its pool slot; the request waits EXTRACTION_TIMEOUT_GRACE seconds longer
+    in case the worker is stuck in C code and cannot be interrupted.
+    
+    Returns:
+        The contents, in the same order as file_paths
+    """
+    semaphore = asyncio.Semaphore(EXTRACTION_MAX_PARALLEL)
+    
+    async def extract(file_path: str, file_name: str, content_hash: Optional[str]) -> str:
+        async with semaphore:
+            try:
+                extractor = extractor_name(file_name)
+                input_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else None
+                with span("extract", file_name=file_name, extractor=extractor, input_bytes=input_bytes):
+                    started = time.perf_counter()
+                    content = await asyncio.wait_for(
+                        extract_on_pool(load_file_content, file_path, file_name, content_hash, time_limit=EXTRACTION_TIMEOUT),
+                        timeout=EXTRACTION_TIMEOUT + EXTRACTION_TIMEOUT_GRACE if EXTRACTION_TIMEOUT > 0 else None
+                    )
+                    observe_extraction(extractor, time.perf_counter() - started, input_bytes, len(content))
+                return content
+            except (asyncio.TimeoutError, WorkerTimeoutError):
+                logger.warning("Extraction timed out", extra={"file_name": file_name, "timeout": EXTRACTION_TIMEOUT})
+                return f"Error: Extracting this file took longer than {EXTRACTION_TIMEOUT:g} seconds, so its content is not included."
+            except Exception as e:
+                logger.error("Error extracting file", extra={"file_name": file_name, "error": str(e)})
+                return f"Error extracting file content: {str(e)}"
+    
+    return await asyncio.gather(*(
+        extract(file_path, file_name, content_hash)
+        for file_path, file_name, content_hash in zip(file_paths, file_names, content_hashes)
+    ))
+
+async def map_reduce_content(
+    sections: List[Dict[str, str]],
+    analysis_type: str,
+    user_context: str,
+    system_prompt: str,
+    budget: int,
+    use_cache: bool = True
+) -> str:
+    """
+    Condense file content that does not fit the context window into notes
+    
+    The content is packed into chunks that fit the window, and each chunk is
+    condensed into notes concurrently (at most MAP_REDUCE_CONCURRENCY at once).
+    If the combined notes are still over budget, they are condensed again.
+    
+    Args:
+        sections: File sections as dicts with a "title" and its "content"
+        analysis_type: Type of analysis the notes are for
+        user_context: Additional context from the user, appended to every prompt
+        system_prompt: System prompt for the map completions
+        budget: Token budget the returned content must fit in
+        use_cache: Use the response cache for the map completions
+        
+    Returns:
+        The notes, to be used in place of the file content in the final prompt
+    """
+    semaphore = asyncio.Semaphore(MAP_REDUCE_CONCURRENCY)
+    reserved_tokens = await asyncio.to_thread(count_tokens, system_prompt + MAP_PROMPT_TEMPLATE + user_context, model_name) + 20
+    chunk_budget = prompt_budget(model_name, MAP_REDUCE_NOTES_TOKENS, reserved_tokens)
+    
+    async def condense(part: int, parts: int, chunk: str) -> str:
+        async with semaphore:
+            prompt = MAP_PROMPT_TEMPLATE.format(
+                part=part,
+                parts=parts,
+                analysis_type=analysis_type,
+                file_content=chunk
+            ) + user_context
+            return await complete_with_fallback(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=MAP_REDUCE_NOTES_TOKENS,
+                use_cache=use_cache
+            )
+    
+    # Each round shrinks the content by roughly chunk_budget / MAP_REDUCE_NOTES_TOKENS
+    for round_number in range(1, 4):
+        chunks = await asyncio.to_thread(pack_sections, sections, chunk_budget, model_name)
+        skipped = max(0, len(chunks) - MAP_REDUCE_MAX_CHUNKS)
+        chunks = chunks[:MAP_REDUCE_MAX_CHUNKS]
+        logger.info("Map-reduce round", extra={"round": round_number, "chunks": len(chunks), "skipped": skipped})
+        
+        results = await asyncio.gather(
+            *(condense(index, len(chunks), chunk) for index, chunk in enumerate(chunks, start=1)),
+            return_exceptions=True
+        )
+        if all(isinstance(result, Exception) for result in results):
+            raise results[0]
+        
+        sections = []
+        for index, result in enumerate(results, start=1):
+            if isinstance(result, Exception):
+                logger.warning("Error condensing part", extra={"part": index, "error": str(result)})
+                result = "[This part could not be analyzed]"
+            sections.append({"title": f"Notes on part {index} of {len(chunks)}:", "content": result})
+        if skipped:
+            sections.append({
+                "title": "Note:",
+                "content": f"The last {skipped} parts of the files were not analyzed (limit of {MAP_REDUCE_MAX_CHUNKS} parts)."
+            })
+        
+        notes = "\n".join(f"{section['title']}\n\n{section['content']}\n\n" for section in sections)
+        if await asyncio.to_thread(count_tokens, REDUCE_CONTENT_HEADER + notes, model_name) <= budget:
+            break
+    
+    return REDUCE_CONTENT_HEADER + notes
+
+async def analyze_files(
+    file_paths: List[str],
+    analysis_type: str = "summarize",
+    user_message: str = "",
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    file_names: Optional[List[str]] = None,
+    content_hashes: Optional[List[Optional[str]]] = None,
+    use_cache: bool = True
+) -> str:
     """
     Analyze files using OpenAI API
     
@@ -500,6 +1437,10 @@ async def analyze_files(file_paths: List[str], analysis_type: str = "summarize",
         file_paths: List of paths to files to analyze
         analysis_type: Type of analysis to perform (summarize, trends, kpis, actions, compare)
         user_message: Additional context or questions from the user
+        on_delta: Optional coroutine called with each response delta as it streams in
+        file_names: Original names of the files, in the same order as file_paths
+        content_hashes: Known SHA-256 hashes of the files, in the same order as file_paths
+        use_cache: Serve repeated analyses from the response cache; False forces a fresh response
         
     Returns:
         Analysis result as a string
@@ -509,166 +1450,75 @@ async def analyze_files(file_paths: List[str], analysis_type: str = "summarize",
     if not api_key or api_key == "your_openai_api_key_here":
         return "OpenAI API key is not configured. Please set your API key in the .env file."
     
-    # Extract content from all files
-    file_contents = []
-    for file_path in file_paths:
-        # Check if this is a dummy file
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                first_line = f.readline()
-            is_dummy = first_line.startswith("This is a dummy file for")
-        except (UnicodeDecodeError, IOError):
-            # If we can't read it as text, it's probably a binary file (like PDF)
-            is_dummy = False
-        
-        if is_dummy:
-            # This is a dummy file, create some sample content based on the filename
-            file_name = os.path.basename(file_path).split('_', 1)[1]  # Remove the UUID prefix
-            
-            if file_name.lower().endswith('.pdf'):
-                content = f"""Sample PDF content for {file_name}:
-                
-                Title: Business Report 2023
-                
-                Executive Summary:
-                The company has shown strong growth in Q3 2023, with revenue increasing by 15% compared to the previous quarter. 
-                Key performance indicators are trending positively, with customer acquisition costs decreasing by 10%.
-                
-                Financial Highlights:
-                - Revenue: $10.5M (up 15% QoQ)
-                - Gross Margin: 68% (up 3% QoQ)
-                - Operating Expenses: $4.2M (down 5% QoQ)
-                - Net Profit: $2.8M (up 22% QoQ)
-                
-                Market Analysis:
-                The market share has increased to 23%, making us the second largest player in the industry.
-                Competitor analysis shows that our product features are rated higher in 7 out of 10 categories.
-                
-                Recommendations:
-                1. Increase marketing spend in the APAC region where we're seeing the highest growth
-                2. Accelerate the development of the mobile application to capture the growing mobile user base
-                3. Consider strategic partnerships with complementary service providers
-                """
-            elif file_name.lower().endswith(('.xlsx', '.xls')):
-                content = f"""Sample Excel content for {file_name}:
-                
-                Sheet: Sales Data
-                
-                  Region  |  Q1 Sales  |  Q2 Sales  |  Q3 Sales  |  Q4 Sales  |  Total
-                ----------|------------|------------|------------|------------|--------
-                  North   |  $125,000  |  $142,000  |  $168,000  |  $182,000  | $617,000
-                  South   |  $118,000  |  $126,000  |  $140,000  |  $152,000  | $536,000
-                  East    |  $95,000   |  $102,000  |  $118,000  |  $125,000  | $440,000
-                  West    |  $142,000  |  $156,000  |  $170,000  |  $188,000  | $656,000
-                ----------|------------|------------|------------|------------|--------
-                  Total   |  $480,000  |  $526,000  |  $596,000  |  $647,000  | $2,249,000
-                
-                Sheet: Product Performance
-                
-                  Product  |  Units Sold  |  Revenue  |  Profit Margin
-                -----------|--------------|-----------|---------------
-                  Product A|    12,500    |  $625,000 |     32%
-                  Product B|    8,300     |  $415,000 |     28%
-                  Product C|    15,200    |  $760,000 |     35%
-                  Product D|    6,800     |  $340,000 |     40%
-                """
-            elif file_name.lower().endswith('.csv'):
-                content = f"""Sample CSV content for {file_name}:
-                
-                Date,Customer,Product,Quantity,Price,Total
-                2023-01-15,ABC Corp,Widget X,100,$25.00,$2500.00
-                2023-01-22,XYZ Inc,Widget Y,50,$30.00,$1500.00
-                2023-02-05,123 Industries,Widget Z,75,$22.50,$1687.50
-                2023-02-18,ABC Corp,Widget X,150,$24.00,$3600.00
-                2023-03-03,XYZ Inc,Widget Z,120,$22.00,$2640.00
-                2023-03-17,123 Industries,Widget Y,80,$29.50,$2360.00
-                2023-04-02,ABC Corp,Widget Z,200,$21.50,$4300.00
-                2023-04-15,XYZ Inc,Widget X,100,$24.50,$2450.00
-                """
-            else:
-                content = f"""Sample text content for {file_name}:
-                
-                This is a sample business document with some key information:
-                
-                - The project timeline has been extended by 2 weeks
-                - Budget allocation has increased by 15%
-                - Team size will grow from 8 to 12 members
-                - New requirements include mobile support and API integration
-                - Customer feedback shows 92% satisfaction rate
-                """
-        else:
-            # This is a real file, extract its content
-            content = extract_file_content(file_path)
-        
-        file_name = os.path.basename(file_path)
-        file_contents.append(f"File: {file_name}\n\n{content}\n\n")
+    stages = StageTimer("analyze_files")
+    
+    # Extract content from all files concurrently, keeping their order
+    file_names = file_names or [os.path.basename(file_path).split('_', 1)[-1] for file_path in file_paths]
+    content_hashes = content_hashes or [None] * len(file_paths)
+    contents = await extract_files(file_paths, file_names, content_hashes)
+    stages.lap("extract")
+    file_contents = [
+        {"title": f"File: {file_name}", "content": content}
+        for file_name, content in zip(file_names, contents)
+    ]
     
-    combined_content = "\n".join(file_contents)
+    combined_content = "\n".join(f"{section['title']}\n\n{section['content']}\n\n" for section in file_contents)
     
     # Get the appropriate prompt template
     prompt_template = PROMPT_TEMPLATES.get(analysis_type, PROMPT_TEMPLATES["summarize"])
     
-    # Format the prompt with file content
-    prompt = prompt_template.format(file_content=combined_content)
-    
     # Add user message if provided
-    if user_message:
-        prompt += f"\n\nAdditional context from user: {user_message}"
+    user_context = f"\n\nAdditional context from user: {user_message}" if user_message else ""
+    
+    system_prompt = "You are an expert business analyst assistant that provides detailed, accurate, and insightful analysis of business data."
+    max_tokens = 2000
     
     try:
         # Check if OpenAI client is initialized
-        if not client:
+        if not get_client():
             return "Error: OpenAI client not initialized. Please check your API key."
         
-        # Try with the specified model first
-        current_model = model_name
-        print(f"Sending request to OpenAI API with model: {current_model}")
-        print(f"Content length: {len(combined_content)} characters")
+        logger.info("Analyzing files", extra={"files": len(file_paths), "content_chars": len(combined_content)})
         
-        try:
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model=current_model,
-                messages=[
-                    {"role": "system", "content": "You are an expert business analyst assistant that provides detailed, accurate, and insightful analysis of business data."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=2000
-            )
-        except Exception as model_error:
-            # If the specified model fails, try fallback models
-            print(f"Error with model {current_model}: {str(model_error)}")
-            
-            for fallback_model in FALLBACK_MODELS:
-                if fallback_model != current_model:
-                    try:
-                        print(f"Trying fallback model: {fallback_model}")
-                        response = client.chat.completions.create(
-                            model=fallback_model,
-                            messages=[
-                                {"role": "system", "content": "You are an expert business analyst assistant that provides detailed, accurate, and insightful analysis of business data."},
-                                {"role": "user", "content": prompt}
-                            ],
-                            temperature=0.3,
-                            max_tokens=2000
-                        )
-                        print(f"Successfully used fallback model: {fallback_model}")
-                        break
-                    except Exception as fallback_error:
-                        print(f"Error with fallback model {fallback_model}: {str(fallback_error)}")
-                        continue
-            else:
-                # If all models fail, raise the original error
-                raise model_error
+        with span("build_prompt", content_chars=len(combined_content)) as prompt_span:
+            # Tokens taken by everything in the prompt except the file content
+            reserved_tokens = await asyncio.to_thread(
+                count_tokens, system_prompt + prompt_template.format(file_content="") + user_context, model_name
+            ) + 20
+            budget = prompt_budget(model_name, max_tokens, reserved_tokens)
+            content_tokens = await asyncio.to_thread(count_tokens, combined_content, model_name)
+            if prompt_span is not None:
+                prompt_span.attributes.update(content_tokens=content_tokens, budget=budget)
+        stages.lap("prompt")
+        if content_tokens > budget:
+            logger.info("Content over the token budget, using map-reduce analysis", extra={"content_tokens": content_tokens, "budget": budget})
+            with span("map_reduce"):
+                combined_content = await map_reduce_content(
+                    file_contents, analysis_type, user_context, system_prompt, budget, use_cache=use_cache
+                )
+            stages.lap("map_reduce")
+        
+        # Format the prompt with file content
+        prompt = prompt_template.format(file_content=combined_content) + user_context
+        
+        result = await complete_with_fallback(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=max_tokens,
+            on_delta=on_delta,
+            use_cache=use_cache
+        )
+        stages.lap("completion")
         
         # Return the response
-        result = response.choices[0].message.content
-        print(f"Received response from OpenAI API: {len(result)} characters")
+        logger.info("Received response from OpenAI API", extra={"chars": len(result)})
         return result
     except Exception as e:
         error_message = str(e)
-        print(f"Error calling OpenAI API: {error_message}")
+        logger.error("Error calling OpenAI API", extra={"error": error_message})
         
         # Check for common errors
         if "API key" in error_message:
@@ -679,3 +1529,5 @@ async def analyze_files(file_paths: List[str], analysis_type: str = "summarize",
             return "Error: The file content is too large for the AI model to process. Please try with a smaller file or extract the most important parts."
         else:
             return f"Error analyzing files: {error_message}"
+    finally:
+        stages.finish()
@@ -0,0 +1,44 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+# Page-range settings: PDFs with at least PDF_PARALLEL_MIN_PAGES selected pages are split into
+# ranges of PDF_PAGES_PER_TASK pages, extracted as separate tasks on the extraction pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+
+class PdfPagePlan:
+    """
+    A PDF whose pages are extracted as separate tasks on the extraction pool
+
+    Returned instead of the content by the worker that opened the document.
+    The caller submits one task per page range to the same pool, merges the
+    results in page order and finishes the content from the fields kept here.
+    """
+
+    def __init__(self, file_path: str, page_ranges: List[List[int]], metadata: List[str], skipped_pages: int, budget: int):
+        self.file_path = file_path
+        self.page_ranges = page_ranges
+        self.metadata = metadata
+        self.skipped_pages = skipped_pages
+        self.budget = budget
+        # Filled in by extract_file_content: the file header lines and the extraction cache key
+        self.file_header: List[str] = []
+        self.header_lines: List[str] = []
+        self.cache_key: Optional[str] = None
+
+def should_split(page_indexes: Sequence[int]) -> bool:
+    """Whether a page selection is large enough to be extracted in page ranges"""
+    return len(page_indexes) >= PDF_PARALLEL_MIN_PAGES and len(page_indexes) > PDF_PAGES_PER_TASK
+
+def page_ranges(page_indexes: Sequence[int]) -> List[List[int]]:
+    """Split a page selection into ranges of PDF_PAGES_PER_TASK pages"""
+    return [
+        list(page_indexes[start:start + PDF_PAGES_PER_TASK])
+        for start in range(0, len(page_indexes), PDF_PAGES_PER_TASK)
+    ]
+
+def extract_page_range(file_path: str, page_indexes: Sequence[int]) -> List[Tuple[int, str]]:
+    """Extract the text of a range of pages; runs in an extraction worker process"""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(index, reader.pages[index].extract_text() or "") for index in page_indexes]
@@ -0,0 +1,206 @@
+import os
+import io
+import hmac
+import json
+import types
+import random
+import asyncio
+import logging
+import cProfile
+import pstats
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+# Profiling settings; off unless the profile header is enabled or a sample rate is set
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of responses profiled, 0 to 1
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # When set, the profile header must carry this value
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "100"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "cache", "profiles")
+)
+
+# Request header asking for a profile of the response, e.g. "X-Profile: true" (or the PROFILE_TOKEN)
+PROFILE_HEADER = "X-Profile"
+
+# Functions listed in the text report
+REPORT_TOP_FUNCTIONS = 40
+
+class Profile:
+    """
+    A cProfile profile of one request, collected across the asyncio tasks it
+    starts and the extraction worker processes it uses
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.worker_stats: List[Dict] = []
+
+    async def run(self, coro: Awaitable) -> Any:
+        """Run a coroutine, and the tasks it starts, under this profile"""
+        install_task_factory()
+        token = active_profile.set(self)
+        try:
+            return await _run_profiled(coro, self.profiler)
+        finally:
+            active_profile.reset(token)
+
+    def add_worker_stats(self, stats: Dict):
+        self.worker_stats.append(stats)
+
+    def stats(self) -> pstats.Stats:
+        """The combined statistics of the event loop and the worker processes"""
+        combined = pstats.Stats(self.profiler)
+        for stats in self.worker_stats:
+            combined.add(_RawStats(stats))
+        return combined
+
+class _RawStats:
+    """Statistics from a worker process in the form pstats.Stats accepts"""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+# The profile of the code running now; tasks created while it is set are profiled too
+active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+def header_requests_profile(header_value: Optional[str]) -> bool:
+    """Whether a profile header value asks for a profile; never, unless PROFILE_HEADER_ENABLED is set"""
+    if not PROFILE_HEADER_ENABLED or not header_value:
+        return False
+    if PROFILE_TOKEN:
+        return hmac.compare_digest(header_value.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+    return header_value.lower() in ("1", "true", "yes")
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """Whether to profile a request, given the value of its profile header"""
+    if header_requests_profile(header_value):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def call_profiled(func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict]:
+    """Run func under cProfile; runs in a worker process and returns the result with the raw statistics"""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    profiler.create_stats()
+    return result, profiler.stats
+
+@types.coroutine
+def _profiled_steps(coro, profiler: cProfile.Profile):
+    """
+    Drive a coroutine, profiling only while it runs
+
+    The profiler is turned off whenever the coroutine is suspended, so other
+    requests served by the event loop in the meantime are not included.
+    """
+    value, error = None, None
+    while True:
+        profiler.enable()
+        try:
+            if error is not None:
+                yielded = coro.throw(error)
+            else:
+                yielded = coro.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profiler.disable()
+        try:
+            value, error = (yield yielded), None
+        except BaseException as e:
+            value, error = None, e
+
+async def _run_profiled(coro, profiler: cProfile.Profile):
+    return await _profiled_steps(coro, profiler)
+
+def _profiling_task_factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+    profile = active_profile.get()
+    if profile is not None:
+        coro = _run_profiled(coro, profile.profiler)
+    return asyncio.Task(coro, loop=loop, **kwargs)
+
+def install_task_factory():
+    """Profile the tasks a profiled request starts (gathered extractions, hedged completions)"""
+    loop = asyncio.get_running_loop()
+    factory = loop.get_task_factory()
+    if factory is None:
+        loop.set_task_factory(_profiling_task_factory)
+    elif factory is not _profiling_task_factory:
+        logger.warning("Event loop has its own task factory; only the main task of profiled requests is profiled")
+
+def artifact_path(artifact_id: str, extension: str) -> str:
+    # IDs are generated UUIDs; keep only their characters so a path cannot leave the directory
+    safe_id = "".join(char for char in artifact_id if char.isalnum() or char == "-")
+    return os.path.join(PROFILE_DIR, f"{safe_id}.{extension}")
+
+def save_artifact(artifact_id: str, profile: Profile, trace: Optional[Trace] = None, **metadata):
+    """
+    Save a profile as a downloadable artifact
+
+    Writes the cProfile data (.prof, readable with pstats or snakeviz) and
+    a .json file with the trace, a text report and the metadata. Errors are
+    logged rather than raised, so they do not hide the outcome of the
+    profiled run.
+
+    Args:
+        artifact_id: ID the artifact is saved and looked up under (a message ID)
+        profile: The collected profile
+        trace: Trace of the profiled run
+        metadata: Extra fields stored with the artifact
+    """
+    try:
+        write_artifact(artifact_id, profile, trace, metadata)
+        prune_artifacts()
+    except Exception as e:
+        logger.error("Error saving profile", extra={"artifact_id": artifact_id, "error": str(e)})
+
+def write_artifact(artifact_id: str, profile: Profile, trace: Optional[Trace], metadata: Dict[str, Any]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats = profile.stats()
+    stats.dump_stats(artifact_path(artifact_id, "prof"))
+
+    report = io.StringIO()
+    stats.stream = report
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_TOP_FUNCTIONS)
+    with open(artifact_path(artifact_id, "json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "id": artifact_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "worker_processes_profiled": len(profile.worker_stats),
+            **metadata,
+            "trace": trace.to_dict() if trace is not None else None,
+            "trace_text": trace.format() if trace is not None else None,
+            "report": report.getvalue()
+        }, f, default=str)
+    logger.info("Saved profile", extra={"artifact_id": artifact_id})
+
+def prune_artifacts():
+    """Keep only the newest PROFILE_MAX_ARTIFACTS profiles"""
+    if PROFILE_MAX_ARTIFACTS <= 0:
+        return
+    entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[PROFILE_MAX_ARTIFACTS:]:
+        artifact_id = entry.name[:-len(".json")]
+        for extension in ("json", "prof"):
+            try:
+                os.remove(artifact_path(artifact_id, extension))
+            except FileNotFoundError:
+                pass
+
+def load_artifact(artifact_id: str) -> Optional[Dict[str, Any]]:
+    """The trace and report saved with a profile, or None if there is none"""
+    try:
+        with open(artifact_path(artifact_id, "json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
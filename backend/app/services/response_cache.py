@@ -0,0 +1,126 @@
+import os
+import logging
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+from sqlalchemy import func
+
+from app.models.database import ResponseCacheEntry
+from app.utils.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# LLM response cache settings
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_HOURS = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "168"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "100"))
+
+def normalize_content(text: str) -> str:
+    """Normalize line endings and surrounding whitespace so equivalent prompts share a key"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+def make_response_key(
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    messages: List[Dict[str, str]],
+    template_version: str
+) -> str:
+    """
+    Build the cache key of a chat completion
+    
+    Args:
+        model: Requested model
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        messages: Chat messages; file content in them already reflects the file hashes
+        template_version: Version of the prompt templates
+        
+    Returns:
+        SHA-256 hex digest identifying the completion
+    """
+    payload = json.dumps({
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "template_version": template_version,
+        "messages": [
+            {"role": message["role"], "content": normalize_content(message["content"])}
+            for message in messages
+        ]
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_response(key: str) -> Optional[str]:
+    """Return the cached response for a key, or None if it is missing or expired"""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    
+    db = SessionLocal()
+    try:
+        entry = db.get(ResponseCacheEntry, key)
+        if entry is None:
+            return None
+        
+        now = datetime.now()
+        if entry.expiresAt <= now:
+            db.delete(entry)
+            db.commit()
+            return None
+        
+        entry.lastAccess = now
+        entry.hits += 1
+        db.commit()
+        return entry.response
+    except Exception as e:
+        db.rollback()
+        logger.warning("Error reading response cache", extra={"error": str(e)})
+        return None
+    finally:
+        db.close()
+
+def store_response(key: str, model: str, response: str):
+    """Store a response and evict expired and least recently used entries over the size cap"""
+    if not RESPONSE_CACHE_ENABLED:
+        return
+    
+    size = len(response.encode('utf-8'))
+    max_bytes = int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+    if size > max_bytes:
+        return
+    
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        db.merge(ResponseCacheEntry(
+            key=key,
+            model=model,
+            response=response,
+            size=size,
+            hits=0,
+            timestamp=now,
+            lastAccess=now,
+            expiresAt=now + timedelta(hours=RESPONSE_CACHE_TTL_HOURS)
+        ))
+        db.flush()
+        
+        db.query(ResponseCacheEntry).filter(ResponseCacheEntry.expiresAt <= now).delete(synchronize_session=False)
+        total = db.query(func.coalesce(func.sum(ResponseCacheEntry.size), 0)).scalar()
+        if total > max_bytes:
+            entries = db.query(ResponseCacheEntry.key, ResponseCacheEntry.size).order_by(ResponseCacheEntry.lastAccess).all()
+            evicted = []
+            for entry_key, entry_size in entries:
+                if total <= max_bytes:
+                    break
+                evicted.append(entry_key)
+                total -= entry_size
+            db.query(ResponseCacheEntry).filter(ResponseCacheEntry.key.in_(evicted)).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Error writing response cache", extra={"error": str(e)})
+    finally:
+        db.close()
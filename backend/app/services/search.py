@@ -0,0 +1,159 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.utils.database import SessionLocal
+
+# Full-text search settings
+SEARCH_MAX_FILE_CHARS = int(os.getenv("SEARCH_MAX_FILE_CHARS", "2000000"))
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))
+
+# Markers around matched terms in snippets
+SNIPPET_START = "**"
+SNIPPET_END = "**"
+SNIPPET_ELLIPSIS = "..."
+
+# Matches are ranked by bm25 (file names weigh more, see migration 0004) and
+# sorted inside FTS5; snippets and details are only built for the page returned
+SEARCH_QUERY = text("""
+    SELECT
+        search_documents.kind AS kind,
+        search_documents.ref_id AS ref_id,
+        search_documents.session_id AS session_id,
+        sessions.title AS session_title,
+        messages.role AS role,
+        messages.timestamp AS timestamp,
+        file_attachments.name AS file_name,
+        hits.snippet AS snippet,
+        hits.rank AS rank
+    FROM (
+        SELECT
+            rowid AS document_id,
+            rank,
+            snippet(search_fts, -1, :snippet_start, :snippet_end, :ellipsis, :snippet_tokens) AS snippet
+        FROM search_fts
+        WHERE search_fts MATCH :match
+            AND (:kind IS NULL OR rowid IN (SELECT id FROM search_documents WHERE kind = :kind))
+            AND (:session_id IS NULL OR rowid IN (SELECT id FROM search_documents WHERE session_id = :session_id))
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    ) AS hits
+    JOIN search_documents ON search_documents.id = hits.document_id
+    LEFT JOIN messages ON search_documents.kind = 'message' AND messages.id = search_documents.ref_id
+    LEFT JOIN sessions ON sessions.id = search_documents.session_id
+    LEFT JOIN file_attachments ON search_documents.kind = 'file' AND file_attachments.id = search_documents.ref_id
+    ORDER BY hits.rank
+""")
+
+class SearchUnavailableError(Exception):
+    """Raised when the database has no full-text search index (only SQLite has one)"""
+    pass
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression
+    
+    Every word must match; words are quoted so FTS5 operators in the input
+    are taken literally. A trailing * on a word makes it a prefix match.
+    Returns None if the text has no searchable words.
+    """
+    terms = []
+    for word in re.findall(r"[\w*]+", query):
+        prefix = word.endswith("*")
+        word = word.strip("*")
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms) or None
+
+async def search(
+    db,
+    query: str,
+    kind: Optional[str] = None,
+    session_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Search messages and files, best matches first
+    
+    Args:
+        db: Async database session
+        query: Free text to search for
+        kind: Only return "message" or "file" results
+        session_id: Only return messages of this session
+        limit: Maximum number of results
+        offset: Number of results to skip
+    
+    Returns:
+        Result rows as dicts; file results list the sessions the file was attached in
+    
+    Raises:
+        SearchUnavailableError: If the database has no search index
+    """
+    if db.bind.dialect.name != "sqlite":
+        raise SearchUnavailableError("Full-text search is only available with SQLite")
+    match = build_match_query(query)
+    if match is None:
+        return []
+    
+    rows = (await db.execute(SEARCH_QUERY, {
+        "match": match,
+        "kind": kind,
+        "session_id": session_id,
+        "limit": limit,
+        "offset": offset,
+        "snippet_start": SNIPPET_START,
+        "snippet_end": SNIPPET_END,
+        "ellipsis": SNIPPET_ELLIPSIS,
+        "snippet_tokens": SEARCH_SNIPPET_TOKENS
+    })).mappings().all()
+    results = [dict(row) for row in rows]
+    
+    # Sessions in which the files on this page were attached, in one query
+    file_ids = [result["ref_id"] for result in results if result["kind"] == "file"]
+    file_sessions: Dict[str, List[str]] = {}
+    if file_ids:
+        params = {f"file_{index}": file_id for index, file_id in enumerate(file_ids)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        links = await db.execute(text(f"""
+            SELECT DISTINCT message_attachment.attachment_id, messages.session_id
+            FROM message_attachment
+            JOIN messages ON messages.id = message_attachment.message_id
+            WHERE message_attachment.attachment_id IN ({placeholders})
+        """), params)
+        for file_id, linked_session_id in links:
+            file_sessions.setdefault(file_id, []).append(linked_session_id)
+    for result in results:
+        result["file_sessions"] = file_sessions.get(result["ref_id"], []) if result["kind"] == "file" else None
+    return results
+
+def index_file_text(file_id: str, content: str):
+    """
+    Store the extracted text of a file in the search index
+    
+    The file's document is created with the file row; this fills in its
+    body. Does nothing on databases without a search index.
+    """
+    if content.startswith("Error"):
+        return
+    db = SessionLocal()
+    try:
+        if db.bind.dialect.name != "sqlite":
+            return
+        document_id = db.execute(
+            text("SELECT id FROM search_documents WHERE kind = 'file' AND ref_id = :file_id"),
+            {"file_id": file_id}
+        ).scalar()
+        if document_id is None:
+            return
+        name = db.execute(text("SELECT title FROM search_fts WHERE rowid = :id"), {"id": document_id}).scalar() or ""
+        db.execute(text("DELETE FROM search_fts WHERE rowid = :id"), {"id": document_id})
+        db.execute(
+            text("INSERT INTO search_fts (rowid, title, body) VALUES (:id, :title, :body)"),
+            {"id": document_id, "title": name, "body": content[:SEARCH_MAX_FILE_CHARS]}
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,128 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+class ColumnStats:
+    """
+    Running statistics of a numeric column
+
+    Count, mean and variance are merged chunk by chunk with Chan's parallel
+    algorithm, and a fixed-size uniform sample of the values is kept for
+    approximate quantiles.
+    """
+
+    def __init__(self, sample_size: int, rng: np.random.Generator):
+        self.sample_size = sample_size
+        self.rng = rng
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        # Sample values with their random keys; the lowest keys form a uniform sample
+        self.sample = np.empty(0)
+        self.sample_keys = np.empty(0)
+
+    def update(self, values: np.ndarray):
+        n = len(values)
+        if n == 0:
+            return
+
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        keys = self.rng.random(n)
+        sample = np.concatenate([self.sample, values])
+        sample_keys = np.concatenate([self.sample_keys, keys])
+        if len(sample) > self.sample_size:
+            keep = np.argpartition(sample_keys, self.sample_size)[:self.sample_size]
+            sample, sample_keys = sample[keep], sample_keys[keep]
+        self.sample, self.sample_keys = sample, sample_keys
+
+    def describe(self) -> pd.Series:
+        """Statistics in the same layout as pandas' describe()"""
+        if self.count == 0:
+            return pd.Series(
+                [0.0] + [np.nan] * 7,
+                index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+            )
+
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        q25, q50, q75 = np.quantile(self.sample, [0.25, 0.5, 0.75])
+        return pd.Series(
+            [float(self.count), self.mean, std, self.min, q25, q50, q75, self.max],
+            index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        )
+
+class TableProfiler:
+    """
+    Single-pass profile of a table read in chunks
+
+    Tracks dtypes, row count, null counts, numeric column statistics and the
+    first and last rows, with memory bounded by the chunk size plus a fixed
+    sample per numeric column.
+    """
+
+    def __init__(self, preview_rows: int = 10, quantile_sample_size: int = 10000, seed: int = 0):
+        self.preview_rows = preview_rows
+        self.quantile_sample_size = quantile_sample_size
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.schema: Optional[pd.DataFrame] = None
+        self.null_counts: Optional[pd.Series] = None
+        self.head: Optional[pd.DataFrame] = None
+        self.tail: Optional[pd.DataFrame] = None
+        self.column_stats: Dict[str, ColumnStats] = {}
+
+    def update(self, chunk: pd.DataFrame):
+        """Add a chunk of rows to the profile"""
+        if self.schema is None:
+            self.schema = chunk.iloc[:0]
+            self.null_counts = chunk.isnull().sum()
+            # Keep enough leading rows to print small tables in full
+            self.head = chunk.head(self.preview_rows * 2)
+        else:
+            # Concatenating empty frames resolves dtypes the way a full read would
+            self.schema = pd.concat([self.schema, chunk.iloc[:0]])
+            self.null_counts = self.null_counts.add(chunk.isnull().sum(), fill_value=0).astype(int)
+            if len(self.head) < self.preview_rows * 2:
+                self.head = pd.concat([self.head, chunk.head(self.preview_rows * 2 - len(self.head))])
+
+        self.tail = pd.concat([self.tail, chunk]).tail(self.preview_rows) if self.tail is not None else chunk.tail(self.preview_rows)
+        self.rows += len(chunk)
+
+        for col in chunk.select_dtypes(include=['number']).columns:
+            values = chunk[col].dropna().to_numpy(dtype=float)
+            if col not in self.column_stats:
+                self.column_stats[col] = ColumnStats(self.quantile_sample_size, self.rng)
+            self.column_stats[col].update(values)
+
+    @property
+    def dtypes(self) -> pd.Series:
+        return self.schema.dtypes
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.schema.columns
+
+    def preview(self) -> pd.DataFrame:
+        """First and last rows, or the whole table if it is small"""
+        if self.rows > self.preview_rows * 2:
+            return pd.concat([self.head.head(self.preview_rows), self.tail])
+        return self.head
+
+    def describe(self) -> pd.DataFrame:
+        """Numeric column statistics in the same layout as pandas' describe()"""
+        numeric_cols = self.schema.select_dtypes(include=['number']).columns
+        return pd.DataFrame({
+            col: self.column_stats[col].describe() if col in self.column_stats else ColumnStats(1, self.rng).describe()
+            for col in numeric_cols
+        })
@@ -0,0 +1,145 @@
+import os
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tracing settings
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "30"))  # 0 never logs traces as slow
+
+class Span:
+    """One timed operation within a trace; times are seconds since the trace started"""
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], start: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class Trace:
+    """The spans recorded while handling one request or background job"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+
+    def new_span(self, name: str, parent_id: Optional[int], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, len(self.spans), parent_id, time.perf_counter() - self.started, attributes)
+        self.spans.append(span)
+        return span
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.spans[0].duration if self.spans else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration": self.duration,
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+    def format(self) -> str:
+        """The spans as an indented tree, one line each with its start, duration and attributes"""
+        children: Dict[Optional[int], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        lines = []
+
+        def add(span: Span, depth: int):
+            duration = f"{span.duration * 1000:.1f} ms" if span.duration is not None else "unfinished"
+            details = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            if span.error:
+                details = f"{details} error={span.error}".strip()
+            lines.append(f"{span.start * 1000:10.1f} ms  {'  ' * depth}{span.name} ({duration}) {details}".rstrip())
+            for child in sorted(children.get(span.span_id, []), key=lambda child: child.start):
+                add(child, depth + 1)
+
+        for root in children.get(None, []):
+            add(root, 0)
+        return "\n".join(lines)
+
+# The trace and span of the code running now; asyncio tasks inherit them from the code that created them
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time the enclosed block as a span of the current trace
+
+    Does nothing outside a trace. The span is yielded so attributes known
+    only later (e.g. a cache hit) can be added to span.attributes.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = current_span.get()
+    new_span = trace.new_span(name, parent.span_id if parent is not None else None, attributes)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = type(e).__name__
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - trace.started - new_span.start
+        current_span.reset(token)
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Optional[Trace]]:
+    """
+    Record the spans of the enclosed block in a new trace, under a root span
+
+    When the trace takes longer than TRACE_SLOW_SECONDS its span tree is
+    logged, otherwise only at debug level.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    trace = Trace(name)
+    trace_token = current_trace.set(trace)
+    span_token = current_span.set(None)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        current_span.reset(span_token)
+        current_trace.reset(trace_token)
+        slow = TRACE_SLOW_SECONDS > 0 and trace.duration >= TRACE_SLOW_SECONDS
+        if slow or logger.isEnabledFor(logging.DEBUG):
+            logger.log(
+                logging.INFO if slow else logging.DEBUG,
+                "Slow trace:\n%s" if slow else "Trace:\n%s",
+                trace.format(),
+                extra={"trace_id": trace.trace_id, "trace": name, "duration": round(trace.duration, 3)}
+            )
@@ -0,0 +1,61 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from app.services.context_planner import get_encoding
+from app.services.extraction_pool import EXTRACTION_WORKERS, run_in_pool
+from app.services.openai_service import get_client, import_extraction_libraries, model_name
+
+logger = logging.getLogger(__name__)
+
+# Warm-up settings; warm-up runs in the background once the server accepts requests
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+WARM_UP_EXTRACTION_WORKERS = os.getenv("WARM_UP_EXTRACTION_WORKERS", "true").lower() == "true"
+
+_task: Optional[asyncio.Task] = None
+
+async def warm_up():
+    """
+    Load what the first requests would otherwise wait for
+
+    Creates the OpenAI client, loads the tokenizer of the configured model and
+    starts the extraction worker processes with pandas and the other
+    extraction libraries imported. A step that fails is logged and skipped;
+    the request that needs it does the work itself later.
+    """
+    started = time.perf_counter()
+    steps = [("openai_client", lambda: asyncio.to_thread(get_client)),
+             ("tokenizer", lambda: asyncio.to_thread(get_encoding, model_name))]
+    if WARM_UP_EXTRACTION_WORKERS:
+        # One task per worker, so the pool starts all of its processes
+        steps.append(("extraction_workers", lambda: asyncio.gather(
+            *(run_in_pool(import_extraction_libraries) for _ in range(EXTRACTION_WORKERS))
+        )))
+
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            await step()
+            logger.debug("Warm-up step done", extra={"step": name, "duration": round(time.perf_counter() - step_started, 3)})
+        except Exception as e:
+            logger.warning("Warm-up step failed", extra={"step": name, "error": str(e)})
+    logger.info("Warm-up finished", extra={"duration": round(time.perf_counter() - started, 3)})
+
+def start_warm_up():
+    """Start warming up in the background, if enabled"""
+    global _task
+    if WARM_UP_ON_STARTUP and _task is None:
+        _task = asyncio.create_task(warm_up())
+
+async def stop_warm_up():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+def is_warm() -> bool:
+    """Whether warm-up has finished, or is disabled"""
+    return not WARM_UP_ON_STARTUP or (_task is not None and _task.done())
@@ -1,21 +1,113 @@
 import os
-from sqlalchemy import create_engine
+import asyncio
+import logging
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session as SQLAlchemySession
 from datetime import datetime
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator
 import uuid
+from alembic import command
+from alembic.config import Config
 
 from app.models.database import Base, Session, Message, FileAttachment
 
+logger = logging.getLogger(__name__)
+
 # Get database URL from environment variable or use SQLite as default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./report_agent.db")
 
+# Async drivers used for the async engine unless ASYNC_DATABASE_URL is set
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg"
+}
+
+# Connection pool settings (each engine, sync and async, has its own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+# SQLite tuning applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+def async_database_url(url: str) -> str:
+    """The async driver variant of a database URL"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Pool and driver options for an engine"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection; there is no pool to size
+        return {}
+    options: Dict[str, Any] = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": not is_sqlite(url)
+    }
+    if is_sqlite(url):
+        # Connections are handed between the event loop and the threadpool
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.get_dialect().is_async:
+            # aiosqlite would otherwise open a new connection for every session
+            options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune a new SQLite connection
+    
+    WAL lets reads run while a write is in progress, synchronous=NORMAL only
+    syncs at checkpoints (safe in WAL mode), busy_timeout makes concurrent
+    writers wait for the lock instead of failing with "database is locked",
+    and mmap serves reads from the page cache without copying.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    finally:
+        cursor.close()
+
+# Alembic configuration and the revision matching the schema created before migrations
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+BASELINE_REVISION = "0001"
+
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+# Async engine for request handlers that read without blocking the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+
+if is_sqlite(DATABASE_URL):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+if is_sqlite(ASYNC_DATABASE_URL):
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
 
-# Create sessionmaker
+# Create sessionmakers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Dependency to get DB session
 def get_db() -> Generator[SQLAlchemySession, None, None]:
@@ -31,13 +123,64 @@ def get_db() -> Generator[SQLAlchemySession, None, None]:
     finally:
         db.close()
 
+def alembic_config() -> Config:
+    """Alembic configuration usable from any working directory"""
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    return config
+
+def run_migrations(revision: str = "head"):
+    """
+    Upgrade the database schema to a revision
+    
+    Databases created by create_all before migrations existed have tables
+    but no alembic_version; they are stamped with the baseline revision (the
+    original schema) so only the later migrations run. 0001a skips the
+    tables and columns such databases may already have.
+    """
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        if "alembic_version" not in tables and "sessions" in tables:
+            logger.info("Stamping existing database with baseline revision", extra={"revision": BASELINE_REVISION})
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+# Dependency to get an async DB session
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get an async database session.
+    
+    Relationships are not lazy-loaded on async sessions; load the ones a
+    response needs with selectinload.
+    
+    Yields:
+        AsyncSession: An async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def check_database(timeout: float = 2.0) -> bool:
+    """Whether the database answers a trivial query within timeout seconds, for the readiness check"""
+    async def ping():
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    
+    try:
+        await asyncio.wait_for(ping(), timeout)
+        return True
+    except Exception as e:
+        logger.warning("Database check failed", extra={"error": str(e)})
+        return False
+
 # Initialize database
 def init_db():
     """
-    Initialize the database by creating all tables and a default session if none exists.
+    Initialize the database by applying migrations and creating a default session if none exists.
     """
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade tables
+    run_migrations()
     
     # Create a default session if none exists
     db = SessionLocal()
@@ -51,6 +194,6 @@ def init_db():
             db.commit()
     except Exception as e:
         db.rollback()
-        print(f"Error initializing database: {e}")
+        logger.exception("Error initializing database")
     finally:
         db.close()
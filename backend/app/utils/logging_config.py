@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+# Logging settings
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+
+# Attributes every log record has; any others were passed as `extra` fields
+STANDARD_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """The structured fields passed to a log call with `extra`"""
+    return {key: value for key, value in vars(record).items() if key not in STANDARD_RECORD_ATTRIBUTES}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the time, level, logger, message and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **record_fields(record)
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Readable lines with the extra fields appended as key=value pairs"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+def configure_logging():
+    """
+    Send the application's log records ("app.*" loggers) to stdout
+
+    Uses LOG_LEVEL and LOG_FORMAT. Safe to call more than once, e.g. in
+    every extraction worker process.
+    """
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    # uvicorn configures the root logger's output itself; keep app records out of it
+    logger.propagate = False
@@ -0,0 +1,189 @@
+import os
+import hashlib
+import asyncio
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as SQLAlchemySession
+
+from app.models.database import FileBlob, FileAttachment
+
+# Directory where uploaded files are stored
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+
+# Content-addressed blobs and in-progress uploads
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+UPLOAD_TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+
+# Upload limits
+MAX_UPLOAD_SIZE_MB = float(os.getenv("MAX_UPLOAD_SIZE_MB", "500"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Room for the multipart boundaries and part headers around the file content
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE_MB"""
+
+class UploadSizeLimitMiddleware:
+    """
+    Enforce MAX_UPLOAD_SIZE_MB on upload request bodies while they are received
+    
+    FastAPI parses a multipart body, spooling the file, before the endpoint
+    runs, so the check in save_upload alone only fires once the whole body
+    has arrived. This rejects a too large Content-Length right away and
+    counts the body as it streams in, failing the request with 413 as soon
+    as it passes the limit.
+    """
+    
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        
+        max_body = int(MAX_UPLOAD_SIZE_MB * 1024 * 1024) + MULTIPART_OVERHEAD_BYTES
+        detail = f"File is larger than the maximum upload size of {MAX_UPLOAD_SIZE_MB:g} MB"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_body:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    # Raised inside body parsing; FastAPI passes HTTPExceptions through as they are
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+def get_upload_path(file_id: str, file_name: str) -> str:
+    """Get the path of a file stored before deduplication"""
+    return os.path.join(UPLOAD_DIR, f"{file_id}_{file_name}")
+
+def get_blob_path(content_hash: str) -> str:
+    """Get the path of a content-addressed blob"""
+    return os.path.join(BLOB_DIR, content_hash[:2], content_hash)
+
+def get_file_path(file_attachment: FileAttachment) -> str:
+    """Get the path of an uploaded file's content on disk"""
+    if file_attachment.content_hash:
+        return get_blob_path(file_attachment.content_hash)
+    return get_upload_path(file_attachment.id, file_attachment.name)
+
+def _write_chunk(buffer: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+async def save_upload(file: UploadFile) -> Tuple[str, str, int]:
+    """
+    Stream an upload to a temporary file in chunks, hashing it on the way
+    
+    Disk writes and hashing run in a worker thread so large uploads do not
+    block the event loop.
+    
+    Returns:
+        The temporary file path, the SHA-256 hash of the content and its size
+        
+    Raises:
+        UploadTooLargeError: If the upload is larger than MAX_UPLOAD_SIZE_MB
+    """
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4()}.part")
+    max_size = int(MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"File is larger than the maximum upload size of {MAX_UPLOAD_SIZE_MB:g} MB"
+                    )
+                await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    
+    return tmp_path, digest.hexdigest(), size
+
+def _increment_ref(db: SQLAlchemySession, content_hash: str) -> int:
+    return db.query(FileBlob).filter(FileBlob.hash == content_hash).update(
+        {FileBlob.refCount: FileBlob.refCount + 1},
+        synchronize_session=False
+    )
+
+def store_blob(db: SQLAlchemySession, tmp_path: str, content_hash: str, size: int):
+    """
+    Store uploaded content as a blob, or add a reference to an identical existing blob
+    
+    Call this before making other changes in the session; the caller commits.
+    """
+    if _increment_ref(db, content_hash):
+        os.remove(tmp_path)
+        return
+    
+    blob_path = get_blob_path(content_hash)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(tmp_path, blob_path)
+    
+    try:
+        db.add(FileBlob(hash=content_hash, size=size, refCount=1))
+        db.flush()
+    except IntegrityError:
+        # Another upload of the same content created the blob first
+        db.rollback()
+        _increment_ref(db, content_hash)
+
+@contextmanager
+def release_blob(db: SQLAlchemySession, content_hash: str) -> Iterator[None]:
+    """
+    Drop one reference to a blob, deleting it once nothing references it
+    
+    Use it around the commit of the session. The file of a blob nothing
+    references any more is moved aside while the transaction still holds the
+    write lock on its row, so a concurrent upload of the same content cannot
+    recreate it in between, and is only deleted once the block has committed.
+    If the block raises, the file is put back.
+    """
+    db.query(FileBlob).filter(FileBlob.hash == content_hash).update(
+        {FileBlob.refCount: FileBlob.refCount - 1},
+        synchronize_session=False
+    )
+    blob = db.query(FileBlob).filter(FileBlob.hash == content_hash).first()
+    blob_path = get_blob_path(content_hash)
+    released_path: Optional[str] = None
+    if blob is not None and blob.refCount <= 0:
+        db.delete(blob)
+        if os.path.exists(blob_path):
+            released_path = f"{blob_path}.{uuid.uuid4().hex}.deleted"
+            os.replace(blob_path, released_path)
+    
+    try:
+        yield
+    except BaseException:
+        if released_path is not None:
+            os.replace(released_path, blob_path)
+        raise
+    
+    if released_path is not None:
+        os.remove(released_path)
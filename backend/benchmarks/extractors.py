@@ -0,0 +1,431 @@
+"""
+Extractor benchmark over synthetic files of increasing size
+
+Generates deterministic synthetic inputs (tall and wide CSVs, single- and
+many-sheet workbooks, text and blank PDF pages, nested JSON and JSONL) at
+each requested size and runs every extraction path on them. Each run is a
+fresh subprocess, so the peak RSS of one run does not leak into the next.
+Wall time, peak RSS, input size and output size are written as JSON, and two
+result files can be compared to spot regressions between commits.
+
+Sizes are targets: row, page and record counts are calibrated from a small
+sample, and the actual input size is recorded with each result. Generated
+inputs are kept in the data directory and reused by later runs. PDFs are
+extracted in-process, one page after another; benchmarks/pdf_parallel.py
+measures large PDFs split into page ranges across the extraction pool.
+
+Usage (from the backend directory):
+    python benchmarks/extractors.py [--sizes 1KB,1MB,10MB] [--cases csv_tall,pdf_text] [--repeat 3]
+    python benchmarks/extractors.py --sizes 100MB,1GB --timeout 1800
+    python benchmarks/extractors.py --compare benchmarks/results/extractors-OLD.json benchmarks/results/extractors-NEW.json
+"""
+import os
+import sys
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from importlib import metadata
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+CATEGORIES = [f"category_{index}" for index in range(20)]
+WORDS = [f"lorem{index}" for index in range(500)]
+START_DATE = date(2020, 1, 1)
+
+# Units (rows, pages or records) written to calibrate how many a target size needs
+CALIBRATION_UNITS = 2000
+
+def parse_size(text: str) -> int:
+    """Bytes in a size such as 1KB, 10MB or 1GB"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+# Generators: each writes `units` rows, pages or records to `path`, the same for the same arguments
+
+def tall_row(rng: random.Random, index: int) -> list:
+    return [
+        index,
+        (START_DATE + timedelta(days=index % 3650)).isoformat(),
+        rng.choice(CATEGORIES),
+        round(rng.uniform(0, 10000), 2),
+        rng.randint(1, 500),
+        " ".join(rng.choice(WORDS) for _ in range(4))
+    ]
+
+TALL_HEADER = ["id", "date", "category", "amount", "quantity", "note"]
+WIDE_COLUMNS = 200
+
+def write_csv_tall(path: str, units: int):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(",".join(TALL_HEADER) + "\n")
+        for index in range(units):
+            file.write(",".join(str(value) for value in tall_row(rng, index)) + "\n")
+
+def write_csv_wide(path: str, units: int):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(",".join(f"metric_{column}" for column in range(WIDE_COLUMNS)) + "\n")
+        for _ in range(units):
+            file.write(",".join(f"{rng.uniform(-1000, 1000):.3f}" for _ in range(WIDE_COLUMNS)) + "\n")
+
+def write_workbook(path: str, units: int, sheets: int):
+    from openpyxl import Workbook
+    rng = random.Random(0)
+    workbook = Workbook(write_only=True)
+    rows_per_sheet = max(1, units // sheets)
+    for sheet in range(sheets):
+        worksheet = workbook.create_sheet(f"Sheet{sheet + 1}")
+        worksheet.append(TALL_HEADER)
+        for index in range(rows_per_sheet):
+            worksheet.append(tall_row(rng, index))
+    workbook.save(path)
+
+def write_xlsx_tall(path: str, units: int):
+    write_workbook(path, units, sheets=1)
+
+def write_xlsx_sheets(path: str, units: int):
+    write_workbook(path, units, sheets=min(50, max(1, units)))
+
+class PdfWriter:
+    """
+    Minimal streaming PDF writer for pages of plain Helvetica text
+
+    pypdf cannot lay out text and holding a large document in memory to
+    write it would defeat the point, so objects are written as they are made
+    and the cross-reference table is written at the end.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4  # 1: catalog, 2: page tree, 3: font
+        self.file.write(b"%PDF-1.4\n")
+
+    def write_object(self, object_id: int, body: bytes):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def add_page(self, lines: list):
+        text = "".join(f"({line}) Tj T*\n" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 790 Td\n{text}ET".encode("latin-1") if lines else b""
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.write_object(content_id, f"<< /Length {len(stream)} >>\nstream\n".encode("ascii") + stream + b"\nendstream")
+        self.write_object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii"))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode("ascii"))
+        self.write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        xref_offset = self.file.tell()
+        count = self.next_id
+        self.file.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode("ascii"))
+        for object_id in range(1, count):
+            self.file.write(f"{self.offsets[object_id]:010d} 00000 n \n".encode("ascii"))
+        self.file.write(
+            f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+        )
+
+def write_pdf(path: str, units: int, text_every: int):
+    """Pages of 60 lines of text, except that only one page in `text_every` has any"""
+    rng = random.Random(0)
+    with open(path, "wb") as file:
+        writer = PdfWriter(file)
+        for page in range(units):
+            if page % text_every:
+                writer.add_page([])
+            else:
+                writer.add_page([" ".join(rng.choice(WORDS) for _ in range(10)) for _ in range(60)])
+        writer.close()
+
+def write_pdf_text(path: str, units: int):
+    write_pdf(path, units, text_every=1)
+
+def write_pdf_blank(path: str, units: int):
+    # Like a scan: most pages have no text layer
+    write_pdf(path, units, text_every=4)
+
+def nested_record(rng: random.Random, index: int) -> dict:
+    return {
+        "id": index,
+        "created": (datetime(2020, 1, 1) + timedelta(minutes=index)).isoformat(),
+        "user": {
+            "name": rng.choice(WORDS),
+            "address": {"city": rng.choice(CATEGORIES), "zip": f"{rng.randint(0, 99999):05d}"}
+        },
+        "tags": [rng.choice(WORDS) for _ in range(rng.randint(0, 4))],
+        "orders": [
+            {"sku": f"SKU-{rng.randint(0, 5000)}", "price": round(rng.uniform(1, 500), 2), "paid": rng.random() < 0.8}
+            for _ in range(rng.randint(1, 3))
+        ]
+    }
+
+def write_json_nested(path: str, units: int):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as file:
+        # Written record by record so large documents never exist in memory
+        file.write('{"exported": "2025-01-01", "records": [')
+        for index in range(units):
+            if index:
+                file.write(", ")
+            file.write(json.dumps(nested_record(rng, index)))
+        file.write("]}")
+
+def write_jsonl(path: str, units: int):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as file:
+        for index in range(units):
+            file.write(json.dumps(nested_record(rng, index)) + "\n")
+
+# Synthetic inputs: name -> (file extension, generator, extraction paths run on it)
+CASES = {
+    "csv_tall": ("csv", write_csv_tall, ["csv_in_memory", "csv_chunked"]),
+    "csv_wide": ("csv", write_csv_wide, ["csv_in_memory", "csv_chunked"]),
+    "xlsx_tall": ("xlsx", write_xlsx_tall, ["excel_pandas", "excel_streaming"]),
+    "xlsx_sheets": ("xlsx", write_xlsx_sheets, ["excel_pandas", "excel_streaming"]),
+    "pdf_text": ("pdf", write_pdf_text, ["pdf"]),
+    "pdf_blank": ("pdf", write_pdf_blank, ["pdf"]),
+    "json_nested": ("json", write_json_nested, ["json"]),
+    "jsonl": ("jsonl", write_jsonl, ["jsonl"])
+}
+
+def run_path(path_name: str, file_path: str) -> str:
+    """Run one extraction path on a file; imported lazily so the import cost is measured apart"""
+    from app.services import openai_service as service
+    if path_name == "csv_in_memory":
+        return service.extract_text_from_csv(file_path, streaming=False)
+    if path_name == "csv_chunked":
+        return service.extract_text_from_csv(file_path, streaming=True)
+    if path_name == "excel_pandas":
+        return service.extract_text_from_excel(file_path, streaming=False)
+    if path_name == "excel_streaming":
+        return service.extract_text_from_excel(file_path, streaming=True)
+    if path_name == "pdf":
+        return service.extract_text_from_pdf(file_path)
+    if path_name in ("json", "jsonl"):
+        header_lines, content = service.extract_text_from_json(file_path, path_name)
+        return "\n".join(header_lines + [content])
+    raise ValueError(f"Unknown extraction path {path_name}")
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure_one(path_name: str, file_path: str):
+    """Child process entry point: run one extraction and print its measurements as JSON"""
+    from app.services import openai_service
+    # The extraction libraries are imported lazily; load them before the baseline as a warmed-up worker has
+    openai_service.import_extraction_libraries()
+    baseline_rss = peak_rss_mb()
+    started = time.perf_counter()
+    content = run_path(path_name, file_path)
+    wall = time.perf_counter() - started
+    print(json.dumps({
+        "wall_s": wall,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+        "output_chars": len(content),
+        "failed": content.startswith("Error")
+    }))
+    # Skip interpreter teardown of a possibly huge heap and process pools
+    sys.stdout.flush()
+    os._exit(0)
+
+def units_for_size(case: str, target_bytes: int, data_dir: str) -> int:
+    """Rows, pages or records needed for a file of about target_bytes"""
+    extension, generate, _ = CASES[case]
+    sample_path = os.path.join(data_dir, f"{case}-calibration.{extension}")
+    if not os.path.exists(sample_path):
+        generate(sample_path, CALIBRATION_UNITS)
+    bytes_per_unit = os.path.getsize(sample_path) / CALIBRATION_UNITS
+    return max(1, round(target_bytes / bytes_per_unit))
+
+def input_file(case: str, size: str, data_dir: str) -> str:
+    """Path of the synthetic input for a case and size, generating it if needed"""
+    extension, generate, _ = CASES[case]
+    path = os.path.join(data_dir, f"{case}-{size}.{extension}")
+    if not os.path.exists(path):
+        units = units_for_size(case, parse_size(size), data_dir)
+        print(f"  generating {os.path.basename(path)} ({units} units)...", flush=True)
+        partial_path = path + ".partial"
+        generate(partial_path, units)
+        os.replace(partial_path, path)
+    return path
+
+def run_child(path_name: str, file_path: str, timeout: float) -> dict:
+    """Measure one extraction in a fresh interpreter"""
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", path_name, file_path],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout"}
+    if completed.returncode != 0:
+        return {"status": "crashed", "error": completed.stderr.strip().splitlines()[-1:] or [f"exit {completed.returncode}"]}
+    measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+    measurement["status"] = "failed" if measurement.pop("failed") else "ok"
+    return measurement
+
+def environment_info() -> dict:
+    """What the numbers depend on besides the code: versions, machine and commit"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    packages = {}
+    for package in ("pandas", "numpy", "pypdf", "openpyxl"):
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages
+    }
+
+def run_benchmarks(args) -> dict:
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for case in args.cases:
+        _, _, path_names = CASES[case]
+        for size in args.sizes:
+            file_path = input_file(case, size, args.data_dir)
+            for path_name in path_names:
+                runs = [run_child(path_name, file_path, args.timeout) for _ in range(args.repeat)]
+                ok_runs = [run for run in runs if run["status"] in ("ok", "failed")]
+                result = {
+                    "case": case,
+                    "size": size,
+                    "path": path_name,
+                    "input_bytes": os.path.getsize(file_path),
+                    "status": ok_runs[0]["status"] if len(ok_runs) == len(runs) else runs[-1]["status"]
+                }
+                if len(ok_runs) == len(runs):
+                    result.update({
+                        "wall_s": statistics.median(run["wall_s"] for run in ok_runs),
+                        "wall_s_runs": [run["wall_s"] for run in ok_runs],
+                        "peak_rss_mb": max(run["peak_rss_mb"] for run in ok_runs),
+                        "baseline_rss_mb": min(run["baseline_rss_mb"] for run in ok_runs),
+                        "output_chars": ok_runs[0]["output_chars"]
+                    })
+                elif "error" in runs[-1]:
+                    result["error"] = runs[-1]["error"]
+                results.append(result)
+                print(format_result(result), flush=True)
+    return {"environment": environment_info(), "repeat": args.repeat, "results": results}
+
+def format_result(result: dict) -> str:
+    label = f"{result['case']:12} {result['size']:>6} {result['path']:16}"
+    if "wall_s" not in result:
+        return f"{label} {result['status']}"
+    return (
+        f"{label} {result['wall_s']:>9.3f}s {result['peak_rss_mb']:>8.0f} MB "
+        f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.0f}) "
+        f"{result['output_chars']:>9} chars {'' if result['status'] == 'ok' else result['status']}"
+    )
+
+def compare(old_path: str, new_path: str, threshold: float, min_seconds: float) -> int:
+    """
+    Print the change in wall time and peak RSS between two result files
+
+    Wall time differences under `min_seconds` are treated as noise.
+
+    Returns:
+        1 if any extraction got slower or bigger than `threshold` times, else 0
+    """
+    with open(old_path, encoding="utf-8") as file:
+        old = json.load(file)
+    with open(new_path, encoding="utf-8") as file:
+        new = json.load(file)
+    old_results = {(r["case"], r["size"], r["path"]): r for r in old["results"]}
+
+    print(f"old: {old['environment'].get('commit')}  new: {new['environment'].get('commit')}")
+    print(f"{'case':12} {'size':>6} {'path':16} {'wall old':>10} {'wall new':>10} {'ratio':>7} {'rss old':>9} {'rss new':>9} {'ratio':>7}")
+    regressions = 0
+    for result in new["results"]:
+        key = (result["case"], result["size"], result["path"])
+        before = old_results.get(key)
+        label = f"{key[0]:12} {key[1]:>6} {key[2]:16}"
+        if before is None or "wall_s" not in before or "wall_s" not in result:
+            print(f"{label} {before['status'] if before else 'missing':>10} {result['status']:>10}")
+            continue
+        wall_ratio = result["wall_s"] / before["wall_s"] if before["wall_s"] else 1.0
+        rss_ratio = result["peak_rss_mb"] / before["peak_rss_mb"] if before["peak_rss_mb"] else 1.0
+        flag = ""
+        slower = wall_ratio > threshold and result["wall_s"] - before["wall_s"] > min_seconds
+        if slower or rss_ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{label} {before['wall_s']:>9.3f}s {result['wall_s']:>9.3f}s {wall_ratio:>6.2f}x "
+            f"{before['peak_rss_mb']:>6.0f} MB {result['peak_rss_mb']:>6.0f} MB {rss_ratio:>6.2f}x{flag}"
+        )
+    print(f"\n{regressions} regression(s) over {threshold}x")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1KB,1MB,10MB", help="Comma-separated input sizes, e.g. 1KB,1MB,100MB,1GB")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Comma-separated cases out of {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per extraction; wall time is the median")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a run is recorded as a timeout")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "report_agent_extractor_inputs"),
+                        help="Where generated inputs are kept between runs")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/extractors-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Ratio counted as a regression by --compare")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Wall time increase below which --compare ignores a ratio")
+    parser.add_argument("--measure", nargs=2, metavar=("PATH", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_one(*args.measure)
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold, args.min_seconds))
+
+    args.sizes = [size.strip().upper() for size in args.sizes.split(",") if size.strip()]
+    args.cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = [case for case in args.cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    report = run_benchmarks(args)
+    output = args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"extractors-{report['environment']['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nWrote {output}")
+
+if __name__ == "__main__":
+    main()
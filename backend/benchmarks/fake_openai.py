@@ -0,0 +1,194 @@
+"""
+Local stand-in for the OpenAI chat completions API
+
+Answers POST /v1/chat/completions, streamed or not, with generated text
+after a configurable delay. A configurable share of requests fail with a
+500, a 429 rate limit, or a stream that breaks off midway, so retries,
+fallbacks and concurrency limits can be exercised without calling the real
+API. GET /stats returns request counts and the peak number in flight.
+
+Point the backend at it with OPENAI_BASE_URL (any OPENAI_API_KEY works):
+    OPENAI_BASE_URL=http://127.0.0.1:8911/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+
+Usage (from the backend directory):
+    python benchmarks/fake_openai.py [--port 8911] [--latency 0.5] [--tokens-per-second 50] [--error-rate 0.01]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the revenue report shows steady growth in the third quarter while costs remained flat "
+    "and the largest region contributed most of the increase compared to last year"
+).split()
+
+class FakeSettings:
+    """Behaviour of the fake API; replaced from the command line"""
+    latency = 0.5  # Seconds before the first token
+    jitter = 0.2  # Up to this many seconds are added to the latency at random
+    tokens_per_second = 50.0  # Generation speed once the first token is out
+    response_tokens = 150  # Tokens per answer unless max_tokens is lower
+    error_rate = 0.0  # Share of requests answered with a 500
+    rate_limit_rate = 0.0  # Share of requests answered with a 429
+    stream_abort_rate = 0.0  # Share of streamed responses cut off halfway
+    seed = 0
+
+settings = FakeSettings()
+rng = random.Random(settings.seed)
+stats = Counter()
+in_flight = 0
+
+app = FastAPI(title="Fake OpenAI API")
+
+def error_response(status_code: int, message: str, error_type: str, headers=None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers
+    )
+
+def answer_tokens(max_tokens) -> list:
+    count = settings.response_tokens if not max_tokens else min(settings.response_tokens, max_tokens)
+    return [rng.choice(WORDS) + " " for _ in range(max(1, count))]
+
+def usage(body: dict, completion_tokens: int) -> dict:
+    # Roughly four characters per token, like English text
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+                                       for model in ("gpt-4o", "gpt-4.1-mini", "gpt-3.5-turbo", "gpt-4")]}
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "in_flight": in_flight}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    global in_flight
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    stream = bool(body.get("stream"))
+    stats["requests"] += 1
+    stats["streamed" if stream else "unstreamed"] += 1
+
+    roll = rng.random()
+    if roll < settings.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return error_response(429, "Rate limit reached (fake)", "rate_limit_exceeded", {"Retry-After": "1"})
+    if roll < settings.rate_limit_rate + settings.error_rate:
+        stats["errors"] += 1
+        return error_response(500, "The server had an error (fake)", "server_error")
+
+    tokens = answer_tokens(body.get("max_tokens"))
+    abort_at = len(tokens) // 2 if stream and rng.random() < settings.stream_abort_rate else None
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    first_token_delay = settings.latency + rng.uniform(0, settings.jitter)
+    token_delay = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+
+    in_flight += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], in_flight)
+
+    if not stream:
+        try:
+            await asyncio.sleep(first_token_delay + token_delay * len(tokens))
+        finally:
+            in_flight -= 1
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                "finish_reason": "stop"
+            }],
+            "usage": usage(body, len(tokens))
+        }
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    def usage_chunk() -> str:
+        # Sent last, with no choices, when the client asks for stream_options.include_usage
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [],
+            "usage": usage(body, len(tokens))
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        global in_flight
+        try:
+            await asyncio.sleep(first_token_delay)
+            yield chunk({"role": "assistant", "content": ""})
+            for index, token in enumerate(tokens):
+                if index == abort_at:
+                    stats["aborted_streams"] += 1
+                    raise ConnectionAbortedError("Stream cut off (fake)")
+                yield chunk({"content": token})
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield usage_chunk()
+            yield "data: [DONE]\n\n"
+        finally:
+            in_flight -= 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="Seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=settings.jitter, help="Random extra seconds of latency, up to this")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second,
+                        help="Generation speed after the first token (0 for no delay)")
+    parser.add_argument("--response-tokens", type=int, default=settings.response_tokens, help="Tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="Share of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate,
+                        help="Share of requests failing with 429")
+    parser.add_argument("--stream-abort-rate", type=float, default=settings.stream_abort_rate,
+                        help="Share of streams cut off halfway")
+    parser.add_argument("--seed", type=int, default=settings.seed)
+    args = parser.parse_args()
+
+    for name in ("latency", "jitter", "tokens_per_second", "response_tokens",
+                 "error_rate", "rate_limit_rate", "stream_abort_rate", "seed"):
+        setattr(settings, name, getattr(args, name))
+    rng.seed(settings.seed)
+
+    import uvicorn
+    print(f"Fake OpenAI API on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
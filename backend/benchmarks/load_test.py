@@ -0,0 +1,421 @@
+"""
+Load test of the chat flow with simulated users
+
+Each simulated user replays what the frontend does in a session:
+1. create the session;
+2. sometimes upload a CSV and poll it until extraction is done;
+3. send a few messages, pausing to think in between;
+4. long-poll for each assistant response, like the chat view;
+5. refresh the session list along the way and delete its files at the end.
+
+Latency is recorded per endpoint. The time from sending a message until
+its assistant response is complete, and until its first streamed text,
+is recorded as well. The report shows throughput, p50/p90/p99 latency and
+errors per endpoint, with optional histograms. It also shows the event
+loop lag measured inside the backend, so blocking calls on the loop show
+up as lag under load.
+
+By default the script starts its own backend (on a throwaway SQLite
+database) and benchmarks/fake_openai.py, so no real API is called; the fake
+API's latency and error options are passed through. --target runs against
+a backend that is already running; event loop lag is only available from a
+backend started by this script.
+
+Usage (from the backend directory):
+    python benchmarks/load_test.py [--users 20] [--duration 60] [--histograms] [--output results.json]
+    python benchmarks/load_test.py --fake-latency 2 --fake-error-rate 0.05 --users 50
+    python benchmarks/load_test.py --target http://127.0.0.1:8000
+"""
+import os
+import sys
+import argparse
+import asyncio
+import bisect
+import io
+import json
+import random
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000]
+
+# Route the backend started by this script exposes for the event loop lag
+LOOP_LAG_PATH = "/_loadtest/loop-lag"
+
+# Placeholder content of an assistant message before any text has streamed in
+THINKING_CONTENT = "I'm analyzing your request..."
+
+# Prefix of the assistant message stored when a response fails
+RESPONSE_ERROR_PREFIX = "Sorry, an error occurred"
+
+QUESTIONS = [
+    "Summarize the main trends in this data",
+    "Which category grew the most?",
+    "Are there any outliers I should look at?",
+    "Compare the first and last month",
+    "What would you put in an executive summary?",
+    "Explain the difference between revenue and profit here"
+]
+
+class Histogram:
+    """Latency samples of one endpoint, kept whole for exact percentiles and bucketed for display"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.errors = Counter()
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "count": len(self.samples),
+            "errors": sum(self.errors.values()),
+            "error_kinds": dict(self.errors),
+            "per_second": len(self.samples) / elapsed if elapsed else 0.0,
+            "mean_ms": statistics.fmean(self.samples) * 1000 if self.samples else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p90_ms": self.percentile(0.9) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": max(self.samples, default=0.0) * 1000,
+            "buckets": {
+                (f"<={bound}ms" if index < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}ms"): count
+                for index, (bound, count) in enumerate(zip(BUCKETS_MS + [None], self.buckets))
+            }
+        }
+
+class LoadTest:
+    """Simulated users sharing one HTTP client and one set of histograms"""
+
+    def __init__(self, args, base_url: str):
+        self.args = args
+        self.api = base_url.rstrip("/") + "/api"
+        self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+        self.deadline = 0.0
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Send a request and record its latency under `name`; returns None when it failed"""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, self.api + url, **kwargs)
+        except httpx.HTTPError as e:
+            self.histograms[name].errors[type(e).__name__] += 1
+            return None
+        self.histograms[name].record(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.histograms[name].errors[str(response.status_code)] += 1
+            return None
+        return response
+
+    async def think(self, rng: random.Random):
+        await asyncio.sleep(min(rng.expovariate(1 / self.args.think_time), self.args.think_time * 5) if self.args.think_time else 0)
+
+    async def upload(self, client: httpx.AsyncClient, rng: random.Random) -> Optional[dict]:
+        """Upload a small CSV and poll until it has been extracted"""
+        rows = rng.randint(50, 2000)
+        data = io.StringIO()
+        data.write("date,category,amount,quantity\n")
+        for index in range(rows):
+            data.write(f"2025-{index % 12 + 1:02d}-01,cat{rng.randint(1, 8)},{rng.uniform(0, 5000):.2f},{rng.randint(1, 90)}\n")
+        response = await self.request(
+            client, "POST /api/files/upload", "POST", "/files/upload",
+            files={"file": (f"report_{rng.randint(0, 10 ** 9)}.csv", data.getvalue().encode("utf-8"), "text/csv")}
+        )
+        if response is None:
+            return None
+        attachment = response.json()
+        while attachment.get("status") in ("queued", "processing") and time.perf_counter() < self.deadline + self.args.response_timeout:
+            await asyncio.sleep(0.5)
+            response = await self.request(client, "GET /api/files/{id}", "GET", f"/files/{attachment['id']}")
+            if response is None:
+                return None
+            attachment = response.json()
+        return attachment
+
+    async def wait_for_response(self, client: httpx.AsyncClient, session_id: str, cursor: int, sent_at: float) -> int:
+        """Long-poll until the assistant response to a message is complete; returns the new cursor"""
+        first_text_at = None
+        response_deadline = sent_at + self.args.response_timeout
+        while time.perf_counter() < response_deadline:
+            response = await self.request(
+                client, "GET /api/messages/{id}/since", "GET", f"/messages/{session_id}/since",
+                params={"cursor": cursor, "wait": self.args.poll_wait}
+            )
+            if response is None:
+                await asyncio.sleep(1)
+                continue
+            changes = response.json()
+            cursor = changes["cursor"]
+            for message in changes["messages"]:
+                if message["role"] != "assistant":
+                    continue
+                if first_text_at is None and message["isStreaming"] and message["content"] != THINKING_CONTENT:
+                    first_text_at = time.perf_counter()
+                    self.histograms["assistant first text"].record(first_text_at - sent_at)
+                if not message["isStreaming"]:
+                    done = self.histograms["assistant response (end to end)"]
+                    if message["content"].startswith(RESPONSE_ERROR_PREFIX):
+                        done.errors["failed"] += 1
+                    else:
+                        done.record(time.perf_counter() - sent_at)
+                    return cursor
+        self.histograms["assistant response (end to end)"].errors["timeout"] += 1
+        return cursor
+
+    async def user(self, index: int, client: httpx.AsyncClient):
+        """One simulated user: sessions one after another until the test ends"""
+        rng = random.Random(index)
+        await asyncio.sleep(self.args.ramp_up * index / max(self.args.users, 1))
+        while time.perf_counter() < self.deadline:
+            response = await self.request(client, "POST /api/sessions", "POST", "/sessions/", json={"title": f"Load test {index}"})
+            if response is None:
+                await asyncio.sleep(1)
+                continue
+            session_id = response.json()["id"]
+            await self.request(client, "GET /api/sessions/page", "GET", "/sessions/page", params={"limit": 50})
+
+            attachments = []
+            if rng.random() < self.args.upload_share:
+                attachment = await self.upload(client, rng)
+                if attachment is not None:
+                    attachments.append(attachment)
+
+            cursor = 0
+            for turn in range(self.args.messages_per_session):
+                if time.perf_counter() >= self.deadline:
+                    break
+                await self.think(rng)
+                body = {"content": rng.choice(QUESTIONS)}
+                if turn == 0 and attachments:
+                    body["attachments"] = attachments
+                sent_at = time.perf_counter()
+                response = await self.request(client, "POST /api/messages/{id}", "POST", f"/messages/{session_id}", json=body)
+                if response is None:
+                    continue
+                cursor = await self.wait_for_response(client, session_id, cursor, sent_at)
+                if rng.random() < 0.3:
+                    # Switching back to the session reloads its messages and the list
+                    await self.request(client, "GET /api/messages/{id}", "GET", f"/messages/{session_id}")
+                    await self.request(client, "GET /api/sessions/page", "GET", "/sessions/page", params={"limit": 50})
+
+            for attachment in attachments:
+                await self.request(client, "DELETE /api/files/{id}", "DELETE", f"/files/{attachment['id']}")
+
+    async def run(self) -> float:
+        limits = httpx.Limits(max_connections=self.args.users * 2 + 10, max_keepalive_connections=self.args.users * 2 + 10)
+        timeout = httpx.Timeout(self.args.poll_wait + 30)
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            started = time.perf_counter()
+            self.deadline = started + self.args.duration
+            await asyncio.gather(*(self.user(index, client) for index in range(self.args.users)))
+            return time.perf_counter() - started
+
+def serve(port: int, lag_interval: float):
+    """Run the backend with an event loop lag probe; started as a child process by the load test"""
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+    from app.main import app
+
+    lags: List[float] = []
+
+    async def probe():
+        # Sleeping for a fixed interval overshoots by however long the loop was busy elsewhere
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(lag_interval)
+            lags.append(max(0.0, time.perf_counter() - started - lag_interval))
+
+    async def start_probe():
+        app.state.lag_probe = asyncio.create_task(probe())
+
+    async def loop_lag(reset: bool = False):
+        histogram = Histogram()
+        for lag in lags:
+            histogram.record(lag)
+        summary = histogram.summary(0)
+        summary.pop("per_second")
+        summary["interval_ms"] = lag_interval * 1000
+        if reset:
+            lags.clear()
+        return summary
+
+    app.router.on_startup.append(start_probe)
+    app.add_api_route(LOOP_LAG_PATH, loop_lag, methods=["GET"], include_in_schema=False)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+def start_servers(args, log_dir: str):
+    """Start the fake OpenAI API and a backend pointed at it; returns the processes and URLs"""
+    fake_port, backend_port = free_port(), free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    fake_log = open(os.path.join(log_dir, "fake_openai.log"), "w")
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS_DIR, "fake_openai.py"), "--port", str(fake_port),
+        "--latency", str(args.fake_latency), "--jitter", str(args.fake_jitter),
+        "--tokens-per-second", str(args.fake_tokens_per_second), "--response-tokens", str(args.fake_response_tokens),
+        "--error-rate", str(args.fake_error_rate), "--rate-limit-rate", str(args.fake_rate_limit_rate),
+        "--stream-abort-rate", str(args.fake_stream_abort_rate)
+    ], cwd=BACKEND_DIR, stdout=fake_log, stderr=subprocess.STDOUT)
+    wait_until_up(f"{fake_url}/stats", fake)
+
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(log_dir, 'load_test.db')}"
+    }
+    backend_log = open(os.path.join(log_dir, "backend.log"), "w")
+    backend = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(backend_port), "--lag-interval", str(args.lag_interval)],
+        cwd=BACKEND_DIR, env=env, stdout=backend_log, stderr=subprocess.STDOUT
+    )
+    try:
+        # Readiness includes the warm-up, so the first simulated users do not measure it
+        wait_until_up(f"{backend_url}/health/ready", backend)
+    except RuntimeError:
+        fake.terminate()
+        raise
+    return [backend, fake], backend_url, fake_url
+
+def format_row(name: str, summary: dict) -> str:
+    return (
+        f"{name:36}{summary['count']:>7}{summary['errors']:>7}{summary.get('per_second', 0):>8.2f}"
+        f"{summary['p50_ms']:>10.1f}{summary['p90_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['max_ms']:>10.1f}"
+    )
+
+def print_histogram(name: str, summary: dict):
+    print(f"\n{name}")
+    largest = max(summary["buckets"].values(), default=0) or 1
+    for label, count in summary["buckets"].items():
+        if count:
+            print(f"  {label:>10} {count:>7} {'#' * max(1, round(40 * count / largest))}")
+
+def report(args, endpoints: Dict[str, dict], loop_lag: Optional[dict], fake_stats: Optional[dict], elapsed: float):
+    print(f"\n{args.users} users for {elapsed:.1f}s\n")
+    print(f"{'endpoint':36}{'count':>7}{'errors':>7}{'per s':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, summary in endpoints.items():
+        print(format_row(name, summary))
+    for name, summary in endpoints.items():
+        if summary["error_kinds"]:
+            print(f"  {name} errors: {summary['error_kinds']}")
+    if loop_lag is not None:
+        print(f"\nEvent loop lag ({loop_lag['count']} probes every {loop_lag['interval_ms']:.0f} ms): "
+              f"p50 {loop_lag['p50_ms']:.1f} ms, p99 {loop_lag['p99_ms']:.1f} ms, max {loop_lag['max_ms']:.1f} ms")
+    if fake_stats is not None:
+        print(f"Fake OpenAI API: {fake_stats}")
+    if args.histograms:
+        for name, summary in endpoints.items():
+            print_histogram(name, summary)
+        if loop_lag is not None:
+            print_histogram("event loop lag", loop_lag)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Simulated concurrent users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds users keep starting new steps")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=2, help="Mean seconds a user pauses before each message")
+    parser.add_argument("--messages-per-session", type=int, default=3)
+    parser.add_argument("--upload-share", type=float, default=0.3, help="Share of sessions that start with a CSV upload")
+    parser.add_argument("--poll-wait", type=float, default=25, help="Long-poll wait in seconds, as the frontend uses")
+    parser.add_argument("--response-timeout", type=float, default=120, help="Seconds before a response counts as timed out")
+    parser.add_argument("--target", help="URL of a running backend instead of starting one")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="Seconds between event loop lag probes")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="Fake API seconds before the first token")
+    parser.add_argument("--fake-jitter", type=float, default=0.2)
+    parser.add_argument("--fake-tokens-per-second", type=float, default=50)
+    parser.add_argument("--fake-response-tokens", type=int, default=150)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--fake-stream-abort-rate", type=float, default=0.0)
+    parser.add_argument("--histograms", action="store_true", help="Print a latency histogram per endpoint")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.lag_interval)
+        return
+
+    processes = []
+    fake_url = None
+    log_dir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        if args.target:
+            base_url = args.target
+        else:
+            processes, base_url, fake_url = start_servers(args, log_dir)
+            print(f"Backend on {base_url}, fake OpenAI API on {fake_url} (logs in {log_dir})")
+
+        test = LoadTest(args, base_url)
+        print(f"Running {args.users} users for {args.duration:.0f}s...")
+        elapsed = asyncio.run(test.run())
+
+        endpoints = {name: histogram.summary(elapsed) for name, histogram in sorted(test.histograms.items())}
+        loop_lag = fake_stats = None
+        try:
+            response = httpx.get(base_url.rstrip("/") + LOOP_LAG_PATH, timeout=10)
+            if response.status_code == 200:
+                loop_lag = response.json()
+        except httpx.HTTPError:
+            pass
+        if fake_url:
+            fake_stats = httpx.get(f"{fake_url}/stats", timeout=10).json()
+
+        report(args, endpoints, loop_lag, fake_stats, elapsed)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump({
+                    "settings": {key: value for key, value in vars(args).items() if key not in ("serve", "output")},
+                    "elapsed_s": elapsed,
+                    "endpoints": endpoints,
+                    "loop_lag": loop_lag,
+                    "fake_openai": fake_stats
+                }, file, indent=2)
+            print(f"\nWrote {args.output}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == "__main__":
+    main()
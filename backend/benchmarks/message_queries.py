@@ -0,0 +1,200 @@
+"""
+Message query benchmark before and after the message indexes
+
+Seeds a throwaway SQLite database at the schema before the indexes (revision
+0001a) with a large number of messages, times the hot message queries,
+applies the remaining migrations and times them again. Text search is timed
+as a LIKE scan before the migrations and through the full-text index after
+them.
+
+Usage (from the backend directory):
+    python benchmarks/message_queries.py [--messages 300000] [--sessions 3000] [--runs 50]
+"""
+import os
+import sys
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--messages", type=int, default=300000, help="Messages to seed")
+parser.add_argument("--sessions", type=int, default=3000, help="Sessions the messages are spread over")
+parser.add_argument("--runs", type=int, default=50, help="Timed runs per query")
+args = parser.parse_args()
+
+# Configure the app before it is imported: throwaway database
+_tmp_dir = tempfile.mkdtemp(prefix="message_queries_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import MetaData, Table, func, insert, text
+from sqlalchemy.orm import selectinload
+
+from app.models.database import Message as MessageModel, message_attachment
+from app.utils.database import SessionLocal, engine, run_migrations
+from app.services.search import SEARCH_QUERY, build_match_query
+
+# Words message contents are made of: common words in about 1 of 150 messages,
+# rare words in about 1 of 10000
+VOCABULARY = [f"word{index}" for index in range(2000)]
+RARE_WORDS = [f"rare{index}" for index in range(100)]
+
+# Last revision before the message indexes
+UNINDEXED_REVISION = "0001a"
+
+def seed(message_count: int, session_count: int):
+    """Insert sessions, messages and one attachment per ten messages in bulk"""
+    # Insert through the tables as they exist before the indexes, not the current models
+    metadata = MetaData()
+    sessions, messages, file_attachments, links_table = (
+        Table(name, metadata, autoload_with=engine)
+        for name in ("sessions", "messages", "file_attachments", "message_attachment")
+    )
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    session_ids = [str(uuid.uuid4()) for _ in range(session_count)]
+    versions = dict.fromkeys(session_ids, 0)
+    with engine.begin() as connection:
+        connection.execute(insert(sessions), [
+            {"id": session_id, "title": "Seeded", "timestamp": start, "fileCount": 0, "isFavorite": False}
+            for session_id in session_ids
+        ])
+        batch, links, files = [], [], []
+        for index in range(message_count):
+            session_id = rng.choice(session_ids)
+            versions[session_id] += 1
+            message_id = str(uuid.uuid4())
+            batch.append({
+                "id": message_id, "role": "user" if index % 2 else "assistant", "content": " ".join(
+                    [rng.choice(VOCABULARY) for _ in range(12)]
+                    + ([rng.choice(RARE_WORDS)] if rng.random() < 0.01 else [])
+                ),
+                "timestamp": start + timedelta(seconds=index), "status": "sent",
+                "session_id": session_id, "version": versions[session_id]
+            })
+            if index % 10 == 0:
+                file_id = str(uuid.uuid4())
+                files.append({"id": file_id, "name": f"file{index}.csv", "size": 1, "type": "text/csv"})
+                links.append({"message_id": message_id, "attachment_id": file_id})
+            if len(batch) >= 10000:
+                connection.execute(insert(messages), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(messages), batch)
+        connection.execute(insert(file_attachments), files)
+        connection.execute(insert(links_table), links)
+    return session_ids, [link["attachment_id"] for link in links]
+
+def build_queries(session_ids, attachment_ids, indexed: bool):
+    """The message queries the endpoints run, each taking a random session, attachment or word"""
+    rng = random.Random(1)
+
+    def history(db):
+        # Conversation history fetched for every assistant response
+        db.query(MessageModel).filter(
+            MessageModel.session_id == rng.choice(session_ids),
+            MessageModel.id != "thinking"
+        ).order_by(MessageModel.timestamp.desc()).limit(10).all()
+
+    def since(db):
+        # Long-poll change feed
+        db.query(MessageModel).filter(
+            MessageModel.session_id == rng.choice(session_ids),
+            MessageModel.version > 50
+        ).order_by(MessageModel.version).all()
+
+    def next_version(db):
+        # MAX(version) per session, which gave message versions before the per-session counter
+        db.query(func.max(MessageModel.version)).filter(MessageModel.session_id == rng.choice(session_ids)).scalar()
+
+    def session_messages(db):
+        # GET /api/messages/{session_id} with attachments eager-loaded
+        db.query(MessageModel).options(selectinload(MessageModel.attachments)).filter(
+            MessageModel.session_id == rng.choice(session_ids)
+        ).all()
+
+    def attachment_messages(db):
+        # Messages referring to a file
+        db.query(message_attachment.c.message_id).filter(
+            message_attachment.c.attachment_id == rng.choice(attachment_ids)
+        ).all()
+
+    def text_search(db, words):
+        word = rng.choice(words)
+        if indexed:
+            # GET /api/search
+            db.execute(SEARCH_QUERY, {
+                "match": build_match_query(word), "kind": None, "session_id": None, "limit": 21, "offset": 0,
+                "snippet_start": "**", "snippet_end": "**", "ellipsis": "...", "snippet_tokens": 16
+            }).all()
+        else:
+            # The best available without an index: scan every message
+            db.query(MessageModel.id).filter(MessageModel.content.like(f"%{word}%")).limit(21).all()
+
+    return {
+        "text search, rare word": lambda db: text_search(db, RARE_WORDS),
+        "text search, common word": lambda db: text_search(db, VOCABULARY),
+        "history (last 10)": history,
+        "since (version cursor)": since,
+        "next message version": next_version,
+        "session messages + attachments": session_messages,
+        "messages of an attachment": attachment_messages
+    }
+
+def time_queries(queries, runs: int):
+    """Median milliseconds per query over `runs` runs"""
+    results = {}
+    db = SessionLocal()
+    try:
+        for name, query in queries.items():
+            query(db)  # Warm up the page cache
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                query(db)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.expunge_all()
+            results[name] = statistics.median(timings)
+    finally:
+        db.close()
+    return results
+
+def query_plan(session_id: str) -> str:
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE session_id = :sid ORDER BY timestamp DESC LIMIT 10"
+        ), {"sid": session_id}).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+def main():
+    run_migrations(UNINDEXED_REVISION)
+    print(f"Seeding {args.messages} messages over {args.sessions} sessions...")
+    started = time.perf_counter()
+    session_ids, attachment_ids = seed(args.messages, args.sessions)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    queries = build_queries(session_ids, attachment_ids, indexed=False)
+    before = time_queries(queries, args.runs)
+    plan_before = query_plan(session_ids[0])
+
+    started = time.perf_counter()
+    run_migrations()
+    print(f"Applied index migrations in {time.perf_counter() - started:.1f}s")
+    queries = build_queries(session_ids, attachment_ids, indexed=True)
+    after = time_queries(queries, args.runs)
+    plan_after = query_plan(session_ids[0])
+
+    print()
+    print(f"{'query (median ms)':34}{'before':>10}{'indexed':>10}{'speedup':>10}")
+    for name in queries:
+        print(f"{name:34}{before[name]:>10.2f}{after[name]:>10.2f}{before[name] / after[name]:>9.1f}x")
+    print()
+    print(f"History plan before indexes: {plan_before}")
+    print(f"History plan indexed:        {plan_after}")
+
+if __name__ == "__main__":
+    main()
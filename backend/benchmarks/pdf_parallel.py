@@ -0,0 +1,120 @@
+"""
+Large PDF extraction across the extraction worker pool
+
+Generates a text PDF with --pages pages and extracts it through the same
+path the app uses (extract_on_pool), first with one extraction worker and
+then with --workers workers. Records the wall time of each run, the number
+of page-range tasks and the number of distinct worker processes that ran
+them, and checks that the merged content matches a plain in-process
+extraction page for page. The extraction cache is not used.
+
+Exits with status 1 when the multi-worker run used fewer than two worker
+processes or its content differs, so it can be run to check that one large
+PDF is really spread over several cores.
+
+Usage (from the backend directory):
+    python benchmarks/pdf_parallel.py [--pages 400] [--workers 4] [--repeat 3] [--output FILE]
+"""
+import os
+import sys
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def traced_page_range(file_path: str, page_indexes):
+    """Run extract_page_range in a worker and report which process ran it"""
+    from app.services.pdf_pages import extract_page_range
+    return os.getpid(), extract_page_range(file_path, page_indexes)
+
+async def run_extraction(file_path: str, workers: int, repeat: int) -> dict:
+    """Extract the PDF with a pool of `workers` processes and collect the timings and worker PIDs"""
+    from app.services import extraction_pool, openai_service
+
+    extraction_pool.shutdown_executor()
+    extraction_pool.EXTRACTION_WORKERS = workers
+
+    pids = set()
+    tasks = 0
+    run_in_pool = openai_service.run_in_pool
+
+    async def traced_run_in_pool(func, *args, **kwargs):
+        nonlocal tasks
+        if func is not openai_service.extract_page_range:
+            return await run_in_pool(func, *args, **kwargs)
+        tasks += 1
+        pid, result = await run_in_pool(traced_page_range, *args, **kwargs)
+        pids.add(pid)
+        return result
+
+    openai_service.run_in_pool = traced_run_in_pool
+    try:
+        # Start every worker so process start-up is not timed
+        await asyncio.gather(*(run_in_pool(os.getpid) for _ in range(workers * 2)))
+
+        timings = []
+        content = None
+        for _ in range(repeat):
+            pids.clear()
+            tasks = 0
+            started = time.perf_counter()
+            content = await openai_service.extract_on_pool(openai_service.extract_file_content, file_path, use_cache=False)
+            timings.append(time.perf_counter() - started)
+    finally:
+        openai_service.run_in_pool = run_in_pool
+        extraction_pool.shutdown_executor()
+
+    return {
+        "workers": workers,
+        "seconds": round(statistics.median(timings), 3),
+        "tasks": tasks,
+        "worker_processes": len(pids),
+        "content": content
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400, help="Pages in the generated PDF")
+    parser.add_argument("--workers", type=int, default=4, help="Extraction workers for the parallel run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per worker count; wall time is the median")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    from extractors import write_pdf_text
+    from app.services import openai_service
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "large.pdf")
+        write_pdf_text(file_path, args.pages)
+
+        expected = openai_service.extract_text_from_pdf(file_path)
+        results = [asyncio.run(run_extraction(file_path, workers, args.repeat)) for workers in (1, args.workers)]
+
+    failed = False
+    for result in results:
+        content = result.pop("content")
+        result["matches_serial"] = content.endswith("\n\n" + expected)
+        print(f"{result['workers']} worker(s): {result['seconds']:.3f}s, {result['tasks']} page-range tasks "
+              f"on {result['worker_processes']} process(es), content matches: {result['matches_serial']}")
+        failed = failed or not result["matches_serial"]
+
+    serial, parallel = results
+    print(f"Speed-up with {args.workers} workers: {serial['seconds'] / parallel['seconds']:.2f}x")
+    if parallel["worker_processes"] < 2:
+        print(f"FAIL: the {args.pages}-page PDF was extracted on {parallel['worker_processes']} worker process(es)")
+        failed = True
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"pages": args.pages, "results": results}, file, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Startup cost: import time of the app and time until its health checks pass
+
+Imports app.main in fresh interpreters with -X importtime and reports the
+median wall time, the packages that take the longest to import, and whether
+any library that is meant to load lazily (pandas, numpy, pypdf, openpyxl,
+openai, httpx, tiktoken) was imported anyway. One untimed import runs first
+so bytecode compilation is not counted. With --server it also starts uvicorn
+on a temporary database and measures how long /health/live and
+/health/ready take to answer 200; readiness includes the background warm-up.
+
+Exits with status 1 when a lazy library is imported eagerly or the median
+import time is over --budget seconds, so it can be run before and after a
+change to catch startup regressions.
+
+Usage (from the backend directory):
+    python benchmarks/startup.py [--repeat 5] [--top 15] [--budget 1.5] [--server] [--output FILE]
+"""
+import os
+import sys
+import argparse
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries the app imports on first use or during warm-up, never at import time
+LAZY_MODULES = ["pandas", "numpy", "pypdf", "openpyxl", "openai", "httpx", "tiktoken"]
+
+# Run in the child interpreter; prints the import time and the top-level modules loaded
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "modules": sorted({{name.split(".")[0] for name in sys.modules}})}}))
+"""
+
+def parse_importtime(stderr: str) -> dict:
+    """Milliseconds spent importing each top-level package, from its modules' own (self) times"""
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        # Skips the header line ("self [us] | cumulative | imported package")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        packages[fields[2].strip().split(".")[0]] += int(fields[0]) / 1000
+    return dict(packages)
+
+def import_once(module: str, env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300
+    )
+    if completed.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{completed.stderr[-3000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["packages_ms"] = parse_importtime(completed.stderr)
+    return result
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def http_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+def measure_server(env: dict, timeout: float) -> dict:
+    """Start uvicorn and time how long until the liveness and readiness checks pass"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as data_dir:
+        server_env = {**env, "DATABASE_URL": f"sqlite:///{os.path.join(data_dir, 'startup.db')}"}
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        live = ready = None
+        try:
+            while ready is None and time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    sys.exit(f"The server exited during startup:\n{process.stderr.read()[-3000:]}")
+                if live is None and http_status(f"{base_url}/health/live") == 200:
+                    live = time.perf_counter() - started
+                if live is not None and http_status(f"{base_url}/health/ready") == 200:
+                    ready = time.perf_counter() - started
+                time.sleep(0.02)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {"live_s": live, "ready_s": ready, "timeout_s": timeout}
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed imports; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by import time")
+    parser.add_argument("--budget", type=float, help="Fail when the median import takes longer (seconds)")
+    parser.add_argument("--server", action="store_true", help="Also time a server start until live and ready")
+    parser.add_argument("--server-timeout", type=float, default=120, help="Seconds to wait for readiness")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+    import_once(args.module, env)  # Compiles bytecode; not counted
+    runs = [import_once(args.module, env) for _ in range(args.repeat)]
+    seconds = [run["seconds"] for run in runs]
+    median = statistics.median(seconds)
+    packages = {
+        package: statistics.median(run["packages_ms"].get(package, 0.0) for run in runs)
+        for package in runs[0]["packages_ms"]
+    }
+    eager = [module for module in LAZY_MODULES if module in runs[-1]["modules"]]
+
+    print(f"import {args.module}: median {median * 1000:.0f} ms "
+          f"(min {min(seconds) * 1000:.0f} ms, max {max(seconds) * 1000:.0f} ms, {args.repeat} runs)")
+    print(f"\n{'package':<30} {'ms':>8}")
+    for package, ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<30} {ms:8.1f}")
+    print(f"\nLazy libraries imported eagerly: {', '.join(eager) if eager else 'none'}")
+
+    server = None
+    if args.server:
+        server = measure_server(env, args.server_timeout)
+        live = f"{server['live_s']:.2f} s" if server["live_s"] is not None else "not live"
+        ready = f"{server['ready_s']:.2f} s" if server["ready_s"] is not None else f"not ready after {args.server_timeout:g} s"
+        print(f"\nServer: live after {live}, ready after {ready}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "environment": environment_info(),
+                "module": args.module,
+                "import_seconds": seconds,
+                "median_seconds": median,
+                "packages_ms": packages,
+                "eager_lazy_modules": eager,
+                "server": server
+            }, file, indent=2)
+        print(f"\nWrote {args.output}")
+
+    failed = bool(eager)
+    if args.budget is not None and median > args.budget:
+        print(f"\nMedian import time {median:.2f} s is over the budget of {args.budget:g} s")
+        failed = True
+    if server is not None and server["ready_s"] is None:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Baseline schema
+
+Tables as they were created by Base.metadata.create_all in the original
+application (sessions, messages, file attachments and their association).
+Existing databases without migration history are stamped with this
+revision instead of running it; 0001a then adds what later versions
+created with create_all.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "sessions",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.Column("fileCount", sa.Integer(), nullable=True),
+        sa.Column("isFavorite", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_sessions_id", "sessions", ["id"])
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("isStreaming", sa.Boolean(), nullable=True),
+        sa.Column("analysis_type", sa.String(), nullable=True),
+        sa.Column("session_id", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["session_id"], ["sessions.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+
+    op.create_table(
+        "file_attachments",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("uploadProgress", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_file_attachments_id", "file_attachments", ["id"])
+
+    op.create_table(
+        "message_attachment",
+        sa.Column("message_id", sa.String(), nullable=True),
+        sa.Column("attachment_id", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"]),
+        sa.ForeignKeyConstraint(["attachment_id"], ["file_attachments.id"])
+    )
+
+def downgrade():
+    op.drop_table("message_attachment")
+    op.drop_index("ix_file_attachments_id", table_name="file_attachments")
+    op.drop_table("file_attachments")
+    op.drop_index("ix_messages_id", table_name="messages")
+    op.drop_table("messages")
+    op.drop_index("ix_sessions_id", table_name="sessions")
+    op.drop_table("sessions")
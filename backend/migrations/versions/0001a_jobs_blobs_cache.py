@@ -0,0 +1,110 @@
+"""Jobs, content-addressed file blobs, the LLM response cache and message versions
+
+Adds what later versions of the application created with create_all on top
+of the baseline: the jobs, file_blobs and llm_responses tables, the version
+column of messages (numbered per session in timestamp order for existing
+rows) and the content_hash column of file attachments. Databases created
+with create_all by those versions were stamped with the baseline too, so
+tables and columns that already exist are skipped.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "file_blobs" not in tables:
+        op.create_table(
+            "file_blobs",
+            sa.Column("hash", sa.String(), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("refCount", sa.Integer(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("hash")
+        )
+
+    if "llm_responses" not in tables:
+        op.create_table(
+            "llm_responses",
+            sa.Column("key", sa.String(), nullable=False),
+            sa.Column("model", sa.String(), nullable=False),
+            sa.Column("response", sa.String(), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("hits", sa.Integer(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.Column("lastAccess", sa.DateTime(), nullable=True),
+            sa.Column("expiresAt", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("key")
+        )
+        op.create_index("ix_llm_responses_expiresAt", "llm_responses", ["expiresAt"])
+        op.create_index("ix_llm_responses_lastAccess", "llm_responses", ["lastAccess"])
+
+    if "jobs" not in tables:
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("session_id", sa.String(), nullable=True),
+            sa.Column("resultId", sa.String(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.Column("startedAt", sa.DateTime(), nullable=True),
+            sa.Column("finishedAt", sa.DateTime(), nullable=True),
+            sa.Column("heartbeatAt", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["session_id"], ["sessions.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id")
+        )
+        op.create_index("ix_jobs_id", "jobs", ["id"])
+        op.create_index("ix_jobs_session_id", "jobs", ["session_id"])
+        op.create_index("ix_jobs_status", "jobs", ["status"])
+
+    message_columns = {column["name"] for column in inspector.get_columns("messages")}
+    if "version" not in message_columns:
+        with op.batch_alter_table("messages") as batch_op:
+            batch_op.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+        # Existing messages get 1..n per session, so change-feed cursors start above them
+        op.execute("""
+            UPDATE messages SET version = (
+                SELECT COUNT(*) FROM messages AS earlier
+                WHERE earlier.session_id = messages.session_id
+                  AND (earlier.timestamp < messages.timestamp
+                       OR (earlier.timestamp = messages.timestamp AND earlier.id <= messages.id))
+            )
+        """)
+
+    attachment_columns = {column["name"] for column in inspector.get_columns("file_attachments")}
+    if "content_hash" not in attachment_columns:
+        with op.batch_alter_table("file_attachments") as batch_op:
+            batch_op.add_column(sa.Column("content_hash", sa.String(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_file_attachments_content_hash", "file_blobs", ["content_hash"], ["hash"]
+            )
+
+def downgrade():
+    with op.batch_alter_table("file_attachments") as batch_op:
+        batch_op.drop_constraint("fk_file_attachments_content_hash", type_="foreignkey")
+        batch_op.drop_column("content_hash")
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.drop_column("version")
+    op.drop_index("ix_jobs_status", table_name="jobs")
+    op.drop_index("ix_jobs_session_id", table_name="jobs")
+    op.drop_index("ix_jobs_id", table_name="jobs")
+    op.drop_table("jobs")
+    op.drop_index("ix_llm_responses_lastAccess", table_name="llm_responses")
+    op.drop_index("ix_llm_responses_expiresAt", table_name="llm_responses")
+    op.drop_table("llm_responses")
+    op.drop_table("file_blobs")
@@ -0,0 +1,28 @@
+"""Index messages by session and the message-attachment association
+
+Every message query filters by session and orders by timestamp (history)
+or version (change feed); attachments are looked up from both sides of the
+association table.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_messages_session_timestamp", "messages", ["session_id", "timestamp"])
+    op.create_index("ix_messages_session_version", "messages", ["session_id", "version"])
+    op.create_index("ix_message_attachment_message_id", "message_attachment", ["message_id"])
+    op.create_index("ix_message_attachment_attachment_id", "message_attachment", ["attachment_id"])
+
+def downgrade():
+    op.drop_index("ix_message_attachment_attachment_id", table_name="message_attachment")
+    op.drop_index("ix_message_attachment_message_id", table_name="message_attachment")
+    op.drop_index("ix_messages_session_version", table_name="messages")
+    op.drop_index("ix_messages_session_timestamp", table_name="messages")
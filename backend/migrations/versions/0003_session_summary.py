@@ -0,0 +1,54 @@
+"""Denormalized message summary on sessions
+
+Adds messageCount, lastActivity and lastMessagePreview so the session list
+does not have to read messages, backfills them from existing messages and
+indexes the list's sort orders.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.add_column(sa.Column("messageCount", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("lastActivity", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("lastMessagePreview", sa.String(), nullable=True))
+
+    op.execute("""
+        UPDATE sessions SET
+            "messageCount" = (SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.id),
+            "lastActivity" = COALESCE(
+                (SELECT MAX(messages.timestamp) FROM messages WHERE messages.session_id = sessions.id),
+                sessions.timestamp,
+                CURRENT_TIMESTAMP
+            ),
+            "lastMessagePreview" = (
+                SELECT SUBSTR(messages.content, 1, 120) FROM messages
+                WHERE messages.session_id = sessions.id
+                ORDER BY messages.timestamp DESC
+                LIMIT 1
+            )
+    """)
+
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.alter_column("lastActivity", existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index("ix_sessions_activity", ["lastActivity", "id"])
+        batch_op.create_index("ix_sessions_favorite_activity", ["isFavorite", "lastActivity", "id"])
+        batch_op.create_index("ix_sessions_created", ["timestamp", "id"])
+
+def downgrade():
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.drop_index("ix_sessions_created")
+        batch_op.drop_index("ix_sessions_favorite_activity")
+        batch_op.drop_index("ix_sessions_activity")
+        batch_op.drop_column("lastMessagePreview")
+        batch_op.drop_column("lastActivity")
+        batch_op.drop_column("messageCount")
@@ -0,0 +1,125 @@
+"""Full-text search index over messages and files
+
+SQLite only: an FTS5 table holds the searchable text of finished messages
+and uploaded files. Its rows are keyed by search_documents.id, a stable
+integer, because the string primary keys of messages and files cannot be
+FTS rowids. Triggers keep message documents and file names in sync; the
+extracted text of files is written by the extraction pipeline.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# Document of a message or file, as a subquery on the trigger's row
+MESSAGE_DOCUMENT = "(SELECT id FROM search_documents WHERE kind = 'message' AND ref_id = {row}.id)"
+FILE_DOCUMENT = "(SELECT id FROM search_documents WHERE kind = 'file' AND ref_id = {row}.id)"
+
+TRIGGERS = [
+    # Messages are indexed once they stop streaming, so partial flushes do not churn the index
+    """
+    CREATE TRIGGER search_messages_insert AFTER INSERT ON messages
+    WHEN new."isStreaming" IS NOT 1
+    BEGIN
+        INSERT INTO search_documents (kind, ref_id, session_id) VALUES ('message', new.id, new.session_id);
+        INSERT INTO search_fts (rowid, title, body) VALUES (%s, '', new.content);
+    END
+    """ % MESSAGE_DOCUMENT.format(row="new"),
+    """
+    CREATE TRIGGER search_messages_update AFTER UPDATE OF content, "isStreaming" ON messages
+    WHEN new."isStreaming" IS NOT 1 AND (old.content IS NOT new.content OR old."isStreaming" IS 1)
+    BEGIN
+        DELETE FROM search_fts WHERE rowid = %s;
+        INSERT OR IGNORE INTO search_documents (kind, ref_id, session_id) VALUES ('message', new.id, new.session_id);
+        INSERT INTO search_fts (rowid, title, body) VALUES (%s, '', new.content);
+    END
+    """ % (MESSAGE_DOCUMENT.format(row="old"), MESSAGE_DOCUMENT.format(row="new")),
+    """
+    CREATE TRIGGER search_messages_delete AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM search_fts WHERE rowid = %s;
+        DELETE FROM search_documents WHERE kind = 'message' AND ref_id = old.id;
+    END
+    """ % MESSAGE_DOCUMENT.format(row="old"),
+    # Bulk session deletes do not cascade to messages, so drop their documents here
+    """
+    CREATE TRIGGER search_sessions_delete AFTER DELETE ON sessions
+    BEGIN
+        DELETE FROM search_fts WHERE rowid IN (SELECT id FROM search_documents WHERE session_id = old.id);
+        DELETE FROM search_documents WHERE session_id = old.id;
+    END
+    """,
+    # Files are searchable by name right away; the extracted text is added after extraction
+    """
+    CREATE TRIGGER search_files_insert AFTER INSERT ON file_attachments
+    BEGIN
+        INSERT INTO search_documents (kind, ref_id, session_id) VALUES ('file', new.id, NULL);
+        INSERT INTO search_fts (rowid, title, body) VALUES (%s, new.name, '');
+    END
+    """ % FILE_DOCUMENT.format(row="new"),
+    """
+    CREATE TRIGGER search_files_delete AFTER DELETE ON file_attachments
+    BEGIN
+        DELETE FROM search_fts WHERE rowid = %s;
+        DELETE FROM search_documents WHERE kind = 'file' AND ref_id = old.id;
+    END
+    """ % FILE_DOCUMENT.format(row="old"),
+]
+
+def upgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    op.create_table(
+        "search_documents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("ref_id", sa.String(), nullable=False),
+        sa.Column("session_id", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("kind", "ref_id", name="uq_search_documents_ref")
+    )
+    op.create_index("ix_search_documents_session_id", "search_documents", ["session_id"])
+    op.execute("CREATE VIRTUAL TABLE search_fts USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')")
+    # Rank by bm25 with a match in the file name worth five in the text; ORDER BY rank then sorts inside FTS5
+    op.execute("INSERT INTO search_fts (search_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')")
+
+    # Index what already exists
+    op.execute("""
+        INSERT INTO search_documents (kind, ref_id, session_id)
+        SELECT 'message', id, session_id FROM messages WHERE "isStreaming" IS NOT 1
+    """)
+    op.execute("""
+        INSERT INTO search_fts (rowid, title, body)
+        SELECT search_documents.id, '', messages.content FROM search_documents
+        JOIN messages ON search_documents.kind = 'message' AND messages.id = search_documents.ref_id
+    """)
+    op.execute("INSERT INTO search_documents (kind, ref_id, session_id) SELECT 'file', id, NULL FROM file_attachments")
+    op.execute("""
+        INSERT INTO search_fts (rowid, title, body)
+        SELECT search_documents.id, file_attachments.name, '' FROM search_documents
+        JOIN file_attachments ON search_documents.kind = 'file' AND file_attachments.id = search_documents.ref_id
+    """)
+
+    for trigger in TRIGGERS:
+        op.execute(trigger)
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    for name in (
+        "search_files_delete", "search_files_insert", "search_sessions_delete",
+        "search_messages_delete", "search_messages_update", "search_messages_insert"
+    ):
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS search_fts")
+    op.drop_index("ix_search_documents_session_id", table_name="search_documents")
+    op.drop_table("search_documents")
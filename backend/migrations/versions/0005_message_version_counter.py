@@ -0,0 +1,34 @@
+"""Per-session counter for message change versions
+
+Adds sessions.messageVersion, incremented with UPDATE ... RETURNING to give
+each message write its version, and backfills it with the highest version
+of each session's messages. Computing MAX(version) + 1 inside the write was
+only serialized by SQLite's database lock; on PostgreSQL two transactions
+could read the same maximum.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.add_column(sa.Column("messageVersion", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("""
+        UPDATE sessions SET "messageVersion" = COALESCE(
+            (SELECT MAX(messages.version) FROM messages WHERE messages.session_id = sessions.id),
+            0
+        )
+    """)
+
+def downgrade():
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.drop_column("messageVersion")
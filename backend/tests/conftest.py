@@ -0,0 +1,16 @@
+"""
+Test configuration
+
+The app reads its settings when it is imported, so they are set here, before
+any test module imports it: a throwaway SQLite database and no background
+job workers or eager extraction.
+"""
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="report_agent_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["EAGER_EXTRACTION"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+"""
+Query-count regression test for the session and message endpoints
+
+Seeds sessions of different sizes and counts the SQL statements each
+endpoint runs. The count must not grow with the number of messages or
+attachments.
+"""
+import pytest
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.database import Session as SessionModel, Message as MessageModel, FileAttachment as FileAttachmentModel, next_message_version
+from app.utils.database import SessionLocal, engine, async_engine
+
+# Sizes in messages per session. Eager loads fetch related rows in batches of
+# 500 parent keys, so all seeded messages together stay below that.
+SESSION_SIZES = [1, 10, 50, 250]
+ATTACHMENTS_PER_MESSAGE = 2
+
+ENDPOINTS = [
+    "GET /api/messages/{id}",
+    "GET /api/messages/{id}/since",
+    "GET /api/sessions/{id}",
+    "POST /api/messages/{id}",
+    "GET /api/sessions/"
+]
+
+class QueryCounter:
+    """Counts the SQL statements run on the sync and async engines"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def measure(self, func):
+        self.count = 0
+        response = func()
+        assert response.status_code < 400, response.text
+        return self.count
+
+    def close(self):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+def seed_session(message_count: int) -> tuple:
+    """Create a session with message_count messages and return its ID and some attachment IDs"""
+    db = SessionLocal()
+    try:
+        session = SessionModel.create_new(title=f"{message_count} messages")
+        db.add(session)
+        attachments = []
+        for index in range(message_count * ATTACHMENTS_PER_MESSAGE):
+            attachment = FileAttachmentModel(id=f"{session.id}-{index}", name=f"file{index}.csv", size=1, type="text/csv")
+            db.add(attachment)
+            attachments.append(attachment)
+        db.flush()
+        for index in range(message_count):
+            message = MessageModel.create_new(
+                role="user", content=f"message {index}", session_id=session.id, version=next_message_version(db, session.id)
+            )
+            message.attachments.extend(attachments[index * ATTACHMENTS_PER_MESSAGE:(index + 1) * ATTACHMENTS_PER_MESSAGE])
+            db.add(message)
+            db.flush()
+        db.commit()
+        return session.id, [attachment.id for attachment in attachments[:20]]
+    finally:
+        db.close()
+
+@pytest.fixture(scope="module")
+def query_counts():
+    """Statements run by each endpoint, by session size"""
+    with TestClient(app) as client:
+        # Start from a known state: only the sessions seeded below
+        client.delete("/api/sessions/")
+        counter = QueryCounter()
+        try:
+            results = {}
+            for size in SESSION_SIZES:
+                session_id, attachment_ids = seed_session(size)
+                attachments = [
+                    {"id": attachment_id, "name": "file.csv", "size": 1, "type": "text/csv"}
+                    for attachment_id in attachment_ids[:min(size * ATTACHMENTS_PER_MESSAGE, 20)]
+                ]
+                results[size] = {
+                    "GET /api/messages/{id}": counter.measure(lambda: client.get(f"/api/messages/{session_id}")),
+                    "GET /api/messages/{id}/since": counter.measure(lambda: client.get(f"/api/messages/{session_id}/since")),
+                    "GET /api/sessions/{id}": counter.measure(lambda: client.get(f"/api/sessions/{session_id}")),
+                    "POST /api/messages/{id}": counter.measure(lambda: client.post(
+                        f"/api/messages/{session_id}",
+                        json={"content": "hello", "attachments": attachments}
+                    )),
+                    # Lists every session seeded so far
+                    "GET /api/sessions/": counter.measure(lambda: client.get("/api/sessions/"))
+                }
+        finally:
+            counter.close()
+    return results
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_query_count_does_not_grow_with_session_size(query_counts, endpoint):
+    counts = {size: query_counts[size][endpoint] for size in SESSION_SIZES}
+    assert len(set(counts.values())) == 1, f"{endpoint} query count depends on session size: {counts}"
@@ -22,6 +22,8 @@ const ReportAgentChat: React.FC = () => {
     showUploadZone,
     showWelcomeMessage,
     sessions,
+    hasMoreSessions,
+    isLoadingMoreSessions,
     currentSessionId,
     collapsed,
     editingSessionId,
@@ -31,6 +33,7 @@ const ReportAgentChat: React.FC = () => {
     setEditingSessionId,
     setEditingTitle,
     handleNewAnalysis,
+    handleLoadMoreSessions,
     handleSessionClick,
     handleDeleteSession,
     handleDeleteAllSessions,
@@ -56,10 +59,13 @@ const ReportAgentChat: React.FC = () => {
       <SessionSidebar
         collapsed={collapsed}
         sessions={sessions}
+        hasMoreSessions={hasMoreSessions}
+        loadingMoreSessions={isLoadingMoreSessions}
         currentSessionId={currentSessionId}
         editingSessionId={editingSessionId}
         editingTitle={editingTitle}
         onNewAnalysis={handleNewAnalysis}
+        onLoadMoreSessions={handleLoadMoreSessions}
         onSessionClick={handleSessionClick}
         onDeleteSession={handleDeleteSession}
         onDeleteAllSessions={handleDeleteAllSessions}
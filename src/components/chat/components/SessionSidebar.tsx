@@ -18,10 +18,13 @@ const { Title, Text } = Typography;
 interface SessionSidebarProps {
   collapsed: boolean;
   sessions: Session[];
+  hasMoreSessions: boolean;
+  loadingMoreSessions: boolean;
   currentSessionId: string;
   editingSessionId: string | null;
   editingTitle: string;
   onNewAnalysis: () => void;
+  onLoadMoreSessions: () => void;
   onSessionClick: (sessionId: string) => void;
   onDeleteSession: (sessionId: string) => void;
   onDeleteAllSessions: () => void;
@@ -33,10 +36,13 @@ interface SessionSidebarProps {
 const SessionSidebar: React.FC<SessionSidebarProps> = ({
   collapsed,
   sessions,
+  hasMoreSessions,
+  loadingMoreSessions,
   currentSessionId,
   editingSessionId,
   editingTitle,
   onNewAnalysis,
+  onLoadMoreSessions,
   onSessionClick,
   onDeleteSession,
   onDeleteAllSessions,
@@ -95,6 +101,15 @@ const SessionSidebar: React.FC<SessionSidebarProps> = ({
           </div>
           <List
             dataSource={sessions}
+            loadMore={
+              hasMoreSessions && (
+                <div style={{ textAlign: 'center', marginTop: 8 }}>
+                  <Button size="small" loading={loadingMoreSessions} onClick={onLoadMoreSessions}>
+                    Load more
+                  </Button>
+                </div>
+              )
+            }
             renderItem={session => (
               <Card
                 size="small"
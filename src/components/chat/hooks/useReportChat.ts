@@ -18,6 +18,8 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
   const [uploadedFiles, setUploadedFiles] = useState<FileAttachment[]>([]);
   const [showUploadZone, setShowUploadZone] = useState(true);
   const [sessions, setSessions] = useState<Session[]>([]);
+  const [sessionsCursor, setSessionsCursor] = useState<string | null>(null);
+  const [isLoadingMoreSessions, setIsLoadingMoreSessions] = useState(false);
   const [currentSessionId, setCurrentSessionId] = useState<string>('default');
   const [collapsed, setCollapsed] = useState(false);
   const [editingSessionId, setEditingSessionId] = useState<string | null>(null);
@@ -26,13 +28,14 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
   const [currentAnalysisType, setCurrentAnalysisType] = useState<string>('summarize');
   const [showWelcomeMessage, setShowWelcomeMessage] = useState(true);
 
-  // Fetch sessions on component mount
+  // Fetch the first page of sessions on component mount, newest first
   useEffect(() => {
     const fetchSessions = async () => {
       try {
         setIsLoading(true);
-        const fetchedSessions = await api.getSessions();
-        setSessions(fetchedSessions);
+        const page = await api.getSessionPage({ sort: 'created' });
+        setSessions(page.sessions);
+        setSessionsCursor(page.next_cursor);
         setIsLoading(false);
       } catch (error) {
         console.error('Error fetching sessions:', error);
@@ -44,6 +47,24 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
     fetchSessions();
   }, [messageApi]);
 
+  // Fetch the next page of sessions when the sidebar asks for more
+  const handleLoadMoreSessions = useCallback(async () => {
+    if (!sessionsCursor || isLoadingMoreSessions) return;
+
+    try {
+      setIsLoadingMoreSessions(true);
+      const page = await api.getSessionPage({ cursor: sessionsCursor, sort: 'created' });
+      // Sessions created since the first page are already in the list
+      setSessions(prev => [...prev, ...page.sessions.filter(s => !prev.some(p => p.id === s.id))]);
+      setSessionsCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error fetching sessions:', error);
+      messageApi.error('Failed to load more sessions');
+    } finally {
+      setIsLoadingMoreSessions(false);
+    }
+  }, [sessionsCursor, isLoadingMoreSessions, messageApi]);
+
   const handleNewAnalysis = useCallback(async () => {
     try {
       const title = `New Analysis`;
@@ -119,6 +140,7 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
         try {
           await api.deleteAllSessions();
           setSessions([]);
+          setSessionsCursor(null);
           setCurrentSessionId('default');
           setMessages([]);
           setShowWelcomeMessage(true);
@@ -233,19 +255,40 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
       setUploadedFiles([]);
       
       // The backend will automatically create and send an assistant response
-      // We'll poll for new messages to get the assistant's response
-      const checkForNewMessages = async () => {
-        try {
-          const updatedMessages = await api.getMessages(sessionId);
-          setMessages(updatedMessages);
-        } catch (error) {
-          console.error('Error fetching messages:', error);
+      // Long-poll for changes after our message until the response is complete
+      const waitForAssistantResponse = async () => {
+        let cursor = sentMessage.version ?? 0;
+        const deadline = Date.now() + 5 * 60 * 1000;
+        while (Date.now() < deadline) {
+          try {
+            const changes = await api.getMessagesSince(sessionId, cursor);
+            cursor = changes.cursor;
+            
+            setMessages(prev => {
+              const merged = [...prev];
+              for (const changed of changes.messages) {
+                const index = merged.findIndex(msg => msg.id === changed.id);
+                if (index >= 0) {
+                  merged[index] = changed;
+                } else {
+                  merged.push(changed);
+                }
+              }
+              return merged;
+            });
+            
+            const finished = changes.messages.some(
+              msg => msg.role === 'assistant' && !msg.isStreaming
+            );
+            if (finished) return;
+          } catch (error) {
+            console.error('Error fetching messages:', error);
+            return;
+          }
         }
       };
       
-      // Poll a few times to get the assistant's response
-      setTimeout(checkForNewMessages, 1000);
-      setTimeout(checkForNewMessages, 3000);
+      waitForAssistantResponse();
       
     } catch (error) {
       console.error('Error sending message:', error);
@@ -329,6 +372,8 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
     uploadedFiles,
     showUploadZone,
     sessions,
+    hasMoreSessions: sessionsCursor !== null,
+    isLoadingMoreSessions,
     currentSessionId,
     collapsed,
     editingSessionId,
@@ -341,6 +386,7 @@ export const useReportChat = ({ messageApi, modalApi }: UseReportChatDeps) => {
     setEditingTitle,
     setShowWelcomeMessage,
     handleNewAnalysis,
+    handleLoadMoreSessions,
     handleSessionClick,
     handleDeleteSession,
     handleDeleteAllSessions,
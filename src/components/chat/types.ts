@@ -4,7 +4,7 @@
   size: number;
   type: string;
   uploadProgress: number;
-  status: 'uploading' | 'uploaded' | 'error';
+  status: 'uploading' | 'uploaded' | 'queued' | 'processing' | 'processed' | 'error';
 }
 
 export interface Message {
@@ -15,6 +15,7 @@ export interface Message {
   attachments?: FileAttachment[];
   status: 'sending' | 'sent' | 'error';
   isStreaming?: boolean;
+  version?: number;
 }
 
 export interface Session {
@@ -23,5 +24,8 @@ export interface Session {
   timestamp: Date | string;
   fileCount: number;
   isFavorite?: boolean;
+  messageCount?: number;
+  lastActivity?: Date | string;
+  lastMessagePreview?: string | null;
   messages?: Message[];
 }
@@ -11,8 +11,22 @@ const api = axios.create({
 });
 
 // Sessions API
-export const getSessions = async (): Promise<Session[]> => {
-  const response = await api.get('/sessions');
+export interface SessionPage {
+  sessions: Session[];
+  next_cursor: string | null;
+}
+
+export interface SessionPageParams {
+  cursor?: string;
+  limit?: number;
+  sort?: 'activity' | 'created';
+  favorites?: boolean;
+  active_within_days?: number;
+}
+
+// Returns one page of session summaries; pass `next_cursor` back as `cursor` for the next page
+export const getSessionPage = async (params: SessionPageParams = {}): Promise<SessionPage> => {
+  const response = await api.get('/sessions/page', { params });
   return response.data;
 };
 
@@ -50,6 +64,23 @@ export const getMessages = async (sessionId: string): Promise<Message[]> => {
   return response.data;
 };
 
+export interface MessagesSince {
+  messages: Message[];
+  cursor: number;
+}
+
+// Returns messages changed after `cursor`, waiting up to `wait` seconds for a change
+export const getMessagesSince = async (
+  sessionId: string,
+  cursor: number,
+  wait = 25
+): Promise<MessagesSince> => {
+  const response = await api.get(`/messages/${sessionId}/since`, {
+    params: { cursor, wait },
+  });
+  return response.data;
+};
+
 export const sendMessage = async (
   sessionId: string, 
   content: string, 
@@ -84,7 +115,7 @@ export const deleteFile = async (fileId: string): Promise<void> => {
 };
 
 export default {
-  getSessions,
+  getSessionPage,
   getSession,
   createSession,
   updateSession,
@@ -92,6 +123,7 @@ export default {
   deleteAllSessions,
   toggleFavorite,
   getMessages,
+  getMessagesSince,
   sendMessage,
   uploadFile,
   deleteFile,